@@ -2,10 +2,13 @@
 FastAPI 路由定义
 """
 from datetime import datetime
+import asyncio
 import json
 import traceback
-from typing import List, Optional, Dict
-from fastapi import APIRouter, HTTPException, status, Query, File, UploadFile, Form
+from typing import Any, Awaitable, Callable, List, Optional, Dict, Type, TypeVar
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query, File, UploadFile, Form
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
 from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.responses import Response
 import logging
@@ -27,12 +30,52 @@ from services.chat_session_service import get_chat_session_service
 from loguru import logger
 import uuid
 from datetime import datetime
-from schemas.embeddings import DocumentInput
+from schemas.ingestion import DocumentInputStruct
 # BaseModel已在schemas中定义
 
 # 创建路由器
 router = APIRouter()
 
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+# 导出接口内部每批读取的知识点数量
+EXPORT_PAGE_SIZE = 100
+# 导入接口每累计多少个知识点批量写入一次
+IMPORT_CHUNK_SIZE = 50
+
+
+def _json_body(model: Type[ModelT]) -> Callable[[Request], Awaitable[ModelT]]:
+    """
+    直接对原始请求体调用 model_validate_json
+
+    pydantic-core 在一次调用中完成 JSON 解析和校验，不生成中间 dict。
+    校验失败时按 FastAPI 的格式返回 422
+    """
+    async def parse(raw_request: Request) -> ModelT:
+        try:
+            return model.model_validate_json(await raw_request.body())
+        except ValidationError as e:
+            raise RequestValidationError(
+                [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+            )
+    return parse
+
+
+def _json_body_openapi(model: Type[BaseModel]) -> Dict[str, Any]:
+    """
+    为使用 _json_body 的路由补充 OpenAPI 请求体描述
+
+    嵌套模型引用 components 中的 schema，它们已由 /documents 等路由注册
+    """
+    schema = model.model_json_schema(ref_template="#/components/schemas/{model}")
+    schema.pop("$defs", None)
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": schema}}
+        }
+    }
+
 @router.post(
     "/documents",
     response_model=KnowledgePointResponse,
@@ -97,7 +140,7 @@ async def add_document(request: AddDocumentInput):
         logger.info(f"Metadata: {metadata}")
         
         # 创建文档
-        document = DocumentInput(
+        document = DocumentInputStruct(
             id=knowledge_id,
             content=document_content,
             metadata=metadata
@@ -166,7 +209,8 @@ async def query_documents(request: QueryRequest):
         )
 
         logger.info(f"[{request_id}] Query completed - {len(response.results)} results")
-        return response
+        # 直接由模型自带的序列化器输出 JSON 字节，跳过 FastAPI 对返回值的二次校验
+        return Response(content=response.model_dump_json(), media_type="application/json")
 
     except Exception as e:
         logger.error(f"[{request_id}] Query failed: {e}")
@@ -287,12 +331,13 @@ async def get_knowledge_points(
         
         logger.info(f"[{request_id}] 成功获取 {len(knowledge_points)} 个知识点，总计 {total_count} 个")
         
-        return KnowledgePointsResponse(
+        response = KnowledgePointsResponse(
             knowledge_points=knowledge_points,
             total=total_count,
             page=page,
             limit=limit
         )
+        return Response(content=response.model_dump_json(), media_type="application/json")
         
     except Exception as e:
         logger.error(f"获取知识点列表接口错误: {e}")
@@ -397,9 +442,13 @@ async def get_knowledge_point(document_id: str):
     "/documents/{document_id}",
     response_model=KnowledgePointResponse,
     summary="更新知识点",
-    description="更新指定ID的知识点"
+    description="更新指定ID的知识点",
+    openapi_extra=_json_body_openapi(KnowledgePointAddRequest)
 )
-async def update_knowledge_point(document_id: str, request: KnowledgePointAddRequest):
+async def update_knowledge_point(
+    document_id: str,
+    request: KnowledgePointAddRequest = Depends(_json_body(KnowledgePointAddRequest))
+):
     """
     更新知识点
     
@@ -407,8 +456,6 @@ async def update_knowledge_point(document_id: str, request: KnowledgePointAddReq
     - **request**: 更新的知识点数据
     """
     try:
-        from schemas.embeddings import DocumentInput
-        
         knowledge_point = request.knowledge_point
         
         # 获取原有知识点的创建时间
@@ -467,7 +514,7 @@ async def update_knowledge_point(document_id: str, request: KnowledgePointAddReq
         }
         
         # 创建文档
-        document = DocumentInput(
+        document = DocumentInputStruct(
             id=document_id,
             content=document_content,
             metadata=metadata
@@ -661,13 +708,77 @@ async def parse_document(
         )
 
 
+def _build_knowledge_point_document(knowledge_point: AddDocumentInput) -> DocumentInputStruct:
+    """
+    将知识点输入转换为写入知识库的文档
+
+    Args:
+        knowledge_point: 知识点输入
+
+    Returns:
+        带新生成ID、检索内容和元数据的文档
+    """
+    # 生成知识点ID
+    knowledge_id = str(uuid.uuid4())
+    
+    # 准备文档内容 - 主要用于向量搜索
+    content_parts = [
+        f"知识点: {knowledge_point.title}",
+        f"描述: {knowledge_point.description}",
+        f"分类: {knowledge_point.category or 'general'}"
+    ]
+    
+    # 添加例题到内容中用于向量搜索
+    for j, example in enumerate(knowledge_point.examples, 1):
+        content_parts.extend([
+            f"例题{j}: {example.question}",
+            f"解答步骤: {example.solution}"
+        ])
+    
+    if knowledge_point.tags:
+        content_parts.append(f"标签: {', '.join(knowledge_point.tags)}")
+    
+    document_content = "\n".join(content_parts)
+    
+    # 准备元数据
+    examples_data = [
+        {
+            "question": ex.question,
+            "solution": ex.solution,
+            "difficulty": ex.difficulty
+        } for ex in knowledge_point.examples
+    ]
+    
+    current_time = datetime.now().isoformat()
+    metadata = {
+        "title": knowledge_point.title,
+        "description": knowledge_point.description,
+        "category": knowledge_point.category or "general",
+        "tags": json.dumps(knowledge_point.tags or [], ensure_ascii=False),
+        "examples": json.dumps(examples_data, ensure_ascii=False),
+        "examples_count": len(knowledge_point.examples),
+        "created_at": current_time,
+        "updated_at": current_time
+    }
+    
+    # 创建文档
+    return DocumentInputStruct(
+        id=knowledge_id,
+        content=document_content,
+        metadata=metadata
+    )
+
+
 @router.post(
     "/batch-documents",
     response_model=BatchKnowledgePointsResponse,
     summary="批量添加知识点",
-    description="批量添加多个知识点到知识库"
+    description="批量添加多个知识点到知识库",
+    openapi_extra=_json_body_openapi(BatchKnowledgePointsRequest)
 )
-async def batch_add_documents(request: BatchKnowledgePointsRequest):
+async def batch_add_documents(
+    request: BatchKnowledgePointsRequest = Depends(_json_body(BatchKnowledgePointsRequest))
+):
     """
     批量添加知识点
     
@@ -679,59 +790,8 @@ async def batch_add_documents(request: BatchKnowledgePointsRequest):
         
         for i, knowledge_point in enumerate(request.knowledge_points):
             try:
-                import uuid
-                from datetime import datetime
-                from schemas.embeddings import DocumentInput
-                
-                # 生成知识点ID
-                knowledge_id = str(uuid.uuid4())
-                
-                # 准备文档内容 - 主要用于向量搜索
-                content_parts = [
-                    f"知识点: {knowledge_point.title}",
-                    f"描述: {knowledge_point.description}",
-                    f"分类: {knowledge_point.category or 'general'}"
-                ]
-                
-                # 添加例题到内容中用于向量搜索
-                for j, example in enumerate(knowledge_point.examples, 1):
-                    content_parts.extend([
-                        f"例题{j}: {example.question}",
-                        f"解答步骤: {example.solution}"
-                    ])
-                
-                if knowledge_point.tags:
-                    content_parts.append(f"标签: {', '.join(knowledge_point.tags)}")
-                
-                document_content = "\n".join(content_parts)
-                
-                # 准备元数据
-                examples_data = [
-                    {
-                        "question": ex.question,
-                        "solution": ex.solution,
-                        "difficulty": ex.difficulty
-                    } for ex in knowledge_point.examples
-                ]
-                
-                current_time = datetime.now().isoformat()
-                metadata = {
-                    "title": knowledge_point.title,
-                    "description": knowledge_point.description,
-                    "category": knowledge_point.category or "general",
-                    "tags": json.dumps(knowledge_point.tags or [], ensure_ascii=False),
-                    "examples": json.dumps(examples_data, ensure_ascii=False),
-                    "examples_count": len(knowledge_point.examples),
-                    "created_at": current_time,
-                    "updated_at": current_time
-                }
-                
-                # 创建文档
-                document = DocumentInput(
-                    id=knowledge_id,
-                    content=document_content,
-                    metadata=metadata
-                )
+                document = _build_knowledge_point_document(knowledge_point)
+                knowledge_id = document.id
                 
                 # 添加到双重存储系统（ChromaDB + Elasticsearch）
                 success = await rag_service.add_documents(
@@ -764,6 +824,148 @@ async def batch_add_documents(request: BatchKnowledgePointsRequest):
         )
 
 
+@router.get(
+    "/export",
+    summary="导出全部知识点",
+    description="以 NDJSON 流式导出全部知识点，每行一个知识点"
+)
+async def export_knowledge_points(
+    category: Optional[str] = Query(None, description="分类筛选")
+):
+    """
+    流式导出知识点
+
+    服务端内部用 point-in-time 分批读取，调用方只需一次请求即可取得全部知识点；
+    读取中途出错时连接被中断，不会正常结束
+
+    - **category**: 分类筛选
+    """
+    request_id = str(uuid.uuid4())[:8]
+    logger.info(f"[{request_id}] 导出知识点 - category: {category}")
+
+    # point-in-time 遍历不受 max_result_window 限制；查询出错时异常向上抛出而不是返回空页
+    batches = rag_service.iter_knowledge_points(
+        batch_size=EXPORT_PAGE_SIZE,
+        category=category,
+        request_id=request_id
+    )
+    # 先取第一批，开始响应前的错误按 500 返回
+    try:
+        first_batch = await anext(batches, [])
+    except Exception as e:
+        logger.error(f"[{request_id}] 导出知识点失败: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"导出知识点失败: {str(e)}"
+        )
+
+    def encode(documents: List[Dict[str, Any]]) -> bytes:
+        # 一批知识点拼接后一次写出
+        return b"".join(
+            KnowledgePointResponse(
+                id=doc.get("id"),
+                title=doc.get("title"),
+                description=doc.get("description"),
+                category=doc.get("category"),
+                examples=doc.get("examples", []),
+                tags=doc.get("tags", []),
+                created_at=doc.get("created_at"),
+                updated_at=doc.get("updated_at")
+            ).model_dump_json().encode() + b"\n"
+            for doc in documents
+        )
+
+    async def generate():
+        exported = len(first_batch)
+        try:
+            yield encode(first_batch)
+            # 响应开始后出错时异常继续抛出，连接被中断，调用方不会把不完整的导出当作成功
+            async for documents in batches:
+                exported += len(documents)
+                yield encode(documents)
+        finally:
+            # 客户端断开时也及时关闭 point-in-time
+            await batches.aclose()
+        logger.info(f"[{request_id}] 导出完成，共 {exported} 个知识点")
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+@router.post(
+    "/import",
+    response_model=BatchKnowledgePointsResponse,
+    summary="导入知识点",
+    description="接收 NDJSON 流式请求体（每行一个知识点），分块写入知识库"
+)
+async def import_knowledge_points(raw_request: Request):
+    """
+    流式导入知识点
+
+    边接收请求体边解析，每累计 IMPORT_CHUNK_SIZE 个知识点批量写入一次，
+    空请求体返回全零统计，可用于探测接口是否可用
+    """
+    request_id = str(uuid.uuid4())[:8]
+    success_ids: List[str] = []
+    errors: List[str] = []
+    pending: List[DocumentInputStruct] = []
+    total_count = 0
+
+    async def flush():
+        documents = pending[:]
+        pending.clear()
+        try:
+            success = await rag_service.add_documents(documents=documents, request_id=request_id)
+        except Exception as e:
+            logger.error(f"[{request_id}] 导入知识点写入失败: {e}")
+            success = False
+        if success:
+            success_ids.extend(doc.id for doc in documents)
+        else:
+            errors.append(f"{len(documents)} 个知识点写入知识库失败")
+
+    def handle_line(line: bytes):
+        nonlocal total_count
+        line = line.strip()
+        if not line:
+            return
+        total_count += 1
+        try:
+            knowledge_point = AddDocumentInput.model_validate_json(line)
+        except ValidationError as e:
+            errors.append(f"知识点 {total_count}: {e.error_count()} 个字段校验失败")
+            return
+        pending.append(_build_knowledge_point_document(knowledge_point))
+
+    try:
+        buffer = b""
+        async for chunk in raw_request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                handle_line(line)
+                if len(pending) >= IMPORT_CHUNK_SIZE:
+                    await flush()
+        handle_line(buffer)
+        if pending:
+            await flush()
+
+        logger.info(f"[{request_id}] 导入完成 - 总计: {total_count}, 成功: {len(success_ids)}")
+        return BatchKnowledgePointsResponse(
+            success_count=len(success_ids),
+            failed_count=total_count - len(success_ids),
+            total_count=total_count,
+            success_ids=success_ids,
+            errors=errors
+        )
+
+    except Exception as e:
+        logger.error(f"导入知识点接口错误: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"导入知识点失败: {str(e)}"
+        )
+
+
 @router.post(
     "/create-chat-session",
     response_model=DocumentParseSessionResponse,
@@ -1118,8 +1320,9 @@ async def parse_knowledge_points_json(request: JsonParseRequest):
         # 获取AI服务实例
         ai_service = get_ai_service()
 
-        # 调用通用解析方法
-        knowledge_points = ai_service.parse_knowledge_points_json(
+        # 调用通用解析方法，JSON 解析与转义修复在线程中执行，不阻塞事件循环
+        knowledge_points = await asyncio.to_thread(
+            ai_service.parse_knowledge_points_json,
             json_content=request.json_content,
             original_text=original_text,
             request_id=request_id
@@ -49,6 +49,8 @@ class Settings:
     AI_API_KEY: str = os.getenv("AI_API_KEY", "")
     AI_BASE_URL: str = os.getenv("AI_BASE_URL", "https://api.openai.com")
     AI_MODEL: str = os.getenv("AI_MODEL", "gpt-3.5-turbo")
+    # 同时在途的 AI API 请求上限（不含流式聊天）
+    AI_MAX_CONCURRENCY: int = int(os.getenv("AI_MAX_CONCURRENCY", "16"))
 
     DATABASE_URL: str = os.getenv("DATABASE_URL")
     
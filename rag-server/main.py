@@ -11,6 +11,7 @@ import time
 from api import router
 from schemas.common import ErrorResponse
 from services.rag_service import rag_service
+from services.ai_service import close_ai_service
 from config import settings
 from loguru import logger
 
@@ -35,6 +36,7 @@ async def lifespan(app: FastAPI):
     
     # 关闭时的清理
     logger.info("🛑 RAG 服务正在关闭...")
+    await close_ai_service()
     logger.info("✅ RAG 服务已关闭")
 
 
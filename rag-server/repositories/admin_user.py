@@ -4,12 +4,19 @@
 """
 import hashlib
 from typing import Optional, List
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import SQLAlchemyError
 
 from models.base import get_db_session
 from models.admin_user import AdminUser as AdminUserModel
 from loguru import logger
 
+# 支持 INSERT ... ON CONFLICT DO NOTHING RETURNING 的数据库方言
+ON_CONFLICT_INSERTS = {
+    "postgresql": pg_insert,
+    "sqlite": sqlite_insert,
+}
 
 
 class AdminUserRepository:
@@ -95,6 +102,64 @@ class AdminUserRepository:
         finally:
             db.close()
     
+    async def upsert_admin_user(
+        self, 
+        username: str, 
+        password: str, 
+        email: Optional[str] = None,
+        is_superuser: bool = False
+    ) -> Optional[int]:
+        """
+        幂等地创建管理员用户
+        
+        PostgreSQL 与 SQLite 用单条 INSERT ... ON CONFLICT DO NOTHING RETURNING 语句完成检查与插入，
+        其他数据库退回 create_admin_user；用户名或邮箱已存在时不做任何修改
+        
+        Args:
+            username: 用户名
+            password: 密码
+            email: 邮箱
+            is_superuser: 是否为超级用户
+            
+        Returns:
+            新建用户的 ID，用户已存在或失败时返回 None
+        """
+        try:
+            db = next(get_db_session())
+            
+            insert = ON_CONFLICT_INSERTS.get(db.bind.dialect.name)
+            if insert is None:
+                # 其他数据库不支持 ON CONFLICT，退回先检查后插入
+                user = await self.create_admin_user(username, password, email, is_superuser)
+                return user.id if user is not None else None
+            
+            stmt = insert(AdminUserModel).values(
+                username=username,
+                password=self._hash_password(password),
+                email=email,
+                is_active=True,
+                is_superuser=is_superuser
+            ).on_conflict_do_nothing().returning(AdminUserModel.id)
+            
+            user_id = db.execute(stmt).scalar()
+            db.commit()
+            
+            if user_id is None:
+                logger.warning(f"用户名或邮箱已存在: {username}")
+            else:
+                logger.info(f"创建管理员用户成功: {username}")
+            return user_id
+            
+        except SQLAlchemyError as e:
+            logger.error(f"创建管理员用户数据库错误: {e}")
+            db.rollback()
+            return None
+        except Exception as e:
+            logger.error(f"创建管理员用户失败: {e}")
+            return None
+        finally:
+            db.close()
+    
     async def get_admin_user_by_username(self, username: str) -> Optional[AdminUserModel]:
         """
         根据用户名获取管理员用户
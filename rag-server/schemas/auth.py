@@ -4,6 +4,8 @@
 from typing import Optional
 from pydantic import BaseModel, Field
 
+from schemas.common import FrozenModel
+
 
 class AdminLoginRequest(BaseModel):
     """管理员登录请求"""
@@ -11,7 +13,7 @@ class AdminLoginRequest(BaseModel):
     password: str = Field(..., description="密码")
 
 
-class AdminUser(BaseModel):
+class AdminUser(FrozenModel):
     """管理员用户信息"""
     id: int = Field(..., description="用户ID")
     username: str = Field(..., description="用户名")
@@ -20,12 +22,12 @@ class AdminUser(BaseModel):
     is_superuser: bool = Field(default=True, description="是否超级用户")
 
 
-class AdminLoginResponse(BaseModel):
+class AdminLoginResponse(FrozenModel):
     """管理员登录响应"""
     access_token: str = Field(..., description="访问令牌")
     user: AdminUser = Field(..., description="用户信息")
 
 
-class AdminProfileResponse(BaseModel):
+class AdminProfileResponse(FrozenModel):
     """管理员个人信息响应"""
     user: AdminUser = Field(..., description="用户信息")
\ No newline at end of file
@@ -2,22 +2,41 @@
 通用的 Pydantic 模型
 """
 from typing import Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
-class HealthCheck(BaseModel):
+class FrozenModel(BaseModel):
+    """
+    服务端构造的响应模型基类
+
+    响应对象只在服务内部创建、创建后不再修改，因此冻结实例并禁止多余字段，
+    校验时不必处理额外键
+    """
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+
+class RequestModel(BaseModel):
+    """
+    客户端请求模型基类
+
+    请求体校验后只读使用，冻结实例；忽略客户端附带的未知字段以保持兼容
+    """
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
+
+class HealthCheck(FrozenModel):
     """健康检查响应"""
     status: str = Field(..., description="服务状态")
     version: str = Field(..., description="版本信息")
 
 
-class ErrorResponse(BaseModel):
+class ErrorResponse(FrozenModel):
     """错误响应模型"""
     error: str = Field(..., description="错误信息")
     detail: Optional[str] = Field(default=None, description="详细错误信息")
 
 
-class SuccessResponse(BaseModel):
+class SuccessResponse(FrozenModel):
     """成功响应模型"""
     message: str = Field(..., description="成功信息")
     data: Optional[dict] = Field(default=None, description="响应数据")
\ No newline at end of file
@@ -2,22 +2,25 @@
 嵌入向量和 RAG 相关的 Pydantic 模型
 """
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field
+from pydantic import Field, SkipValidation
+from typing_extensions import NotRequired, TypedDict
 from datetime import datetime
 
+from schemas.common import FrozenModel, RequestModel
 
-class DocumentInput(BaseModel):
+
+class DocumentInput(RequestModel):
     """输入文档模型"""
     id: str = Field(..., description="文档唯一标识符")
     content: str = Field(..., description="文档内容")
     metadata: Optional[Dict[str, Any]] = Field(default=None, description="文档元数据")
 
 
-class DocumentsAddRequest(BaseModel):
+class DocumentsAddRequest(RequestModel):
     """批量添加文档请求"""
     documents: List[DocumentInput] = Field(..., description="文档列表")
 
-class QueryRequest(BaseModel):
+class QueryRequest(RequestModel):
     """查询请求模型 - 支持混合搜索"""
     query: str = Field(..., description="查询文本")
     n_results: int = Field(default=5, ge=1, le=100, description="返回结果数量")
@@ -32,7 +35,7 @@ class QueryRequest(BaseModel):
     rerank_top_k: Optional[int] = Field(default=None, description="重排序后返回的top结果数量")
 
 
-class HybridQueryRequest(BaseModel):
+class HybridQueryRequest(RequestModel):
     """混合搜索请求模型"""
     query: str = Field(..., description="查询文本")
     n_results: int = Field(default=5, ge=1, le=100, description="返回结果数量")
@@ -45,12 +48,12 @@ class HybridQueryRequest(BaseModel):
     rerank_top_k: Optional[int] = Field(default=None, description="重排序后返回的top结果数量")
 
 
-class DocumentResult(BaseModel):
+class DocumentResult(FrozenModel):
     """文档查询结果 - 支持混合搜索评分"""
     id: str = Field(..., description="文档ID")
     content: str = Field(..., description="文档内容")
     distance: float = Field(..., description="距离分数")
-    metadata: Optional[Dict[str, Any]] = Field(default=None, description="文档元数据")
+    metadata: SkipValidation[Optional[Dict[str, Any]]] = Field(default=None, description="文档元数据")
 
     # 混合搜索评分信息（可选）
     vector_score: Optional[float] = Field(default=None, description="向量相似度分数")
@@ -59,16 +62,16 @@ class DocumentResult(BaseModel):
     rerank_score: Optional[float] = Field(default=None, description="重排序分数")
     final_score: Optional[float] = Field(default=None, description="最终分数")
     similarity_score: Optional[float] = Field(default=None, description="统一的相似度分数(0-100)")
-    highlight: Optional[Dict[str, Any]] = Field(default=None, description="高亮信息")
+    highlight: SkipValidation[Optional[Dict[str, Any]]] = Field(default=None, description="高亮信息")
 
 
-class RankedDocumentResult(BaseModel):
+class RankedDocumentResult(FrozenModel):
     """重排序文档查询结果"""
     id: str = Field(..., description="文档ID")
     title: Optional[str] = Field(default=None, description="文档标题")
     description: Optional[str] = Field(default=None, description="文档描述")
     category: Optional[str] = Field(default=None, description="文档分类")
-    examples: Optional[List[Dict[str, Any]]] = Field(default=None, description="例题列表")
+    examples: SkipValidation[Optional[List[Dict[str, Any]]]] = Field(default=None, description="例题列表")
     tags: Optional[List[str]] = Field(default=None, description="标签列表")
     created_at: Optional[str] = Field(default=None, description="创建时间")
     updated_at: Optional[str] = Field(default=None, description="更新时间")
@@ -82,11 +85,11 @@ class RankedDocumentResult(BaseModel):
     similarity_score: Optional[float] = Field(default=None, description="统一的相似度分数(0-100)")
 
     # 元数据
-    search_metadata: Optional[Dict[str, Any]] = Field(default=None, description="搜索元数据")
-    highlight: Optional[Dict[str, Any]] = Field(default=None, description="高亮信息")
+    search_metadata: SkipValidation[Optional[Dict[str, Any]]] = Field(default=None, description="搜索元数据")
+    highlight: SkipValidation[Optional[Dict[str, Any]]] = Field(default=None, description="高亮信息")
 
 
-class QueryResponse(BaseModel):
+class QueryResponse(FrozenModel):
     """查询响应模型 - 支持混合搜索结果"""
     results: List[DocumentResult] = Field(..., description="查询结果列表")
     query: str = Field(..., description="原始查询")
@@ -98,7 +101,7 @@ class QueryResponse(BaseModel):
     search_stats: Optional[Dict[str, Any]] = Field(default=None, description="搜索统计信息")
 
 
-class HybridQueryResponse(BaseModel):
+class HybridQueryResponse(FrozenModel):
     """混合搜索响应模型"""
     results: List[RankedDocumentResult] = Field(..., description="查询结果列表")
     query: str = Field(..., description="原始查询")
@@ -110,21 +113,33 @@ class HybridQueryResponse(BaseModel):
     search_stats: Dict[str, Any] = Field(..., description="搜索统计信息")
 
 
-class CollectionInfo(BaseModel):
+class CollectionInfo(FrozenModel):
     """集合信息"""
     name: str = Field(..., description="集合名称")
     count: int = Field(..., description="文档数量")
 
 
 # 数学知识点相关模型
-class ExampleInput(BaseModel):
+class ExampleInput(RequestModel):
     """例题输入模型"""
     question: str = Field(..., description="例题题目")
     solution: str = Field(..., description="解题步骤")
     difficulty: Optional[str] = Field(default="medium", description="难度等级：easy, medium, hard")
 
 
-class AddDocumentInput(BaseModel):
+class ExampleDict(TypedDict):
+    """
+    解析结果中的例题数据
+
+    用 TypedDict 代替嵌套模型，不必为每道例题构造模型实例；
+    校验时 question、solution 必须存在，与 ExampleInput 一样会丢弃未声明的键
+    """
+    question: str
+    solution: str
+    difficulty: NotRequired[Optional[str]]
+
+
+class AddDocumentInput(RequestModel):
     """知识点输入模型"""
     title: str = Field(..., description="知识点名称")
     description: str = Field(..., description="知识点描述")
@@ -132,24 +147,25 @@ class AddDocumentInput(BaseModel):
     examples: List[ExampleInput] = Field(default=[], description="相关例题列表")
     tags: Optional[List[str]] = Field(default=[], description="标签列表")
 
-class KnowledgePointAddRequest(BaseModel):
+class KnowledgePointAddRequest(RequestModel):
     """添加知识点请求"""
     knowledge_point: AddDocumentInput = Field(..., description="知识点信息")
 
-class KnowledgePointResponse(BaseModel):
+class KnowledgePointResponse(FrozenModel):
     """知识点响应模型"""
     id: str = Field(..., description="知识点ID")
     title: str = Field(..., description="知识点名称")  
     description: str = Field(..., description="知识点描述")
     category: str = Field(..., description="知识点分类")
-    examples: List[Dict[str, Any]] = Field(..., description="相关例题列表")
+    # 例题原样透传，保留 source 等未声明的键
+    examples: SkipValidation[List[Dict[str, Any]]] = Field(..., description="相关例题列表")
     tags: List[str] = Field(..., description="标签列表")
     created_at: Optional[str] = Field(default=None, description="创建时间")
     updated_at: Optional[str] = Field(default=None, description="更新时间")
     similarity_score: Optional[float] = Field(default=None, description="相似度分数(仅在搜索时返回)")
 
 
-class KnowledgePointsResponse(BaseModel):
+class KnowledgePointsResponse(FrozenModel):
     """知识点列表响应"""
     knowledge_points: List[KnowledgePointResponse] = Field(..., description="知识点列表")
     total: int = Field(..., description="总数量")
@@ -158,12 +174,12 @@ class KnowledgePointsResponse(BaseModel):
 
 
 # 文档上传和处理相关模型
-class DocumentParseRequest(BaseModel):
+class DocumentParseRequest(RequestModel):
     """文档解析请求"""
     filename: str = Field(..., description="文件名")
 
 
-class DocumentParseResponse(BaseModel):
+class DocumentParseResponse(FrozenModel):
     """文档解析响应"""
     filename: str = Field(..., description="文件名")
     extracted_text: str = Field(..., description="提取的文本内容")
@@ -171,12 +187,12 @@ class DocumentParseResponse(BaseModel):
     total_points: int = Field(..., description="知识点总数")
 
 
-class BatchKnowledgePointsRequest(BaseModel):
+class BatchKnowledgePointsRequest(RequestModel):
     """批量添加知识点请求"""
     knowledge_points: List[AddDocumentInput] = Field(..., description="知识点列表")
 
 
-class BatchKnowledgePointsResponse(BaseModel):
+class BatchKnowledgePointsResponse(FrozenModel):
     """批量添加知识点响应"""
     success_count: int = Field(..., description="成功添加的数量")
     failed_count: int = Field(..., description="失败的数量")
@@ -187,14 +203,14 @@ class BatchKnowledgePointsResponse(BaseModel):
 
 
 # 聊天会话相关的请求模型
-class ChatSessionCreateRequest(BaseModel):
+class ChatSessionCreateRequest(RequestModel):
     """创建聊天会话请求"""
     filename: str
     extracted_text: str
     user_requirements: Optional[str] = None
 
 
-class ChatSessionResponse(BaseModel):
+class ChatSessionResponse(FrozenModel):
     """聊天会话响应"""
     session_id: str
     filename: str
@@ -205,7 +221,7 @@ class ChatSessionResponse(BaseModel):
 
 
 
-class ChatMessage(BaseModel):
+class ChatMessage(RequestModel):
     """聊天消息"""
     role: str  # "user" | "assistant" | "system"
     content: str
@@ -213,35 +229,35 @@ class ChatMessage(BaseModel):
     timestamp: Optional[str] = None
 
 
-class ChatMessagesRequest(BaseModel):
+class ChatMessagesRequest(RequestModel):
     """聊天消息列表请求（新版本）"""
     messages: List[ChatMessage]
 
 
-class DocumentParseSessionResponse(BaseModel):
+class DocumentParseSessionResponse(FrozenModel):
     """文档解析会话响应（简化版）"""
     session_id: str
     filename: str
     extracted_text_preview: str  # 文本预览（前2000字符）
 
 
-class JsonParseRequest(BaseModel):
+class JsonParseRequest(RequestModel):
     """JSON解析请求"""
     json_content: str = Field(..., description="要解析的JSON字符串")
     original_text: Optional[str] = Field(None, description="原始文档文本（可选，优先从session_id获取）")
     session_id: Optional[str] = Field(None, description="会话ID（用于从数据库获取原始文档文本）")
 
 
-class ParsedKnowledgePoint(BaseModel):
+class ParsedKnowledgePoint(FrozenModel):
     """解析后的知识点"""
     title: str
     description: str
     category: str = "general"
-    examples: List[ExampleInput] = []
+    examples: List[ExampleDict] = []
     tags: List[str] = []
 
 
-class JsonParseResponse(BaseModel):
+class JsonParseResponse(FrozenModel):
     """JSON解析响应"""
     success: bool = Field(..., description="解析是否成功")
     knowledge_points: List[ParsedKnowledgePoint] = Field(default=[], description="解析后的知识点列表")
@@ -249,7 +265,7 @@ class JsonParseResponse(BaseModel):
     parse_method: Optional[str] = Field(None, description="使用的解析方法：direct|position")
 
 
-class KnowledgePointNamesResponse(BaseModel):
+class KnowledgePointNamesResponse(FrozenModel):
     """知识点名称列表响应"""
     names: List[str] = Field(..., description="知识点名称列表")
     count: int = Field(..., description="知识点总数量")
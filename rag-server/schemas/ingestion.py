@@ -0,0 +1,16 @@
+"""
+服务内部流转的文档结构
+
+这些对象只在路由和存储服务之间传递，不经过 FastAPI 边界校验，
+使用 msgspec.Struct 代替 Pydantic 模型以降低构造开销
+"""
+from typing import Any, Dict, Optional
+
+import msgspec
+
+
+class DocumentInputStruct(msgspec.Struct, frozen=True):
+    """写入 ChromaDB 和 Elasticsearch 的文档"""
+    id: str
+    content: str
+    metadata: Optional[Dict[str, Any]] = None
@@ -9,15 +9,127 @@ import sys
 import os
 import argparse
 import json
-from typing import List, Dict, Any, Set, Optional
+import math
+import tempfile
+from itertools import islice
+from typing import List, Dict, Any, Optional, AsyncIterator, Callable, Iterable, Iterator, Tuple
 from datetime import datetime
 
 # 添加项目根目录到路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import chromadb
-from elasticsearch import AsyncElasticsearch
+import numpy as np
+import orjson
 from loguru import logger
+from pybloom_live import BloomFilter
+
+
+# 并发删除请求数，可通过环境变量或 --concurrency 覆盖
+DEFAULT_ES_CONCURRENCY = int(os.getenv("ES_CONCURRENCY", "4"))
+# 单个删除请求体中 ID 列表的最大字节数
+DEFAULT_MAX_CHUNK_BYTES = 1024 * 1024
+# 同时进行的 ChromaDB 分页读取请求数
+DEFAULT_CHROMA_CONCURRENCY = 8
+# ChromaDB ID Bloom 过滤器误判率
+BLOOM_ERROR_RATE = 1e-6
+# ChromaDB 每次读取的 ID 数量，以及超时重试时允许减半到的下限
+DEFAULT_CHROMA_BATCH_SIZE = 5000
+MIN_CHROMA_BATCH_SIZE = 100
+# ID 编码后不超过该字节数时用定长字节数组精确比对，否则退回 Bloom 过滤器
+MAX_ARRAY_ID_BYTES = 64
+
+
+def _is_timeout_error(error: Exception) -> bool:
+    """判断 ChromaDB 请求异常是否为超时"""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    return "timeout" in type(error).__name__.lower() or "timed out" in str(error).lower()
+
+
+class ChromaIdIndex:
+    """
+    ChromaDB 文档 ID 索引
+
+    ID 较短（如 36 字节的 UUID）时，每批编码为 numpy 定长字节数组，
+    汇总后排序去重，查找用二分在 C 中完成，每个 ID 只占其定长字节数。
+    一旦出现超长 ID，定长数组会按最长 ID 放大，此时把已收集的 ID 转入 Bloom 过滤器
+    """
+    
+    def __init__(self, capacity: int):
+        """
+        Args:
+            capacity: 预估的 ID 总数，用于 Bloom 过滤器容量
+        """
+        self._capacity = max(capacity, 1)
+        self._chunks: List[np.ndarray] = []
+        self._sorted: Optional[np.ndarray] = None
+        self._bloom: Optional[BloomFilter] = None
+    
+    @property
+    def uses_bloom(self) -> bool:
+        """是否已退回 Bloom 过滤器"""
+        return self._bloom is not None
+    
+    def add_batch(self, batch_ids: List[str]) -> None:
+        """加入一批 ID"""
+        if not batch_ids:
+            return
+        
+        if self._bloom is None:
+            encoded = np.array([doc_id.encode("utf-8") for doc_id in batch_ids], dtype="S")
+            if encoded.dtype.itemsize <= MAX_ARRAY_ID_BYTES:
+                self._chunks.append(encoded)
+                return
+            self._switch_to_bloom()
+        
+        for doc_id in batch_ids:
+            self._bloom.add(doc_id)
+    
+    def _switch_to_bloom(self) -> None:
+        """把已收集的 ID 转入 Bloom 过滤器"""
+        logger.warning(f"发现超过 {MAX_ARRAY_ID_BYTES} 字节的文档 ID，改用 Bloom 过滤器比对")
+        self._bloom = BloomFilter(capacity=self._capacity, error_rate=BLOOM_ERROR_RATE)
+        for chunk in self._chunks:
+            for doc_id in chunk:
+                self._bloom.add(doc_id.decode("utf-8"))
+        self._chunks = []
+    
+    def finalize(self) -> None:
+        """收集结束后排序去重"""
+        if self._bloom is None:
+            if self._chunks:
+                self._sorted = np.unique(np.concatenate(self._chunks))
+            else:
+                self._sorted = np.array([], dtype="S1")
+            self._chunks = []
+    
+    def __len__(self) -> int:
+        if self._bloom is not None:
+            return len(self._bloom)
+        return len(self._sorted) if self._sorted is not None else 0
+    
+    def missing(self, batch_ids: List[str]) -> List[str]:
+        """
+        返回不在索引中的 ID
+        
+        Args:
+            batch_ids: 待检查的 ID 列表
+            
+        Returns:
+            索引中不存在的 ID 列表
+        """
+        if self._bloom is not None:
+            return [doc_id for doc_id in batch_ids if doc_id not in self._bloom]
+        
+        if not batch_ids:
+            return []
+        if not len(self._sorted):
+            return list(batch_ids)
+        
+        encoded = np.array([doc_id.encode("utf-8") for doc_id in batch_ids], dtype="S")
+        positions = np.searchsorted(self._sorted, encoded)
+        found = self._sorted[np.minimum(positions, len(self._sorted) - 1)] == encoded
+        return [doc_id for doc_id, exists in zip(batch_ids, found) if not exists]
 
 
 class DataCleanupService:
@@ -29,7 +141,8 @@ class DataCleanupService:
         chroma_port: int = 8000,
         es_host: str = "localhost",
         es_port: int = 9200,
-        es_index: str = "math_knowledge"
+        es_index: str = "math_knowledge",
+        es_concurrency: int = DEFAULT_ES_CONCURRENCY
     ):
         """
         初始化数据清理服务
@@ -40,12 +153,14 @@ class DataCleanupService:
             es_host: Elasticsearch 服务器地址
             es_port: Elasticsearch 服务器端口
             es_index: Elasticsearch 索引名称
+            es_concurrency: 预期的 Elasticsearch 并发请求数，用于确定连接池大小
         """
         self.chroma_host = chroma_host
         self.chroma_port = chroma_port
         self.es_host = es_host
         self.es_port = es_port
         self.es_index = es_index
+        self.es_concurrency = es_concurrency
         
         self._chroma_client = None
         self._es_client = None
@@ -53,6 +168,9 @@ class DataCleanupService:
     async def _get_chroma_client(self):
         """获取或创建 ChromaDB 客户端"""
         if self._chroma_client is None:
+            # 延迟导入，--help 等不需要连接数据库的调用不必加载 chromadb
+            import chromadb
+            
             try:
                 self._chroma_client = await chromadb.AsyncHttpClient(
                     host=self.chroma_host, 
@@ -67,14 +185,23 @@ class DataCleanupService:
     async def _get_es_client(self):
         """获取或创建 Elasticsearch 客户端"""
         if self._es_client is None:
+            # 延迟导入，只有真正访问 Elasticsearch 时才加载客户端
+            from elasticsearch import AsyncElasticsearch
+            
             try:
                 self._es_client = AsyncElasticsearch(
                     hosts=[{"host": self.es_host, "port": self.es_port, "scheme": "http"}],
                     verify_certs=False,
                     ssl_show_warn=False,
-                    request_timeout=30,
+                    # delete_by_query 等待删除完成，超时时间放宽
+                    request_timeout=60,
                     retry_on_timeout=True,
-                    max_retries=3
+                    max_retries=3,
+                    # 连接池不小于并发数，keep-alive 连接在整个清理过程中复用
+                    node_class="aiohttp",
+                    connections_per_node=max(self.es_concurrency, 10),
+                    http_compress=True,
+                    sniff_on_start=False
                 )
                 # 测试连接
                 info = await self._es_client.info()
@@ -102,302 +229,666 @@ class DataCleanupService:
             logger.error(f"获取 ChromaDB 集合失败: {e}")
             raise
     
-    async def get_all_chromadb_ids(
-        self, 
-        collection_names: Optional[List[str]] = None,
-        batch_size: int = 1000
-    ) -> Set[str]:
+    async def _get_collections_with_counts(
+        self,
+        collection_names: Optional[List[str]]
+    ) -> List[Tuple[str, Any, int]]:
         """
-        获取 ChromaDB 中所有文档的 ID
+        并发获取各集合对象及其文档数
         
         Args:
             collection_names: 要检查的集合名称列表，如果为 None 则检查所有集合
-            batch_size: 批处理大小
             
         Returns:
-            所有文档 ID 的集合
+            (集合名称, 集合对象, 文档数) 列表，获取失败的集合会被跳过
         """
-        try:
-            client = await self._get_chroma_client()
+        client = await self._get_chroma_client()
+        
+        # 如果没有指定集合，获取所有集合
+        if collection_names is None:
+            collection_names = await self.get_chromadb_collections()
+        
+        async def load(collection_name: str) -> Optional[Tuple[str, Any, int]]:
+            try:
+                collection = await client.get_collection(collection_name)
+                total_count = await collection.count()
+                logger.info(f"集合 {collection_name} 共有 {total_count} 个文档")
+                return collection_name, collection, total_count
+            except Exception as e:
+                logger.error(f"获取集合 {collection_name} 失败: {e}")
+                return None
+        
+        results = await asyncio.gather(*[load(name) for name in collection_names])
+        return [result for result in results if result is not None]
+    
+    async def _collect_chromadb_ids(
+        self,
+        collections: List[Tuple[str, Any, int]],
+        batch_size: int,
+        concurrency: int,
+        on_batch: Callable[[List[str]], None]
+    ) -> int:
+        """
+        并发分页读取 ChromaDB 文档 ID，每取到一批就交给 on_batch 处理
+        
+        Args:
+            collections: _get_collections_with_counts 返回的集合列表
+            batch_size: 批处理大小
+            concurrency: 同时进行的 ChromaDB 读取请求数
+            on_batch: 处理每批 ID 的回调
             
-            # 如果没有指定集合，获取所有集合
-            if collection_names is None:
-                collection_names = await self.get_chromadb_collections()
+        Returns:
+            读取到的 ID 总数（未去重）
+        """
+        # 所有集合共用一个信号量，集合之间也并发扫描
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        
+        async def scan_collection(collection_name: str, collection: Any, total_count: int) -> int:
+            if total_count == 0:
+                return 0
             
-            all_ids = set()
+            # 按已知总数预先计算偏移量，并发发出多个 get 请求。
+            # ChromaDB 的 get 不支持按 ID 做 keyset 分页（where 只能过滤 metadata），
+            # offset 越大服务端扫描越多，因此用较大的批次减少请求次数
+            offsets = list(range(0, total_count, batch_size))
             
-            for collection_name in collection_names:
+            async def fetch(offset: int, limit: int) -> int:
                 try:
-                    logger.info(f"正在获取集合 {collection_name} 的文档 ID...")
-                    
-                    collection = await client.get_collection(collection_name)
-                    total_count = await collection.count()
-                    
-                    logger.info(f"集合 {collection_name} 共有 {total_count} 个文档")
-                    
-                    if total_count == 0:
-                        continue
-                    
-                    # 分批获取 ID
-                    offset = 0
-                    while offset < total_count:
-                        current_batch_size = min(batch_size, total_count - offset)
-                        
+                    async with semaphore:
                         results = await collection.get(
-                            limit=current_batch_size,
+                            limit=limit,
                             offset=offset,
                             include=[]  # 只获取 ID，不需要其他数据
                         )
-                        
-                        if not results or not results.get('ids'):
-                            break
-                        
-                        batch_ids = results['ids']
-                        all_ids.update(batch_ids)
-                        
-                        logger.info(f"已获取 {len(batch_ids)} 个 ID (总计: {len(all_ids)})")
-                        offset += current_batch_size
-                    
-                    logger.info(f"✅ 集合 {collection_name} 完成，获取 {len(all_ids)} 个 ID")
-                    
                 except Exception as e:
-                    logger.error(f"获取集合 {collection_name} 的 ID 失败: {e}")
-                    continue
-            
-            logger.info(f"🎉 ChromaDB 总共有 {len(all_ids)} 个唯一文档 ID")
-            return all_ids
+                    if not _is_timeout_error(e) or limit <= MIN_CHROMA_BATCH_SIZE:
+                        raise
+                    # 超时则把该批拆成两半重试
+                    half = limit // 2
+                    logger.warning(f"集合 {collection_name} 偏移 {offset} 读取超时，批次减半为 {half} 后重试")
+                    first, second = await asyncio.gather(
+                        fetch(offset, half),
+                        fetch(offset + half, limit - half)
+                    )
+                    return first + second
+                batch_ids = results.get('ids', []) if results else []
+                on_batch(batch_ids)
+                return len(batch_ids)
             
-        except Exception as e:
-            logger.error(f"获取 ChromaDB 文档 ID 失败: {e}")
-            raise
+            try:
+                logger.info(f"正在获取集合 {collection_name} 的文档 ID...")
+                batch_counts = await asyncio.gather(*[
+                    fetch(offset, min(batch_size, total_count - offset))
+                    for offset in offsets
+                ])
+                logger.info(f"✅ 集合 {collection_name} 完成，获取 {sum(batch_counts)} 个 ID")
+                return sum(batch_counts)
+            except Exception as e:
+                logger.error(f"获取集合 {collection_name} 的 ID 失败: {e}")
+                return 0
+        
+        fetched_counts = await asyncio.gather(*[
+            scan_collection(name, collection, total_count)
+            for name, collection, total_count in collections
+        ])
+        return sum(fetched_counts)
     
-    async def get_all_es_ids(self, batch_size: int = 1000) -> Set[str]:
+    async def build_chromadb_id_index(
+        self,
+        collection_names: Optional[List[str]] = None,
+        batch_size: int = DEFAULT_CHROMA_BATCH_SIZE,
+        concurrency: int = DEFAULT_CHROMA_CONCURRENCY
+    ) -> ChromaIdIndex:
         """
-        获取 Elasticsearch 中所有文档的 ID
+        将 ChromaDB 中所有文档 ID 写入紧凑索引
+        
+        索引不保存 Python 字符串，内存占用远小于 ID 集合。
+        退回 Bloom 过滤器时，误判只会让少量孤立文档被保留，不会误删 ChromaDB 中存在的文档
         
         Args:
+            collection_names: 要检查的集合名称列表，如果为 None 则检查所有集合
             batch_size: 批处理大小
+            concurrency: 同时进行的 ChromaDB 读取请求数
             
         Returns:
-            所有文档 ID 的集合
+            包含所有 ChromaDB 文档 ID 的索引
         """
         try:
-            es_client = await self._get_es_client()
-            
-            # 检查索引是否存在
-            try:
-                exists_response = await es_client.indices.exists(index=self.es_index)
-                if not exists_response:
-                    logger.warning(f"Elasticsearch 索引 {self.es_index} 不存在")
-                    return set()
-            except Exception as e:
-                logger.error(f"检查索引存在性失败: {e}")
-                # 尝试直接搜索，如果索引不存在会返回错误
-                pass
-            
-            logger.info(f"正在获取 Elasticsearch 索引 {self.es_index} 的所有文档 ID...")
-            
-            all_ids = set()
+            collections = await self._get_collections_with_counts(collection_names)
             
-            # 使用 scroll API 获取所有文档 ID
-            search_body = {
-                "query": {"match_all": {}},
-                "_source": False,  # 不需要文档内容，只要 ID
-                "size": batch_size
-            }
+            # 文档总数用于确定 Bloom 过滤器容量
+            estimated_total = sum(total_count for _, _, total_count in collections)
             
-            try:
-                response = await es_client.search(
-                    index=self.es_index,
-                    body=search_body,
-                    scroll="5m"
-                )
-            except Exception as e:
-                if "index_not_found_exception" in str(e).lower():
-                    logger.warning(f"Elasticsearch 索引 {self.es_index} 不存在")
-                    return set()
-                else:
-                    raise
-            
-            scroll_id = response.get("_scroll_id")
-            hits = response["hits"]["hits"]
-            
-            while hits:
-                # 提取当前批次的 ID
-                batch_ids = [hit["_id"] for hit in hits]
-                all_ids.update(batch_ids)
-                
-                logger.info(f"已获取 {len(batch_ids)} 个 ID (总计: {len(all_ids)})")
-                
-                # 获取下一批数据
-                if scroll_id:
-                    response = await es_client.scroll(
-                        scroll_id=scroll_id,
-                        scroll="5m"
-                    )
-                    hits = response["hits"]["hits"]
-                else:
-                    break
-            
-            # 清理 scroll
-            if scroll_id:
-                await es_client.clear_scroll(scroll_id=scroll_id)
+            index = ChromaIdIndex(capacity=estimated_total)
+            await self._collect_chromadb_ids(
+                collections, batch_size, concurrency, index.add_batch
+            )
+            index.finalize()
             
-            logger.info(f"🎉 Elasticsearch 总共有 {len(all_ids)} 个文档 ID")
-            return all_ids
+            index_type = "Bloom 过滤器" if index.uses_bloom else "排序字节数组"
+            logger.info(f"🎉 ChromaDB 总共有 {len(index)} 个唯一文档 ID 已写入{index_type}")
+            return index
             
         except Exception as e:
-            logger.error(f"获取 Elasticsearch 文档 ID 失败: {e}")
+            logger.error(f"获取 ChromaDB 文档 ID 失败: {e}")
             raise
     
+    async def count_es_documents(self) -> Optional[int]:
+        """
+        用 _count 获取 Elasticsearch 索引中的文档数
+        
+        Returns:
+            文档数，索引不存在或查询失败时返回 None
+        """
+        try:
+            es_client = await self._get_es_client()
+            response = await es_client.count(index=self.es_index)
+            return response.get("count")
+        except Exception as e:
+            logger.warning(f"获取 Elasticsearch 文档数失败: {e}")
+            return None
+    
+    async def _iter_es_id_batches(self, batch_size: int = 1000) -> AsyncIterator[List[str]]:
+        """
+        使用 point-in-time + search_after 分批遍历 Elasticsearch 文档 ID
+
+        相比 scroll API，PIT 不在服务端为每个请求保留 scroll 上下文，
+        按 _shard_doc 排序即可稳定翻页
+
+        Args:
+            batch_size: 批处理大小
+
+        Yields:
+            每批文档 ID 列表
+        """
+        es_client = await self._get_es_client()
+
+        try:
+            pit = await es_client.open_point_in_time(index=self.es_index, keep_alive="5m")
+        except Exception as e:
+            if "index_not_found_exception" in str(e).lower():
+                logger.warning(f"Elasticsearch 索引 {self.es_index} 不存在")
+                return
+            raise
+
+        pit_id = pit["id"]
+        search_after = None
+
+        try:
+            while True:
+                search_body = {
+                    "query": {"match_all": {}},
+                    "sort": [{"_shard_doc": "asc"}],
+                    "pit": {"id": pit_id, "keep_alive": "5m"},
+                    "size": batch_size,
+                    "track_total_hits": False,
+                    "_source": False  # 不需要文档内容，只要 ID
+                }
+                if search_after is not None:
+                    search_body["search_after"] = search_after
+
+                response = await es_client.search(body=search_body)
+
+                # PIT ID 可能在每次响应中更新
+                pit_id = response.get("pit_id", pit_id)
+                hits = response["hits"]["hits"]
+                if not hits:
+                    break
+
+                yield [hit["_id"] for hit in hits]
+                search_after = hits[-1]["sort"]
+        finally:
+            # 清理 PIT
+            try:
+                await es_client.close_point_in_time(id=pit_id)
+            except Exception as e:
+                logger.warning(f"关闭 point-in-time 失败: {e}")
+
     async def find_orphaned_es_documents(
         self, 
         collection_names: Optional[List[str]] = None,
-        batch_size: int = 1000
-    ) -> Set[str]:
+        batch_size: int = 1000,
+        chroma_concurrency: int = DEFAULT_CHROMA_CONCURRENCY,
+        chroma_batch_size: int = DEFAULT_CHROMA_BATCH_SIZE
+    ) -> Tuple[str, int]:
         """
         找出 Elasticsearch 中存在但 ChromaDB 中不存在的文档 ID
         
+        ChromaDB 的 ID 写入紧凑索引，ES 的 ID 流式遍历，
+        孤立 ID 逐行写入临时文件，不在内存中保留完整的 ID 集合
+        
         Args:
             collection_names: 要检查的 ChromaDB 集合名称列表
-            batch_size: 批处理大小
+            batch_size: Elasticsearch 批处理大小
+            chroma_concurrency: 同时进行的 ChromaDB 读取请求数
+            chroma_batch_size: ChromaDB 每次读取的 ID 数量
             
         Returns:
-            需要删除的文档 ID 集合
+            (孤立文档 ID 临时文件路径, 孤立文档数量)，文件每行一个 JSON 字符串
         """
         try:
             logger.info("🔍 开始查找孤立的 Elasticsearch 文档...")
             
-            # 获取 ChromaDB 中的所有 ID
-            chroma_ids = await self.get_all_chromadb_ids(collection_names, batch_size)
-            
-            # 获取 Elasticsearch 中的所有 ID
-            es_ids = await self.get_all_es_ids(batch_size)
+            # ES 文档数与 ChromaDB 扫描并发获取，只用于日志
+            es_total, chroma_index = await asyncio.gather(
+                self.count_es_documents(),
+                self.build_chromadb_id_index(
+                    collection_names, chroma_batch_size, chroma_concurrency
+                )
+            )
+            if es_total is not None:
+                logger.info(f"Elasticsearch 索引 {self.es_index} 预计有 {es_total} 个文档")
             
-            # 找出差集：在 ES 中但不在 ChromaDB 中的 ID
-            orphaned_ids = es_ids - chroma_ids
+            # 流式遍历 Elasticsearch 中的 ID，索引中不存在的即为孤立文档
+            es_count = 0
+            orphaned_count = 0
+            fd, orphaned_path = tempfile.mkstemp(prefix="orphaned_es_ids_", suffix=".jsonl")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    async for batch_ids in self._iter_es_id_batches(batch_size):
+                        es_count += len(batch_ids)
+                        for doc_id in chroma_index.missing(batch_ids):
+                            f.write(json.dumps(doc_id) + "\n")
+                            orphaned_count += 1
+            except Exception:
+                os.unlink(orphaned_path)
+                raise
             
-            logger.info(f"📊 数据对比结果:")
-            logger.info(f"   ChromaDB 文档数: {len(chroma_ids)}")
-            logger.info(f"   Elasticsearch 文档数: {len(es_ids)}")
-            logger.info(f"   孤立文档数: {len(orphaned_ids)}")
+            self._log_comparison(len(chroma_index), es_count, orphaned_count)
             
-            return orphaned_ids
+            return orphaned_path, orphaned_count
             
         except Exception as e:
             logger.error(f"查找孤立文档失败: {e}")
             raise
     
+    @staticmethod
+    def iter_orphaned_ids(orphaned_path: str) -> Iterator[str]:
+        """
+        逐行读取孤立文档 ID 文件
+        
+        Args:
+            orphaned_path: find_orphaned_es_documents 生成的文件路径
+            
+        Yields:
+            文档 ID
+        """
+        with open(orphaned_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    
+    async def _suspend_index_refresh(self) -> Dict[str, Any]:
+        """
+        关闭索引刷新并改为异步 translog
+        
+        Returns:
+            修改前的设置，用于恢复；未显式设置的项为 None，恢复时会重置为默认值
+        """
+        es_client = await self._get_es_client()
+        
+        response = await es_client.indices.get_settings(index=self.es_index)
+        index_settings = response.get(self.es_index, {}).get("settings", {}).get("index", {})
+        previous = {
+            "refresh_interval": index_settings.get("refresh_interval"),
+            "translog": {"durability": index_settings.get("translog", {}).get("durability")}
+        }
+        
+        await es_client.indices.put_settings(
+            index=self.es_index,
+            body={"index": {"refresh_interval": "-1", "translog": {"durability": "async"}}}
+        )
+        logger.info(f"已暂停索引 {self.es_index} 的刷新")
+        return previous
+    
+    async def _restore_index_refresh(self, previous: Dict[str, Any]) -> None:
+        """
+        恢复索引刷新设置，并清理删除产生的已删除文档段
+        
+        Args:
+            previous: _suspend_index_refresh 返回的原设置
+        """
+        es_client = await self._get_es_client()
+        
+        try:
+            await es_client.indices.put_settings(index=self.es_index, body={"index": previous})
+            logger.info(f"已恢复索引 {self.es_index} 的刷新设置")
+        except Exception as e:
+            logger.error(f"恢复索引 {self.es_index} 刷新设置失败，请手动检查: {e}")
+            return
+        
+        try:
+            await es_client.indices.forcemerge(index=self.es_index, only_expunge_deletes=True)
+            logger.info(f"已清理索引 {self.es_index} 中的已删除文档")
+        except Exception as e:
+            logger.warning(f"清理已删除文档失败: {e}")
+    
+    @staticmethod
+    def _split_id_batches(
+        document_ids: Iterable[str],
+        batch_size: int,
+        max_chunk_bytes: int
+    ) -> Iterator[List[str]]:
+        """
+        按数量和字节数切分 ID，避免单个请求体过大
+        
+        Args:
+            document_ids: 文档 ID 可迭代对象，会被惰性消费
+            batch_size: 每批最大 ID 数量
+            max_chunk_bytes: 每批 ID 的最大字节数
+            
+        Yields:
+            每批文档 ID 列表
+        """
+        id_iter = iter(document_ids)
+        while True:
+            chunk = list(islice(id_iter, batch_size))
+            if not chunk:
+                break
+            
+            # 每个 ID 按 UTF-8 字节数计算，并额外计入引号和逗号
+            if sum(len(doc_id.encode("utf-8")) for doc_id in chunk) + 3 * len(chunk) <= max_chunk_bytes:
+                yield chunk
+                continue
+            
+            # 少见的超长 ID 批次再按字节数细分
+            current = []
+            current_bytes = 0
+            for doc_id in chunk:
+                id_bytes = len(doc_id.encode("utf-8")) + 3
+                if current and current_bytes + id_bytes > max_chunk_bytes:
+                    yield current
+                    current = []
+                    current_bytes = 0
+                current.append(doc_id)
+                current_bytes += id_bytes
+            if current:
+                yield current
+    
+    async def _delete_batches(
+        self,
+        batches: AsyncIterator[List[str]],
+        concurrency: int,
+        verify: bool = False,
+        total_batches: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        并发执行分批删除
+        
+        Args:
+            batches: 每批要删除的 ID 列表，会被惰性消费
+            concurrency: 同时进行的删除请求数
+            verify: 删除前是否先用 mget 确认文档仍然存在
+            total_batches: 预计批次数，仅用于日志
+            
+        Returns:
+            删除结果统计
+        """
+        es_client = await self._get_es_client()
+        
+        deleted_count = 0
+        failed_count = 0
+        errors = []
+        
+        # 限制同时进行的 delete_by_query 请求数量
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        
+        async def delete_batch(batch_num: int, batch_ids: List[str]) -> None:
+            nonlocal deleted_count, failed_count
+            try:
+                batch_label = f"{batch_num}/{total_batches}" if total_batches else str(batch_num)
+                logger.info(f"正在处理第 {batch_label} 批 ({len(batch_ids)} 个文档)...")
+                if verify:
+                    batch_ids = await self._filter_existing_ids(batch_ids)
+                    if not batch_ids:
+                        logger.info(f"第 {batch_num} 批文档均已不存在，跳过")
+                        return
+                # 由 ES 协调节点按分片并行删除，不存在的 ID 会被直接忽略
+                response = await es_client.delete_by_query(
+                    index=self.es_index,
+                    # 预先用 orjson 序列化为字节，客户端会原样发送，不再逐个编码 ID
+                    body=orjson.dumps({"query": {"ids": {"values": batch_ids}}}),
+                    conflicts="proceed",
+                    slices="auto",
+                    refresh=False,
+                    wait_for_completion=True
+                )
+            except Exception as e:
+                logger.error(f"❌ 第 {batch_num} 批删除失败: {e}")
+                failed_count += len(batch_ids)
+                errors.append(f"批次 {batch_num} 整体失败: {str(e)}")
+                return
+            finally:
+                semaphore.release()
+            
+            deleted_count += response.get("deleted", 0)
+            for failure in response.get("failures", []):
+                failed_count += 1
+                error_msg = failure.get("cause", {}).get("reason", "未知错误")
+                errors.append(f"删除 {failure.get('id')} 失败: {error_msg}")
+            
+            logger.info(f"✅ 第 {batch_num} 批完成 (成功: {deleted_count}, 失败: {failed_count})")
+        
+        previous_settings = None
+        tasks = []
+        try:
+            # 先获取信号量再创建任务，ID 只在有空闲并发槽时才被读取和切分
+            batch_num = 0
+            async for batch_ids in batches:
+                if previous_settings is None:
+                    # 大批量删除期间暂停刷新，避免产生大量小段；没有要删除的批次时不改动索引设置
+                    previous_settings = await self._suspend_index_refresh()
+                batch_num += 1
+                await semaphore.acquire()
+                tasks.append(asyncio.create_task(delete_batch(batch_num, batch_ids)))
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if previous_settings is not None:
+                await self._restore_index_refresh(previous_settings)
+        
+        return {
+            "deleted": deleted_count,
+            "failed": failed_count,
+            "errors": errors
+        }
+    
+    async def _filter_existing_ids(self, batch_ids: List[str]) -> List[str]:
+        """
+        用 mget 检查哪些 ID 仍然存在于索引中
+        
+        Args:
+            batch_ids: 待检查的 ID 列表
+            
+        Returns:
+            仍然存在的 ID 列表
+        """
+        es_client = await self._get_es_client()
+        response = await es_client.mget(
+            index=self.es_index,
+            body={"ids": batch_ids},
+            _source=False
+        )
+        return [doc["_id"] for doc in response.get("docs", []) if doc.get("found")]
+    
+    @staticmethod
+    def _log_comparison(chroma_count: int, es_count: int, orphaned_count: int) -> None:
+        """输出 ChromaDB 与 Elasticsearch 的数据对比结果"""
+        logger.info("📊 数据对比结果:")
+        logger.info(f"   ChromaDB 文档数: {chroma_count}")
+        logger.info(f"   Elasticsearch 文档数: {es_count}")
+        logger.info(f"   孤立文档数: {orphaned_count}")
+    
+    @staticmethod
+    def _log_delete_result(result: Dict[str, Any]) -> None:
+        """输出删除结果统计"""
+        errors = result["errors"]
+        
+        logger.info(f"🎉 删除完成:")
+        logger.info(f"   成功删除: {result['deleted']}")
+        logger.info(f"   删除失败: {result['failed']}")
+        
+        if errors:
+            logger.warning(f"   错误数量: {len(errors)}")
+            for error in errors[:5]:  # 只显示前5个错误
+                logger.warning(f"     {error}")
+            if len(errors) > 5:
+                logger.warning(f"     ... 还有 {len(errors) - 5} 个错误")
+    
     async def delete_es_documents(
         self, 
-        document_ids: Set[str], 
-        batch_size: int = 100,
-        dry_run: bool = False
+        document_ids: Iterable[str], 
+        batch_size: int = 1000,
+        dry_run: bool = False,
+        concurrency: int = DEFAULT_ES_CONCURRENCY,
+        max_chunk_bytes: int = DEFAULT_MAX_CHUNK_BYTES,
+        total_docs: Optional[int] = None,
+        verify: bool = False
     ) -> Dict[str, Any]:
         """
         删除 Elasticsearch 中的指定文档
         
         Args:
-            document_ids: 要删除的文档 ID 集合
+            document_ids: 要删除的文档 ID，可以是集合或惰性读取的生成器
             batch_size: 批处理大小
             dry_run: 是否为试运行模式
+            concurrency: 同时进行的删除请求数
+            max_chunk_bytes: 单个删除请求中 ID 列表的最大字节数
+            total_docs: 文档总数，document_ids 无法取长度时需要提供
+            verify: 删除前是否先用 mget 确认文档仍然存在
             
         Returns:
             删除结果统计
         """
-        if not document_ids:
+        if total_docs is None:
+            total_docs = len(document_ids)
+        
+        if not total_docs:
             logger.info("没有需要删除的文档")
             return {"deleted": 0, "failed": 0, "errors": []}
         
+        if dry_run:
+            logger.info(f"🧪 试运行模式：将删除 {total_docs} 个文档")
+            return {"deleted": total_docs, "failed": 0, "errors": []}
+        
         try:
-            es_client = await self._get_es_client()
+            logger.info(f"🗑️  开始删除 {total_docs} 个文档...")
             
-            total_docs = len(document_ids)
-            deleted_count = 0
-            failed_count = 0
-            errors = []
+            async def iter_batches() -> AsyncIterator[List[str]]:
+                for batch_ids in self._split_id_batches(document_ids, batch_size, max_chunk_bytes):
+                    yield batch_ids
             
-            if dry_run:
-                logger.info(f"🧪 试运行模式：将删除 {total_docs} 个文档")
-                return {"deleted": total_docs, "failed": 0, "errors": []}
+            total_batches = math.ceil(total_docs / batch_size)
+            result = await self._delete_batches(iter_batches(), concurrency, verify, total_batches)
+            self._log_delete_result(result)
+            return result
             
-            logger.info(f"🗑️  开始删除 {total_docs} 个文档...")
+        except Exception as e:
+            logger.error(f"删除 Elasticsearch 文档失败: {e}")
+            raise
+    
+    async def stream_delete_orphaned_documents(
+        self,
+        collection_names: Optional[List[str]] = None,
+        batch_size: int = 1000,
+        delete_batch_size: int = 1000,
+        concurrency: int = DEFAULT_ES_CONCURRENCY,
+        chroma_concurrency: int = DEFAULT_CHROMA_CONCURRENCY,
+        chroma_batch_size: int = DEFAULT_CHROMA_BATCH_SIZE,
+        verify: bool = False
+    ) -> Dict[str, Any]:
+        """
+        边扫描 Elasticsearch 边删除孤立文档
+        
+        ChromaDB 索引建好后，生产者任务遍历 ES 的 ID 放入有界队列，
+        消费端逐批比对并立即提交删除，扫描和删除两个阶段重叠执行。
+        不需要先统计孤立文档总数，因此只用于无需确认的正式清理
+        
+        Args:
+            collection_names: 要检查的 ChromaDB 集合名称列表
+            batch_size: Elasticsearch 批处理大小
+            delete_batch_size: 删除操作的批处理大小
+            concurrency: 同时进行的删除请求数
+            chroma_concurrency: 同时进行的 ChromaDB 读取请求数
+            chroma_batch_size: ChromaDB 每次读取的 ID 数量
+            verify: 删除前是否先用 mget 确认文档仍然存在
             
-            # 将 ID 列表转换为列表并分批处理
-            id_list = list(document_ids)
+        Returns:
+            删除结果统计
+        """
+        try:
+            logger.info("🔍 开始流式查找并删除孤立的 Elasticsearch 文档...")
             
-            for i in range(0, len(id_list), batch_size):
-                batch_ids = id_list[i:i + batch_size]
-                batch_num = i // batch_size + 1
-                total_batches = (len(id_list) + batch_size - 1) // batch_size
-                
-                logger.info(f"正在处理第 {batch_num}/{total_batches} 批 ({len(batch_ids)} 个文档)...")
-                
+            # ES 文档数与 ChromaDB 扫描并发获取，只用于日志
+            es_total, chroma_index = await asyncio.gather(
+                self.count_es_documents(),
+                self.build_chromadb_id_index(
+                    collection_names, chroma_batch_size, chroma_concurrency
+                )
+            )
+            if es_total is not None:
+                logger.info(f"Elasticsearch 索引 {self.es_index} 预计有 {es_total} 个文档")
+            
+            # ChromaDB 索引就绪后再开始遍历 ES，避免生产者长时间阻塞导致 PIT 过期
+            queue: asyncio.Queue = asyncio.Queue(maxsize=64)
+            
+            async def produce() -> None:
                 try:
-                    # 构建批量删除请求
-                    bulk_body = []
-                    for doc_id in batch_ids:
-                        bulk_body.append({
-                            "delete": {
-                                "_index": self.es_index,
-                                "_id": doc_id
-                            }
-                        })
-                    
-                    # 执行批量删除
-                    response = await es_client.bulk(body=bulk_body)
-                    
-                    # 处理响应
-                    if response.get("errors"):
-                        for item in response["items"]:
-                            delete_result = item.get("delete", {})
-                            if delete_result.get("status") in [200, 404]:  # 200=删除成功, 404=文档不存在
-                                deleted_count += 1
-                            else:
-                                failed_count += 1
-                                error_msg = delete_result.get("error", {}).get("reason", "未知错误")
-                                errors.append(f"删除 {delete_result.get('_id')} 失败: {error_msg}")
-                    else:
-                        # 没有错误，所有文档都删除成功
-                        deleted_count += len(batch_ids)
-                    
-                    logger.info(f"✅ 第 {batch_num} 批完成 (成功: {deleted_count}, 失败: {failed_count})")
-                    
-                except Exception as e:
-                    logger.error(f"❌ 第 {batch_num} 批删除失败: {e}")
-                    failed_count += len(batch_ids)
-                    errors.append(f"批次 {batch_num} 整体失败: {str(e)}")
-            
-            result = {
-                "deleted": deleted_count,
-                "failed": failed_count,
-                "errors": errors
-            }
-            
-            logger.info(f"🎉 删除完成:")
-            logger.info(f"   成功删除: {deleted_count}")
-            logger.info(f"   删除失败: {failed_count}")
-            
-            if errors:
-                logger.warning(f"   错误数量: {len(errors)}")
-                for error in errors[:5]:  # 只显示前5个错误
-                    logger.warning(f"     {error}")
-                if len(errors) > 5:
-                    logger.warning(f"     ... 还有 {len(errors) - 5} 个错误")
+                    async for batch_ids in self._iter_es_id_batches(batch_size):
+                        await queue.put(batch_ids)
+                finally:
+                    await queue.put(None)
+            
+            es_count = 0
+            orphaned_count = 0
+            
+            async def orphan_batches() -> AsyncIterator[List[str]]:
+                nonlocal es_count, orphaned_count
+                pending = []
+                while True:
+                    batch_ids = await queue.get()
+                    if batch_ids is None:
+                        break
+                    es_count += len(batch_ids)
+                    orphans = chroma_index.missing(batch_ids)
+                    orphaned_count += len(orphans)
+                    pending.extend(orphans)
+                    # 攒够一批再提交，避免每个 ES 批次只删除零星几个文档
+                    while len(pending) >= delete_batch_size:
+                        yield pending[:delete_batch_size]
+                        pending = pending[delete_batch_size:]
+                if pending:
+                    yield pending
             
+            producer = asyncio.create_task(produce())
+            try:
+                result = await self._delete_batches(orphan_batches(), concurrency, verify)
+            except BaseException:
+                producer.cancel()
+                raise
+            # 生产者的异常在这里抛出
+            await producer
+            
+            self._log_comparison(len(chroma_index), es_count, orphaned_count)
+            self._log_delete_result(result)
             return result
             
         except Exception as e:
-            logger.error(f"删除 Elasticsearch 文档失败: {e}")
+            logger.error(f"流式清理孤立文档失败: {e}")
             raise
     
     async def cleanup_orphaned_documents(
         self,
         collection_names: Optional[List[str]] = None,
         batch_size: int = 1000,
-        delete_batch_size: int = 100,
+        delete_batch_size: int = 1000,
         dry_run: bool = False,
-        auto_confirm: bool = False
+        auto_confirm: bool = False,
+        concurrency: int = DEFAULT_ES_CONCURRENCY,
+        chroma_concurrency: int = DEFAULT_CHROMA_CONCURRENCY,
+        chroma_batch_size: int = DEFAULT_CHROMA_BATCH_SIZE,
+        verify: bool = False
     ) -> Dict[str, Any]:
         """
         清理孤立的 Elasticsearch 文档
@@ -408,58 +899,116 @@ class DataCleanupService:
             delete_batch_size: 删除操作的批处理大小
             dry_run: 是否为试运行模式
             auto_confirm: 是否自动确认删除
+            concurrency: 同时进行的删除请求数
+            chroma_concurrency: 同时进行的 ChromaDB 读取请求数
+            chroma_batch_size: ChromaDB 每次读取的 ID 数量
+            verify: 删除前是否先用 mget 确认文档仍然存在
             
         Returns:
             清理结果统计
         """
         try:
+            # 无需确认的正式清理直接边扫描边删除
+            if auto_confirm and not dry_run:
+                return await self.stream_delete_orphaned_documents(
+                    collection_names,
+                    batch_size,
+                    delete_batch_size,
+                    concurrency,
+                    chroma_concurrency,
+                    chroma_batch_size,
+                    verify
+                )
+            
             # 1. 查找孤立文档
-            orphaned_ids = await self.find_orphaned_es_documents(collection_names, batch_size)
-            
-            if not orphaned_ids:
-                logger.info("✅ 没有发现孤立的文档，数据已同步")
-                return {"deleted": 0, "failed": 0, "errors": []}
-            
-            # 2. 显示要删除的文档信息
-            logger.warning(f"⚠️  发现 {len(orphaned_ids)} 个孤立文档需要删除")
-            
-            # 显示部分 ID 作为示例
-            sample_ids = list(orphaned_ids)[:10]
-            logger.info("示例文档 ID:")
-            for i, doc_id in enumerate(sample_ids, 1):
-                logger.info(f"  {i}. {doc_id}")
-            if len(orphaned_ids) > 10:
-                logger.info(f"  ... 还有 {len(orphaned_ids) - 10} 个文档")
-            
-            # 3. 确认删除
-            if not dry_run and not auto_confirm:
-                print(f"\n⚠️  警告：即将删除 {len(orphaned_ids)} 个 Elasticsearch 文档！")
-                print("这些文档在 ChromaDB 中不存在，可能是数据不同步导致的。")
-                print("删除后无法恢复，请确保这是您想要的操作。")
-                
-                while True:
-                    confirm = input("\n是否继续删除？(yes/no): ").strip().lower()
-                    if confirm in ['yes', 'y']:
-                        break
-                    elif confirm in ['no', 'n']:
-                        logger.info("用户取消了删除操作")
-                        return {"deleted": 0, "failed": 0, "errors": [], "cancelled": True}
-                    else:
-                        print("请输入 'yes' 或 'no'")
-            
-            # 4. 执行删除
-            result = await self.delete_es_documents(
-                orphaned_ids, 
-                delete_batch_size, 
-                dry_run
+            orphaned_path, orphaned_count = await self.find_orphaned_es_documents(
+                collection_names, batch_size, chroma_concurrency, chroma_batch_size
             )
             
-            return result
+            try:
+                return await self._confirm_and_delete(
+                    orphaned_path,
+                    orphaned_count,
+                    delete_batch_size,
+                    dry_run,
+                    auto_confirm,
+                    concurrency,
+                    verify
+                )
+            finally:
+                os.unlink(orphaned_path)
             
         except Exception as e:
             logger.error(f"清理孤立文档失败: {e}")
             raise
     
+    async def _confirm_and_delete(
+        self,
+        orphaned_path: str,
+        orphaned_count: int,
+        delete_batch_size: int,
+        dry_run: bool,
+        auto_confirm: bool,
+        concurrency: int,
+        verify: bool = False
+    ) -> Dict[str, Any]:
+        """
+        展示孤立文档、确认后执行删除
+        
+        Args:
+            orphaned_path: 孤立文档 ID 文件路径
+            orphaned_count: 孤立文档数量
+            delete_batch_size: 删除操作的批处理大小
+            dry_run: 是否为试运行模式
+            auto_confirm: 是否自动确认删除
+            concurrency: 同时进行的删除请求数
+            verify: 删除前是否先用 mget 确认文档仍然存在
+            
+        Returns:
+            删除结果统计
+        """
+        if not orphaned_count:
+            logger.info("✅ 没有发现孤立的文档，数据已同步")
+            return {"deleted": 0, "failed": 0, "errors": []}
+        
+        # 2. 显示要删除的文档信息
+        logger.warning(f"⚠️  发现 {orphaned_count} 个孤立文档需要删除")
+        
+        # 显示部分 ID 作为示例
+        sample_ids = list(islice(self.iter_orphaned_ids(orphaned_path), 10))
+        logger.info("示例文档 ID:")
+        for i, doc_id in enumerate(sample_ids, 1):
+            logger.info(f"  {i}. {doc_id}")
+        if orphaned_count > 10:
+            logger.info(f"  ... 还有 {orphaned_count - 10} 个文档")
+        
+        # 3. 确认删除
+        if not dry_run and not auto_confirm:
+            print(f"\n⚠️  警告：即将删除 {orphaned_count} 个 Elasticsearch 文档！")
+            print("这些文档在 ChromaDB 中不存在，可能是数据不同步导致的。")
+            print("删除后无法恢复，请确保这是您想要的操作。")
+            
+            while True:
+                # 在线程中等待输入，不阻塞事件循环，连接的保活不受影响
+                confirm = (await asyncio.to_thread(input, "\n是否继续删除？(yes/no): ")).strip().lower()
+                if confirm in ['yes', 'y']:
+                    break
+                elif confirm in ['no', 'n']:
+                    logger.info("用户取消了删除操作")
+                    return {"deleted": 0, "failed": 0, "errors": [], "cancelled": True}
+                else:
+                    print("请输入 'yes' 或 'no'")
+        
+        # 4. 执行删除，从文件中惰性读取 ID
+        return await self.delete_es_documents(
+            self.iter_orphaned_ids(orphaned_path),
+            delete_batch_size,
+            dry_run,
+            concurrency=concurrency,
+            total_docs=orphaned_count,
+            verify=verify
+        )
+    
     async def close(self):
         """关闭连接"""
         if self._chroma_client:
@@ -539,14 +1088,41 @@ def parse_arguments():
         "--batch-size",
         type=int,
         default=1000,
-        help="获取数据的批处理大小 (默认: 1000)"
+        help="获取 Elasticsearch 数据的批处理大小 (默认: 1000)"
     )
     
     parser.add_argument(
         "--delete-batch-size",
         type=int,
-        default=100,
-        help="删除操作的批处理大小 (默认: 100)"
+        default=1000,
+        help="删除操作每次 delete_by_query 包含的 ID 数量 (默认: 1000)"
+    )
+    
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_ES_CONCURRENCY,
+        help=f"同时进行的删除请求数 (默认: {DEFAULT_ES_CONCURRENCY}，可用 ES_CONCURRENCY 环境变量设置)"
+    )
+    
+    parser.add_argument(
+        "--chroma-batch-size",
+        type=int,
+        default=DEFAULT_CHROMA_BATCH_SIZE,
+        help=f"ChromaDB 每次读取的 ID 数量，超时会自动减半重试 (默认: {DEFAULT_CHROMA_BATCH_SIZE})"
+    )
+    
+    parser.add_argument(
+        "--chroma-concurrency",
+        type=int,
+        default=DEFAULT_CHROMA_CONCURRENCY,
+        help=f"同时进行的 ChromaDB 分页读取请求数 (默认: {DEFAULT_CHROMA_CONCURRENCY})"
+    )
+    
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="删除前先用 mget 确认文档仍然存在，跳过已被删除的文档"
     )
     
     parser.add_argument(
@@ -600,7 +1176,8 @@ async def main():
             chroma_port=args.chroma_port,
             es_host=args.es_host,
             es_port=args.es_port,
-            es_index=args.es_index
+            es_index=args.es_index,
+            es_concurrency=args.concurrency
         )
         
         try:
@@ -610,7 +1187,11 @@ async def main():
                 batch_size=args.batch_size,
                 delete_batch_size=args.delete_batch_size,
                 dry_run=args.dry_run,
-                auto_confirm=args.auto_confirm
+                auto_confirm=args.auto_confirm,
+                concurrency=args.concurrency,
+                chroma_concurrency=args.chroma_concurrency,
+                chroma_batch_size=args.chroma_batch_size,
+                verify=args.verify
             )
             
             if not args.quiet:
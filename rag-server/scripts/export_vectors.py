@@ -2,16 +2,25 @@
 """
 ChromaDB 向量导出脚本
 从 ChromaDB 中拉取所有向量数据，包括文档内容、元数据等信息（不包含向量嵌入）
-支持定时导出模式，每10分钟自动导出数据到JSON文件
+支持定时导出模式，每10分钟自动导出数据到 JSONL（附 .meta.json）或 JSON 文件
 """
 import asyncio
 import sys
 import os
 import argparse
+import csv
+import hashlib
+import io
 import json
+import shutil
 import signal
+import tempfile
 import time
-from typing import List, Dict, Any, Optional
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from itertools import count as count_from, islice, repeat
+from typing import List, Dict, Any, Optional, AsyncIterator, BinaryIO, Tuple
 from datetime import datetime
 from pathlib import Path
 
@@ -19,38 +28,333 @@ from pathlib import Path
 sys.path.append('.')
 
 import chromadb
+from chromadb.config import Settings as ChromaSettings
 from loguru import logger
 
+try:
+    import orjson
+except ImportError:
+    # 未安装 orjson 时退回标准库 json，脚本仍可运行
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    # 未安装 zstandard 时定时导出写出未压缩的 JSON 文件
+    zstandard = None
+
+try:
+    import uvloop
+except ImportError:
+    # 未安装 uvloop 时使用默认事件循环
+    uvloop = None
+
+# 同时导出的集合数量上限，避免压垮 ChromaDB 工作进程
+DEFAULT_MAX_PARALLEL_COLLECTIONS = 4
+# 单个集合内同时在途的分页请求数
+DEFAULT_FETCH_CONCURRENCY = 4
+# ChromaDB HTTP 连接池大小，需覆盖 并行集合数 × 单集合在途请求数
+DEFAULT_HTTP_POOL_SIZE = 32
+# 空闲连接的保活时间（秒），覆盖一轮导出中批次之间的间隙
+HTTP_KEEPALIVE_SECS = 300.0
+# 导出文件的写缓冲大小
+OUTPUT_BUFFER_SIZE = 1 << 20
+# 定时导出文件的 zstd 压缩级别
+ZSTD_COMPRESSION_LEVEL = 3
+# 单个集合导出流水线中排队等待写出的编码批次上限
+PIPELINE_QUEUE_SIZE = 8
+# 定时导出默认保留的最近导出文件数量
+DEFAULT_KEEP_LAST = 24
+# 导出进度日志的最小间隔（秒）
+PROGRESS_LOG_INTERVAL = 1.0
+# 自动调优批处理大小：依次探测的批次大小、单批目标延迟（秒）及取值范围
+AUTO_BATCH_PROBE_SIZES = (64, 512)
+AUTO_BATCH_TARGET_LATENCY = 0.5
+MIN_AUTO_BATCH_SIZE = 50
+MAX_AUTO_BATCH_SIZE = 500
+# 判断集合是否变化时参与哈希的末尾文档 ID 数量
+FINGERPRINT_SAMPLE_SIZE = 64
+# 跳过未变化集合时，保存各集合上一次导出分片的目录名（位于输出目录下）
+PART_CACHE_DIR_NAME = ".export_parts"
+# 元数据中可作为标题的字段，按优先级排列
+TITLE_FIELDS = ('title', 'name', 'filename', 'subject', 'topic')
+# 从正文截取标题时的最大长度
+TITLE_MAX_LENGTH = 50
+# 各输出格式需要从 ChromaDB 拉取的字段，summary 不展示正文，无需拉取 documents
+FORMAT_INCLUDES = {
+    "table": ["documents", "metadatas"],
+    "json": ["documents", "metadatas"],
+    "csv": ["documents", "metadatas"],
+    "summary": ["metadatas"],
+}
+
+
+def _json_dumpb(obj: Any, indent: bool = False) -> bytes:
+    """
+    序列化为 UTF-8 编码的 JSON 字节串，优先使用 orjson
+    
+    Args:
+        obj: 要序列化的对象
+        indent: 是否以 2 空格缩进
+        
+    Returns:
+        JSON 字节串（保留非 ASCII 字符）
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option)
+    return json.dumps(
+        obj, ensure_ascii=False, indent=2 if indent else None, default=asdict
+    ).encode("utf-8")
+
+
+def _encode_batch_rows(
+    results: Dict[str, Any],
+    written: int,
+    collection_name: Optional[str] = None
+) -> Tuple[bytes, int]:
+    """
+    将一批数据转换并编码为 JSON 数组元素片段
+    
+    纯函数，可在进程池中执行
+    
+    Args:
+        results: collection.get 返回的批次数据
+        written: 此前已写出的条数，用于决定首条是否需要分隔符
+        collection_name: 指定时按 JSONL 编码，每行一条并带上 collection 字段
+        
+    Returns:
+        (编码后的字节片段, 写出后的累计条数)
+    """
+    vectors = VectorExporter._transform_batch(results)
+    if collection_name is not None:
+        # 将 collection 字段拼接到每条记录的开头，避免为每条记录额外构造字典
+        prefix = b'{"collection":' + _json_dumpb(collection_name) + b','
+        lines = [prefix + _json_dumpb(vector)[1:] + b"\n" for vector in vectors]
+        return b"".join(lines), written + len(lines)
+    
+    parts = []
+    for vector in vectors:
+        parts.append(b",\n      " if written else b"\n      ")
+        parts.append(_json_dumpb(vector))
+        written += 1
+    return b"".join(parts), written
+
+
+def _assemble_export_file(
+    filepath: Path,
+    export_info: Dict[str, Any],
+    collection_names: List[str],
+    part_paths: List[Path],
+    counts: List[Optional[int]],
+    compress: bool = False,
+    jsonl: bool = False
+):
+    """
+    将各集合的分片文件按顺序拼接为完整的导出文件
+    
+    Args:
+        filepath: 输出文件路径
+        export_info: 导出信息
+        collection_names: 集合名称列表
+        part_paths: 与集合一一对应的分片文件路径
+        counts: 各集合导出的向量数量，导出失败为 None
+        compress: 是否以 zstd 流式压缩写出
+        jsonl: 分片是否为 JSONL 编码，是则直接顺序拼接，导出信息另写入附属文件
+    """
+    write_body = _write_jsonl_body if jsonl else _write_export_body
+    with open(filepath, 'wb', buffering=OUTPUT_BUFFER_SIZE) as raw:
+        if compress:
+            # 多线程压缩，拼接过程中边写边压，不在内存中保留完整内容
+            cctx = zstandard.ZstdCompressor(level=ZSTD_COMPRESSION_LEVEL, threads=-1)
+            with cctx.stream_writer(raw, closefd=False) as out:
+                write_body(out, export_info, collection_names, part_paths, counts)
+        else:
+            write_body(raw, export_info, collection_names, part_paths, counts)
+
+
+def _write_jsonl_body(
+    out: BinaryIO,
+    export_info: Dict[str, Any],
+    collection_names: List[str],
+    part_paths: List[Path],
+    counts: List[Optional[int]]
+):
+    """
+    向输出流顺序写入各集合的 JSONL 分片
+    
+    Args:
+        out: 二进制输出流
+        export_info: 导出信息（写入 .meta.json 附属文件，此处不使用）
+        collection_names: 集合名称列表
+        part_paths: 与集合一一对应的分片文件路径
+        counts: 各集合导出的向量数量，导出失败为 None
+    """
+    for part_path, count in zip(part_paths, counts):
+        if count:
+            with open(part_path, 'rb') as part:
+                shutil.copyfileobj(part, out, OUTPUT_BUFFER_SIZE)
+
+
+def _chroma_http_settings(pool_size: int) -> ChromaSettings:
+    """
+    构造 ChromaDB 客户端的连接池配置
+    
+    连接池相关的配置项只在较新的 chromadb 版本中存在，旧版本的 Settings
+    不认识这些键，因此只传入已安装版本声明过的配置项，其余保持默认。
+    
+    Args:
+        pool_size: 连接池大小
+        
+    Returns:
+        ChromaDB Settings
+    """
+    options = {
+        "chroma_http_keepalive_secs": HTTP_KEEPALIVE_SECS,
+        "chroma_http_max_connections": pool_size,
+        "chroma_http_max_keepalive_connections": pool_size,
+    }
+    # 兼容 pydantic v1（__fields__）与 v2（model_fields）风格的 Settings
+    declared = getattr(ChromaSettings, "model_fields", None) or getattr(ChromaSettings, "__fields__", {})
+    return ChromaSettings(**{key: value for key, value in options.items() if key in declared})
+
+
+def _meta_path(filepath: Path) -> Path:
+    """
+    获取 JSONL 导出文件对应的 .meta.json 附属文件路径
+    
+    Args:
+        filepath: 导出文件路径，如 chromadb_export_20240101_000000.jsonl.zst
+        
+    Returns:
+        附属文件路径，如 chromadb_export_20240101_000000.meta.json
+    """
+    return filepath.with_name(filepath.name.split(".", 1)[0] + ".meta.json")
+
+
+def _write_export_body(
+    out: BinaryIO,
+    export_info: Dict[str, Any],
+    collection_names: List[str],
+    part_paths: List[Path],
+    counts: List[Optional[int]]
+):
+    """
+    向输出流写入导出文件内容
+    
+    Args:
+        out: 二进制输出流
+        export_info: 导出信息
+        collection_names: 集合名称列表
+        part_paths: 与集合一一对应的分片文件路径
+        counts: 各集合导出的向量数量，导出失败为 None
+    """
+    out.write(b'{\n  "export_info": ')
+    out.write(_json_dumpb(export_info))
+    out.write(b',\n  "collections": {')
+    
+    for index, (collection_name, part_path, count) in enumerate(zip(collection_names, part_paths, counts)):
+        out.write(b",\n    " if index else b"\n    ")
+        out.write(_json_dumpb(collection_name) + b": [")
+        # 导出失败的集合与原先一样记为空列表
+        if count:
+            with open(part_path, 'rb') as part:
+                shutil.copyfileobj(part, out, OUTPUT_BUFFER_SIZE)
+            out.write(b"\n    ]")
+        else:
+            out.write(b"]")
+    
+    out.write(b"\n  }\n}\n" if collection_names else b"}\n}\n")
+
+
+def _pick_title(metadata: Dict[str, Any], content: Optional[str]) -> str:
+    """
+    选取用于显示的标题
+    
+    优先使用元数据中的标题字段，其次取文档内容的前50个字符
+    
+    Args:
+        metadata: 文档元数据
+        content: 文档内容
+        
+    Returns:
+        标题
+    """
+    title = next((metadata[field] for field in TITLE_FIELDS if metadata.get(field)), None)
+    if title is not None:
+        return title
+    
+    stripped = content.strip() if content else ""
+    if len(stripped) > TITLE_MAX_LENGTH:
+        return stripped[:TITLE_MAX_LENGTH] + "..."
+    return stripped or "未知标题"
+
+
+@dataclass(slots=True)
+class VectorRow:
+    """单条导出的向量数据（不含向量嵌入）"""
+    id: str
+    title: str  # 用于显示的标题
+    content: str  # 完整文档内容
+    content_length: Optional[int]  # 内容长度，未拉取 documents 时为 None
+    metadata: Optional[Dict[str, Any]] = None  # 完整元数据
+    metadata_keys: Optional[List[str]] = None  # 元数据字段列表
+
 
 class VectorExporter:
     """向量导出器"""
     
-    def __init__(self, host: str = "localhost", port: int = 8000):
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 8000,
+        pool_size: int = DEFAULT_HTTP_POOL_SIZE,
+        precount: bool = True,
+        executor: Optional[Executor] = None
+    ):
         """
         初始化向量导出器
         
         Args:
             host: ChromaDB 服务器地址
             port: ChromaDB 服务器端口
+            pool_size: HTTP 连接池大小（最大连接数与最大保活连接数）
+            precount: 导出前是否先调用 count() 获取文档总数；关闭后以返回不足一批作为结束条件
+            executor: 定时导出时转换与序列化批次数据的执行器，为 None 时使用默认线程池
         """
         self.host = host
         self.port = port
+        self.pool_size = pool_size
+        self.precount = precount
+        self.executor = executor
         self._client = None
+        self._client_lock = asyncio.Lock()
+        # 各集合自动选择的批处理大小，定时导出的后续轮次直接复用
+        self._batch_size_cache: Dict[str, int] = {}
+        # 各集合上一次导出时的 (指纹, 向量数量)，用于跳过未变化的集合
+        self._last_export: Dict[str, Tuple[Tuple[int, str], int]] = {}
         self._running = False
         self._stop_event = asyncio.Event()
         
     async def _get_client(self):
         """获取或创建 ChromaDB 客户端"""
         if self._client is None:
-            try:
-                self._client = await chromadb.AsyncHttpClient(
-                    host=self.host, 
-                    port=self.port
-                )
-                logger.info(f"已连接到 ChromaDB: {self.host}:{self.port}")
-            except Exception as e:
-                logger.error(f"连接 ChromaDB 失败: {e}")
-                raise
+            # 并发导出时只创建一个客户端，所有集合共享同一个连接池；
+            # 底层 httpx 会按已安装的解码库（brotli 等）自动声明 Accept-Encoding 并解压响应
+            async with self._client_lock:
+                if self._client is None:
+                    try:
+                        self._client = await chromadb.AsyncHttpClient(
+                            host=self.host, 
+                            port=self.port,
+                            settings=_chroma_http_settings(self.pool_size)
+                        )
+                        logger.info(f"已连接到 ChromaDB: {self.host}:{self.port} (连接池: {self.pool_size})")
+                    except Exception as e:
+                        logger.error(f"连接 ChromaDB 失败: {e}")
+                        raise
         return self._client
     
     async def list_collections(self) -> List[str]:
@@ -71,6 +375,38 @@ class VectorExporter:
             logger.error(f"列出集合失败: {e}")
             raise
     
+    async def resolve_collection_names(
+        self,
+        collection_names: Optional[List[str]] = None
+    ) -> List[str]:
+        """
+        确定要导出的集合列表
+        
+        未指定时返回服务器上的所有集合；指定时按原顺序去重，
+        并剔除服务器上不存在的集合，避免导出中途失败
+        
+        Args:
+            collection_names: 用户指定的集合名称列表
+            
+        Returns:
+            去重且确认存在的集合名称列表
+        """
+        available = await self.list_collections()
+        if collection_names is None:
+            return available
+        
+        seen = set()
+        unique_names = [name for name in collection_names if not (name in seen or seen.add(name))]
+        if len(unique_names) < len(collection_names):
+            logger.warning(f"集合列表中存在重复项，已去重: {unique_names}")
+        
+        available_set = set(available)
+        missing = [name for name in unique_names if name not in available_set]
+        if missing:
+            logger.warning(f"以下集合在服务器上不存在，已跳过: {missing}")
+        
+        return [name for name in unique_names if name in available_set]
+    
     async def get_collection_info(self, collection_name: str) -> Dict[str, Any]:
         """
         获取集合信息
@@ -95,167 +431,536 @@ class VectorExporter:
             logger.error(f"获取集合 {collection_name} 信息失败: {e}")
             raise
     
-    async def export_collection_vectors(
-        self, 
-        collection_name: str, 
-        batch_size: int = 1000
-    ) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _transform_batch(
+        results: Dict[str, Any],
+        with_metadata: bool = True,
+        with_metadata_keys: bool = True
+    ) -> List[VectorRow]:
         """
-        导出集合中的所有向量数据
+        将一批 collection.get 的返回结果转换为向量数据列表
         
         Args:
-            collection_name: 集合名称
-            batch_size: 批处理大小
+            results: collection.get 返回的批次数据
+            with_metadata: 是否保留完整元数据字典
+            with_metadata_keys: 是否生成元数据字段列表
             
         Returns:
-            向量数据列表，包含完整的文档信息（除向量嵌入外）
+            向量数据列表
         """
-        try:
-            client = await self._get_client()
-            collection = await client.get_collection(collection_name)
+        ids = results.get('ids', [])
+        documents = results.get('documents')
+        metadatas = results.get('metadatas')
+        
+        # 未拉取 documents 时内容长度未知，记为 None
+        has_content = documents is not None
+        
+        # ChromaDB 返回的平行数组等长，直接 zip，未拉取的字段用占位值补齐
+        rows = zip(
+            ids,
+            documents if has_content else repeat(""),
+            metadatas if metadatas is not None else repeat(None)
+        )
+        
+        batch_vectors = []
+        for doc_id, content, metadata in rows:
+            metadata = metadata or {}
+            title = _pick_title(metadata, content)
             
-            logger.info(f"开始导出集合 {collection_name} 的向量数据...")
+            # 构建向量数据，元数据及其字段列表只在输出需要时保留
+            batch_vectors.append(VectorRow(
+                id=doc_id,
+                title=title,
+                content=content,
+                content_length=(len(content) if content else 0) if has_content else None,
+                metadata=metadata if with_metadata else None,
+                metadata_keys=list(metadata) if with_metadata_keys else None
+            ))
+        
+        return batch_vectors
+    
+    async def _probe_batch_size(
+        self,
+        collection,
+        total_count: Optional[int],
+        include: List[str]
+    ) -> Tuple[int, List[Dict[str, Any]], Optional[int]]:
+        """
+        通过探测请求估算合适的批处理大小
+        
+        依次按 AUTO_BATCH_PROBE_SIZES 拉取集合开头的数据并计时，按
+        耗时 = 固定开销 + 条数 × 单条耗时 拟合，选取单批耗时不超过
+        AUTO_BATCH_TARGET_LATENCY 的批次大小。探测拉到的数据作为导出结果返回
+        
+        Args:
+            collection: ChromaDB 集合
+            total_count: 集合文档总数，未预先统计时为 None
+            include: 需要拉取的字段
+            
+        Returns:
+            (批处理大小, 探测得到的批次数据, 后续批次的起始偏移量)，
+            探测时已取完集合则偏移量为 None
+        """
+        timings = []
+        probes = []
+        offset = 0
+        
+        for size in AUTO_BATCH_PROBE_SIZES:
+            if total_count is not None and offset >= total_count:
+                break
             
+            start = time.perf_counter()
+            results = await collection.get(limit=size, offset=offset, include=include)
+            elapsed = time.perf_counter() - start
+            
+            returned = len(results.get('ids') or []) if results else 0
+            if returned:
+                probes.append(results)
+                timings.append((returned, elapsed))
+                offset += returned
+            if returned < size:
+                # 集合已取完，无需继续探测
+                return MAX_AUTO_BATCH_SIZE, probes, None
+        
+        if len(timings) < len(AUTO_BATCH_PROBE_SIZES):
+            # 未完成全部探测即已达到文档总数
+            return MAX_AUTO_BATCH_SIZE, probes, None
+        
+        (small_size, small_time), (large_size, large_time) = timings[0], timings[-1]
+        per_item = max((large_time - small_time) / (large_size - small_size), 1e-6)
+        fixed = max(small_time - small_size * per_item, 0.0)
+        batch_size = round((AUTO_BATCH_TARGET_LATENCY - fixed) / per_item)
+        batch_size = min(max(batch_size, MIN_AUTO_BATCH_SIZE), MAX_AUTO_BATCH_SIZE)
+        
+        return batch_size, probes, offset
+    
+    async def iter_collection_batches(
+        self, 
+        collection_name: str, 
+        batch_size: Optional[int] = None,
+        fetch_concurrency: int = DEFAULT_FETCH_CONCURRENCY,
+        include: Optional[List[str]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        逐批产出集合中的原始数据
+        
+        按偏移量顺序维护一个最多 fetch_concurrency 个在途请求的预取窗口，
+        每处理完一批就补发下一批，内存占用只与窗口大小相关
+        
+        Args:
+            collection_name: 集合名称
+            batch_size: 批处理大小，为 None 时自动调优
+            fetch_concurrency: 同时在途的分页请求数
+            include: 需要拉取的字段，默认拉取 documents 和 metadatas
+            
+        Yields:
+            collection.get 返回的批次数据（ids/documents/metadatas 平行数组）
+        """
+        client = await self._get_client()
+        collection = await client.get_collection(collection_name)
+        
+        logger.info(f"开始导出集合 {collection_name} 的向量数据...")
+        
+        total_count = None
+        if self.precount:
             # 获取集合中的文档总数
             total_count = await collection.count()
             logger.info(f"集合 {collection_name} 共有 {total_count} 个文档")
             
             if total_count == 0:
                 logger.warning(f"集合 {collection_name} 为空")
-                return []
-            
-            all_vectors = []
+                return
+        
+        if include is None:
+            include = ["documents", "metadatas"]
+        
+        def _batch_limit(offset: int) -> int:
+            # 计算当前批次的大小，未知总数时按完整批次请求
+            if total_count is None:
+                return batch_size
+            return min(batch_size, total_count - offset)
+        
+        last_log_time = 0.0
+        
+        def _log_progress():
+            # 进度日志每 PROGRESS_LOG_INTERVAL 秒最多输出一次
+            nonlocal last_log_time
+            now = time.monotonic()
+            if now - last_log_time < PROGRESS_LOG_INTERVAL:
+                return
+            last_log_time = now
+            progress = f"{exported}/{total_count}" if total_count is not None else f"{exported}"
+            logger.info(f"✅ 集合 {collection_name} 已处理 {progress} 个向量")
+        
+        async def _fetch(offset: int):
+            current_batch_size = _batch_limit(offset)
+            logger.debug(f"正在获取第 {offset + 1}-{offset + current_batch_size} 个文档...")
+            return await collection.get(
+                limit=current_batch_size,
+                offset=offset,
+                include=include
+            )
+        
+        exported = 0
+        start_offset = 0
+        
+        if batch_size is None and collection_name in self._batch_size_cache:
+            batch_size = self._batch_size_cache[collection_name]
+            logger.debug(f"集合 {collection_name} 复用已选择的批处理大小: {batch_size}")
+        
+        if batch_size is None:
+            # 未指定批处理大小时先探测，探测拉到的数据直接产出
+            batch_size, probes, start_offset = await self._probe_batch_size(
+                collection, total_count, include
+            )
+            logger.info(f"集合 {collection_name} 自动选择批处理大小: {batch_size}")
+            if start_offset is not None:
+                # 探测时已取完的小集合拟合结果不可靠，不缓存
+                self._batch_size_cache[collection_name] = batch_size
+            for results in probes:
+                exported += len(results['ids'])
+                _log_progress()
+                yield results
             
-            # 分批获取数据以避免内存问题
-            offset = 0
-            while offset < total_count:
+            if start_offset is None:
+                logger.info(f"🎉 成功导出集合 {collection_name} 的 {exported} 个向量")
+                return
+        
+        # 分批获取数据以避免单次请求过大；未知总数时持续请求直到返回不足一批
+        if total_count is not None:
+            offsets = iter(range(start_offset, total_count, batch_size))
+        else:
+            offsets = count_from(start_offset, batch_size)
+        pending = deque(
+            (offset, asyncio.create_task(_fetch(offset)))
+            for offset in islice(offsets, max(1, fetch_concurrency))
+        )
+        
+        try:
+            while pending:
+                if self._stop_event.is_set():
+                    # 收到停止信号后不再发出新请求，未完成的预取在 finally 中取消
+                    logger.warning(f"⏹️ 收到停止信号，集合 {collection_name} 导出中断")
+                    break
+                
+                offset, task = pending.popleft()
+                
+                # 先补发下一批，让网络请求与本批处理重叠
+                next_offset = next(offsets, None)
+                if next_offset is not None:
+                    pending.append((next_offset, asyncio.create_task(_fetch(next_offset))))
+                
+                current_batch_size = _batch_limit(offset)
                 try:
-                    # 计算当前批次的大小
-                    current_batch_size = min(batch_size, total_count - offset)
-                    
-                    logger.info(f"正在获取第 {offset + 1}-{offset + current_batch_size} 个文档...")
-                    
-                    # 获取当前批次的数据
-                    results = await collection.get(
-                        limit=current_batch_size,
-                        offset=offset,
-                        include=["documents", "metadatas"]
-                    )
-                    
-                    if not results or not results.get('ids'):
-                        logger.warning(f"批次 {offset}-{offset + current_batch_size} 没有返回数据")
-                        break
-                    
-                    # 处理当前批次的数据
-                    ids = results.get('ids', [])
-                    documents = results.get('documents', [])
-                    metadatas = results.get('metadatas', [])
-                    
-                    batch_vectors = []
-                    for i, doc_id in enumerate(ids):
-                        # 获取文档内容
-                        content = documents[i] if i < len(documents) else ""
-                        
-                        # 获取元数据
-                        metadata = metadatas[i] if i < len(metadatas) and metadatas[i] else {}
-                        
-                        # 提取标题信息（用于显示）
-                        title = "未知标题"
-                        if metadata:
-                            # 尝试多种可能的标题字段名
-                            title_fields = ['title', 'name', 'filename', 'subject', 'topic']
-                            for field in title_fields:
-                                if field in metadata and metadata[field]:
-                                    title = metadata[field]
-                                    break
-                        
-                        # 如果 metadata 中没有标题，尝试从文档内容中提取
-                        if title == "未知标题" and content:
-                            # 取文档内容的前50个字符作为标题
-                            if content.strip():
-                                title = content.strip()[:50]
-                                if len(content.strip()) > 50:
-                                    title += "..."
-                        
-                        # 构建完整的向量数据
-                        vector_data = {
-                            "id": doc_id,
-                            "title": title,  # 用于显示的标题
-                            "content": content,  # 完整文档内容
-                            "metadata": metadata,  # 完整元数据
-                            "content_length": len(content) if content else 0,  # 内容长度
-                            "metadata_keys": list(metadata.keys()) if metadata else []  # 元数据字段列表
-                        }
-                        batch_vectors.append(vector_data)
-                    
-                    all_vectors.extend(batch_vectors)
-                    logger.info(f"✅ 成功处理 {len(batch_vectors)} 个向量 (总计: {len(all_vectors)}/{total_count})")
-                    
-                    offset += current_batch_size
-                    
+                    results = await task
                 except Exception as e:
+                    if total_count is None:
+                        # 未知总数时无法判断集合是否已取完，继续请求可能永不结束，按集合导出失败处理
+                        raise
+                    # 单个批次失败不影响其他批次
                     logger.error(f"处理批次 {offset}-{offset + current_batch_size} 时发生错误: {e}")
-                    # 继续处理下一批次
-                    offset += batch_size
                     continue
+                
+                if not results or not results.get('ids'):
+                    # 未知总数时空页是集合正常结束（包括总数恰为批次大小整数倍或空集合）
+                    if total_count is not None:
+                        logger.warning(f"批次 {offset}-{offset + current_batch_size} 没有返回数据")
+                    break
+                
+                exported += len(results['ids'])
+                _log_progress()
+                
+                yield results
+                
+                # 返回不足一批说明集合已到末尾（可能被并发删除缩小），不再等待后续批次
+                if len(results['ids']) < current_batch_size:
+                    break
+        finally:
+            # 消费方提前退出时取消尚未完成的预取请求
+            for _, task in pending:
+                task.cancel()
+        
+        logger.info(f"🎉 成功导出集合 {collection_name} 的 {exported} 个向量")
+    
+    async def iter_collection_vectors(
+        self, 
+        collection_name: str, 
+        batch_size: Optional[int] = None,
+        fetch_concurrency: int = DEFAULT_FETCH_CONCURRENCY,
+        include: Optional[List[str]] = None,
+        with_metadata: bool = True,
+        with_metadata_keys: bool = True
+    ) -> AsyncIterator[VectorRow]:
+        """
+        逐条产出集合中的向量数据
+        
+        Args:
+            collection_name: 集合名称
+            batch_size: 批处理大小，为 None 时自动调优
+            fetch_concurrency: 同时在途的分页请求数
+            include: 需要拉取的字段，默认拉取 documents 和 metadatas
+            with_metadata: 是否保留完整元数据字典
+            with_metadata_keys: 是否生成元数据字段列表
+            
+        Yields:
+            向量数据，包含完整的文档信息（除向量嵌入外）
+        """
+        async for results in self.iter_collection_batches(
+            collection_name, batch_size, fetch_concurrency, include
+        ):
+            for vector_data in self._transform_batch(results, with_metadata, with_metadata_keys):
+                yield vector_data
+    
+    async def _export_collection_part(
+        self,
+        collection_name: str,
+        part_path: Path,
+        batch_size: Optional[int],
+        fetch_concurrency: int,
+        include_content: bool = True,
+        jsonl: bool = False
+    ) -> Optional[int]:
+        """
+        将单个集合流式导出到分片文件
+        
+        拉取、编码、写盘三个阶段经有界队列串联：拉取端持续取批次并提交给执行器编码，
+        写出端按顺序等待编码结果并在工作线程中写盘，三者互相重叠
+        
+        Args:
+            collection_name: 集合名称
+            part_path: 分片文件路径
+            batch_size: 批处理大小，为 None 时自动调优
+            fetch_concurrency: 同时在途的分页请求数
+            include_content: 是否拉取文档内容，为 False 时只拉取元数据
+            jsonl: 是否按 JSONL 编码分片
             
-            logger.info(f"🎉 成功导出集合 {collection_name} 的 {len(all_vectors)} 个向量")
-            return all_vectors
+        Returns:
+            导出的向量数量，失败时返回 None
+        """
+        include = FORMAT_INCLUDES["json"] if include_content else FORMAT_INCLUDES["summary"]
+        line_collection = collection_name if jsonl else None
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        written = 0
+        
+        async def _produce():
+            # 拉取批次并立即提交编码；已拉取条数可直接得到，编码不必等前一批完成
+            fetched = 0
+            async for results in self.iter_collection_batches(
+                collection_name, batch_size, fetch_concurrency, include
+            ):
+                # 转换与序列化交给执行器（线程池或进程池），不阻塞其他集合的请求
+                await queue.put(loop.run_in_executor(
+                    self.executor, _encode_batch_rows, results, fetched, line_collection
+                ))
+                fetched += len(results['ids'])
+            await queue.put(None)
+        
+        async def _write(fp: BinaryIO):
+            # 按提交顺序写出编码结果
+            nonlocal written
+            while (future := await queue.get()) is not None:
+                chunk, written = await future
+                await asyncio.to_thread(fp.write, chunk)
+        
+        try:
+            logger.info(f"📊 开始处理集合: {collection_name}")
+            with open(part_path, 'wb', buffering=OUTPUT_BUFFER_SIZE) as fp:
+                try:
+                    async with asyncio.TaskGroup() as tg:
+                        tg.create_task(_produce())
+                        tg.create_task(_write(fp))
+                except ExceptionGroup as eg:
+                    # 任一阶段失败时另一阶段已被取消，只上报首个错误
+                    raise eg.exceptions[0]
+            
+            if self._stop_event.is_set():
+                # 中断的集合数据不完整，按导出失败处理
+                return None
+            
+            logger.info(f"✅ 集合 {collection_name} 导出完成，共 {written} 个向量")
+            return written
             
         except Exception as e:
-            logger.error(f"导出集合 {collection_name} 向量失败: {e}")
-            raise
+            logger.error(f"❌ 处理集合 {collection_name} 失败: {e}")
+            return None
     
-    async def export_all_vectors(
-        self, 
+    async def _collection_fingerprint(self, collection_name: str) -> Tuple[int, str]:
+        """
+        计算集合的轻量指纹
+        
+        由文档总数和末尾 FINGERPRINT_SAMPLE_SIZE 个文档 ID 的 blake2b 哈希组成，
+        只需一次 count 和一次不含内容的 get；无法发现仅修改文档内容而 ID 不变的更新
+        
+        Args:
+            collection_name: 集合名称
+            
+        Returns:
+            (文档总数, 末尾 ID 哈希)
+        """
+        client = await self._get_client()
+        collection = await client.get_collection(collection_name)
+        count = await collection.count()
+        tail = await collection.get(
+            limit=FINGERPRINT_SAMPLE_SIZE,
+            offset=max(0, count - FINGERPRINT_SAMPLE_SIZE),
+            include=[]
+        )
+        
+        digest = hashlib.blake2b(digest_size=16)
+        for doc_id in tail.get('ids') or []:
+            digest.update(doc_id.encode("utf-8"))
+            digest.update(b"\0")
+        return count, digest.hexdigest()
+    
+    async def write_export_file(
+        self,
+        filepath: Path,
+        export_info: Dict[str, Any],
         collection_names: Optional[List[str]] = None,
-        batch_size: int = 1000
-    ) -> Dict[str, List[Dict[str, Any]]]:
+        batch_size: Optional[int] = None,
+        max_parallel_collections: int = DEFAULT_MAX_PARALLEL_COLLECTIONS,
+        fetch_concurrency: int = DEFAULT_FETCH_CONCURRENCY,
+        skip_unchanged: bool = False,
+        compress: bool = False,
+        include_content: bool = True,
+        jsonl: bool = False
+    ) -> Dict[str, Any]:
         """
-        导出所有集合的向量数据
+        流式导出集合并写入单个 JSON 文件
+        
+        各集合并发导出到输出目录下的临时分片文件，全部完成后按顺序拼接为
+        {"export_info": ..., "collections": {...}} 结构，内存占用只与批次大小相关。
+        启用 skip_unchanged 时分片保存在 PART_CACHE_DIR_NAME 目录中，
+        指纹与上次导出一致的集合直接复用上次的分片
         
         Args:
+            filepath: 输出文件路径
+            export_info: 导出信息，统计字段由本方法补全
             collection_names: 要导出的集合名称列表，如果为 None 则导出所有集合
-            batch_size: 批处理大小
+            batch_size: 批处理大小，为 None 时自动调优
+            max_parallel_collections: 同时导出的最大集合数
+            fetch_concurrency: 单个集合内同时在途的分页请求数
+            skip_unchanged: 是否跳过自上次导出后未变化的集合
+            compress: 是否以 zstd 压缩输出文件
+            include_content: 是否导出文档内容，为 False 时只拉取元数据
+            jsonl: 是否按 JSONL 导出（每行一条记录），导出信息写入 .meta.json 附属文件
             
         Returns:
-            按集合名称分组的向量数据
+            补全 total_collections 与 total_vectors 后的导出信息，
+            导出途中收到停止信号时带有 interrupted 标记
         """
-        try:
-            # 如果没有指定集合，获取所有集合
-            if collection_names is None:
-                collection_names = await self.list_collections()
-            
-            if not collection_names:
-                logger.warning("没有找到任何集合")
-                return {}
-            
-            all_results = {}
+        collection_names = await self.resolve_collection_names(collection_names)
+        semaphore = asyncio.Semaphore(max(1, max_parallel_collections))
+        
+        cache_dir = filepath.parent / PART_CACHE_DIR_NAME
+        if skip_unchanged:
+            cache_dir.mkdir(exist_ok=True)
+        
+        with tempfile.TemporaryDirectory(dir=filepath.parent, prefix=".export_") as tmp_dir:
             
-            for collection_name in collection_names:
-                try:
-                    logger.info(f"📊 开始处理集合: {collection_name}")
+            async def _export_one(index: int, collection_name: str) -> Tuple[Optional[int], Path]:
+                part_path = Path(tmp_dir) / f"{index}.part"
+                async with semaphore:
+                    if self._stop_event.is_set():
+                        # 已收到停止信号，排队中的集合不再开始导出
+                        return None, part_path
                     
-                    # 获取集合信息
-                    info = await self.get_collection_info(collection_name)
-                    logger.info(f"集合 {collection_name} 包含 {info['count']} 个文档")
+                    if not skip_unchanged:
+                        count = await self._export_collection_part(
+                            collection_name, part_path, batch_size, fetch_concurrency, include_content, jsonl
+                        )
+                        return count, part_path
                     
-                    # 导出向量信息
-                    vectors = await self.export_collection_vectors(collection_name, batch_size)
-                    all_results[collection_name] = vectors
+                    cached_path = cache_dir / f"{collection_name}.part"
+                    try:
+                        fingerprint = await self._collection_fingerprint(collection_name)
+                    except Exception as e:
+                        logger.warning(f"计算集合 {collection_name} 指纹失败，执行完整导出: {e}")
+                        fingerprint = None
                     
-                    logger.info(f"✅ 集合 {collection_name} 导出完成，共 {len(vectors)} 个向量")
+                    previous = self._last_export.get(collection_name)
+                    if fingerprint is not None and previous and previous[0] == fingerprint and cached_path.exists():
+                        logger.info(f"⏭️ 集合 {collection_name} 自上次导出后未变化，复用上次结果")
+                        return previous[1], cached_path
                     
-                except Exception as e:
-                    logger.error(f"❌ 处理集合 {collection_name} 失败: {e}")
-                    all_results[collection_name] = []
-                    continue
+                    count = await self._export_collection_part(
+                        collection_name, part_path, batch_size, fetch_concurrency, include_content, jsonl
+                    )
+                    if count is None:
+                        return None, part_path
+                    
+                    # 导出成功的分片移入缓存目录，供下一轮比较后复用
+                    os.replace(part_path, cached_path)
+                    if fingerprint is not None:
+                        self._last_export[collection_name] = (fingerprint, count)
+                    else:
+                        self._last_export.pop(collection_name, None)
+                    return count, cached_path
             
-            return all_results
+            async with asyncio.TaskGroup() as tg:
+                tasks = [
+                    tg.create_task(_export_one(index, name))
+                    for index, name in enumerate(collection_names)
+                ]
+            counts = [task.result()[0] for task in tasks]
+            part_paths = [task.result()[1] for task in tasks]
             
-        except Exception as e:
-            logger.error(f"导出所有向量失败: {e}")
-            raise
+            export_info = {
+                **export_info,
+                "total_collections": len(collection_names),
+                "total_vectors": sum(count or 0 for count in counts)
+            }
+            if self._stop_event.is_set():
+                export_info["interrupted"] = True
+            # 先写入临时文件再原子替换，读取方不会看到写了一半的导出文件
+            tmp_filepath = filepath.with_name(f".{filepath.name}.tmp")
+            try:
+                await asyncio.to_thread(
+                    _assemble_export_file,
+                    tmp_filepath, export_info, collection_names, part_paths, counts, compress, jsonl
+                )
+                os.replace(tmp_filepath, filepath)
+            finally:
+                tmp_filepath.unlink(missing_ok=True)
+        
+        if jsonl:
+            meta_path = _meta_path(filepath)
+            tmp_meta_path = meta_path.with_name(f".{meta_path.name}.tmp")
+            tmp_meta_path.write_bytes(_json_dumpb(export_info, indent=True))
+            os.replace(tmp_meta_path, meta_path)
+        
+        return export_info
+    
+    @staticmethod
+    def prune_exports(output_path: Path, keep_last: int) -> int:
+        """
+        删除超出保留数量的旧导出文件
+        
+        Args:
+            output_path: 导出目录
+            keep_last: 保留最近的文件数量，小于等于 0 时不清理
+            
+        Returns:
+            删除的文件数量
+        """
+        if keep_last <= 0:
+            return 0
+        
+        # .meta.json 附属文件随对应的 JSONL 文件一起删除，不单独计数
+        files = sorted(
+            (p for p in output_path.glob("chromadb_export_*.json*") if not p.name.endswith(".meta.json")),
+            key=lambda p: p.stat().st_mtime
+        )
+        removed = 0
+        for old in files[:-keep_last]:
+            try:
+                old.unlink(missing_ok=True)
+                _meta_path(old).unlink(missing_ok=True)
+                removed += 1
+            except OSError as e:
+                logger.warning(f"删除旧导出文件 {old.name} 失败: {e}")
+        return removed
     
     def stop(self):
         """停止定时导出"""
@@ -266,8 +971,15 @@ class VectorExporter:
         self, 
         output_dir: str = "./exports",
         collection_names: Optional[List[str]] = None,
-        batch_size: int = 1000,
-        interval_minutes: int = 10
+        batch_size: Optional[int] = None,
+        interval_minutes: int = 10,
+        max_parallel_collections: int = DEFAULT_MAX_PARALLEL_COLLECTIONS,
+        fetch_concurrency: int = DEFAULT_FETCH_CONCURRENCY,
+        skip_unchanged: bool = False,
+        compress: bool = True,
+        include_content: bool = True,
+        keep_last: int = DEFAULT_KEEP_LAST,
+        file_format: str = "jsonl"
     ):
         """
         定时导出向量数据
@@ -275,11 +987,22 @@ class VectorExporter:
         Args:
             output_dir: 输出目录
             collection_names: 要导出的集合名称列表
-            batch_size: 批处理大小
+            batch_size: 批处理大小，为 None 时自动调优
             interval_minutes: 导出间隔（分钟）
+            max_parallel_collections: 同时导出的最大集合数
+            fetch_concurrency: 单个集合内同时在途的分页请求数
+            skip_unchanged: 是否复用自上次导出后未变化的集合
+            compress: 是否以 zstd 压缩导出文件（.json.zst）
+            include_content: 是否导出文档内容，为 False 时只导出标题与元数据
+            keep_last: 保留最近的导出文件数量，小于等于 0 时全部保留
+            file_format: 导出文件格式，jsonl 每行一条记录并附带 .meta.json，json 为单个 JSON 对象
         """
         self._running = True
         
+        if compress and zstandard is None:
+            logger.warning("未安装 zstandard，导出文件将不压缩")
+            compress = False
+        
         # 创建输出目录
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
@@ -291,6 +1014,7 @@ class VectorExporter:
         
         export_count = 0
         
+        # 每轮导出复用同一个客户端及其连接池，不在循环内重新创建
         while self._running:
             try:
                 export_count += 1
@@ -298,43 +1022,46 @@ class VectorExporter:
                 
                 logger.info(f"📊 开始第 {export_count} 次导出 ({start_time.strftime('%Y-%m-%d %H:%M:%S')})")
                 
-                # 导出数据
-                results = await self.export_all_vectors(
-                    collection_names=collection_names,
-                    batch_size=batch_size
-                )
-                
                 # 生成文件名（包含时间戳）
                 timestamp = start_time.strftime("%Y%m%d_%H%M%S")
-                filename = f"chromadb_export_{timestamp}.json"
+                filename = f"chromadb_export_{timestamp}.{file_format}" + (".zst" if compress else "")
                 filepath = output_path / filename
                 
-                # 构建导出数据结构
-                export_data = {
-                    "export_info": {
+                # 边导出边写入JSON文件
+                export_info = await self.write_export_file(
+                    filepath,
+                    {
                         "timestamp": start_time.isoformat(),
                         "export_count": export_count,
                         "chromadb_host": self.host,
-                        "chromadb_port": self.port,
-                        "total_collections": len(results),
-                        "total_vectors": sum(len(vectors) for vectors in results.values())
+                        "chromadb_port": self.port
                     },
-                    "collections": results
-                }
-                
-                # 写入JSON文件
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump(export_data, f, ensure_ascii=False, indent=2)
+                    collection_names=collection_names,
+                    batch_size=batch_size,
+                    max_parallel_collections=max_parallel_collections,
+                    fetch_concurrency=fetch_concurrency,
+                    skip_unchanged=skip_unchanged,
+                    compress=compress,
+                    include_content=include_content,
+                    jsonl=file_format == "jsonl"
+                )
                 
                 end_time = datetime.now()
                 duration = (end_time - start_time).total_seconds()
                 
-                logger.info(f"✅ 第 {export_count} 次导出完成")
+                if export_info.get("interrupted"):
+                    logger.warning(f"⏹️ 第 {export_count} 次导出被中断，文件内容不完整")
+                else:
+                    logger.info(f"✅ 第 {export_count} 次导出完成")
                 logger.info(f"   文件: {filename}")
                 logger.info(f"   大小: {filepath.stat().st_size / 1024 / 1024:.2f} MB")
                 logger.info(f"   耗时: {duration:.2f} 秒")
-                logger.info(f"   集合数: {export_data['export_info']['total_collections']}")
-                logger.info(f"   向量数: {export_data['export_info']['total_vectors']}")
+                logger.info(f"   集合数: {export_info['total_collections']}")
+                logger.info(f"   向量数: {export_info['total_vectors']}")
+                
+                removed = await asyncio.to_thread(self.prune_exports, output_path, keep_last)
+                if removed:
+                    logger.info(f"🧹 已清理 {removed} 个旧导出文件，保留最近 {keep_last} 个")
                 
                 # 等待下次导出或停止信号
                 if self._running:
@@ -373,110 +1100,178 @@ class VectorExporter:
             self._client = None
 
 
-def format_output(results: Dict[str, List[Dict[str, Any]]], output_format: str = "table") -> str:
+async def format_stream(
+    exporter: VectorExporter,
+    collection_names: List[str],
+    output_format: str,
+    fp: BinaryIO,
+    batch_size: Optional[int] = None,
+    fetch_concurrency: int = DEFAULT_FETCH_CONCURRENCY
+) -> Dict[str, int]:
     """
-    格式化输出结果
+    逐条导出并写出格式化结果
+    
+    集合按顺序导出，每批数据到达后在工作线程中格式化并写入 fp，不在内存中保留完整结果；
+    json 格式按批次写出 ChromaDB 原生的 ids/documents/metadatas 平行数组
     
     Args:
-        results: 导出结果
+        exporter: 向量导出器
+        collection_names: 要导出的集合名称列表
         output_format: 输出格式 (table, json, csv, summary)
+        fp: 以二进制模式打开的输出流
+        batch_size: 批处理大小，为 None 时自动调优
+        fetch_concurrency: 单个集合内同时在途的分页请求数
         
     Returns:
-        格式化后的字符串
+        各集合导出的向量数量
     """
-    if output_format == "json":
-        return json.dumps(results, ensure_ascii=False, indent=2)
+    counts: Dict[str, int] = {}
+    
+    def _write(text: str):
+        fp.write(text.encode("utf-8"))
     
+    csv_fp = None
+    csv_writer = None
+    if output_format == "json":
+        _write("{")
     elif output_format == "csv":
-        lines = ["Collection,ID,Title,Content_Length,Metadata_Keys,Content,Metadata"]
-        for collection_name, vectors in results.items():
-            for vector in vectors:
-                # CSV 格式需要处理特殊字符
-                title = vector['title'].replace('"', '""').replace('\n', ' ').replace('\r', ' ')
-                content = vector['content'].replace('"', '""').replace('\n', '\\n').replace('\r', '\\r')
-                metadata_keys = '|'.join(vector.get('metadata_keys', []))
-                metadata_json = json.dumps(vector.get('metadata', {}), ensure_ascii=False).replace('"', '""')
-                
-                lines.append(f'"{collection_name}","{vector["id"]}","{title}","{vector.get("content_length", 0)}","{metadata_keys}","{content}","{metadata_json}"')
-        return '\n'.join(lines)
-    
-    elif output_format == "summary":
-        # 摘要格式：只显示统计信息和基本字段
-        output_lines = []
-        total_vectors = 0
-        
-        for collection_name, vectors in results.items():
-            output_lines.append(f"\n📚 集合: {collection_name}")
-            output_lines.append("=" * 100)
-            
-            if not vectors:
-                output_lines.append("   (空集合)")
-                continue
-            
-            output_lines.append(f"{'序号':<6} {'ID':<36} {'标题':<30} {'内容长度':<10} {'元数据字段'}")
-            output_lines.append("-" * 100)
-            
-            for i, vector in enumerate(vectors, 1):
-                # 限制标题长度以适应表格显示
-                title = vector['title'][:27] + "..." if len(vector['title']) > 27 else vector['title']
-                metadata_keys = ', '.join(vector.get('metadata_keys', []))[:20]
-                if len(', '.join(vector.get('metadata_keys', []))) > 20:
-                    metadata_keys += "..."
-                
-                output_lines.append(f"{i:<6} {vector['id']:<36} {title:<30} {vector.get('content_length', 0):<10} {metadata_keys}")
-            
-            output_lines.append(f"\n小计: {len(vectors)} 个向量")
-            total_vectors += len(vectors)
-        
-        output_lines.append(f"\n🎉 总计: {total_vectors} 个向量")
-        return '\n'.join(output_lines)
+        # 转义交给 csv 模块处理，字段内换行与引号按标准 CSV 规则保留
+        csv_fp = io.TextIOWrapper(fp, encoding="utf-8", newline="", write_through=True)
+        csv_writer = csv.writer(csv_fp, quoting=csv.QUOTE_ALL, lineterminator="\n")
+        csv_writer.writerow(["Collection", "ID", "Title", "Content_Length", "Metadata_Keys", "Content", "Metadata"])
     
-    else:  # table format - 详细格式
-        output_lines = []
-        total_vectors = 0
+    def _write_batch(collection_name: str, results: Dict[str, Any], start: int):
+        # 格式化并写出一批数据，start 为该集合此前已写出的条数
+        if output_format == "json":
+            # JSON 为原生格式：直接写出 ChromaDB 批次的平行数组，跳过逐条转换
+            fp.write(b",\n    " if start else b"\n    ")
+            fp.write(_json_dumpb({
+                'ids': results['ids'],
+                'documents': results.get('documents'),
+                'metadatas': results.get('metadatas')
+            }))
+            return
         
-        for collection_name, vectors in results.items():
-            output_lines.append(f"\n📚 集合: {collection_name}")
-            output_lines.append("=" * 120)
+        # summary 只展示字段列表，table 只展示元数据字典
+        vectors = VectorExporter._transform_batch(
+            results,
+            with_metadata=output_format != "summary",
+            with_metadata_keys=output_format != "table"
+        )
+        # summary 与 table 的输出行先收集起来，每批只编码、写出一次
+        lines: List[str] = []
+        for count, vector in enumerate(vectors, start + 1):
+            if output_format == "csv":
+                csv_writer.writerow([
+                    collection_name,
+                    vector.id,
+                    vector.title,
+                    vector.content_length,
+                    '|'.join(vector.metadata_keys),
+                    vector.content,
+                    _json_dumpb(vector.metadata).decode("utf-8")
+                ])
             
-            if not vectors:
-                output_lines.append("   (空集合)")
-                continue
+            elif output_format == "summary":
+                # 摘要格式：只显示统计信息和基本字段
+                if count == 1:
+                    lines.append(f"{'序号':<6} {'ID':<36} {'标题':<30} {'内容长度':<10} {'元数据字段'}\n")
+                    lines.append("-" * 100 + "\n")
+                
+                # 限制标题和字段列表长度以适应表格显示
+                title = vector.title
+                if len(title) > 27:
+                    title = title[:27] + "..."
+                metadata_keys = ', '.join(vector.metadata_keys)
+                if len(metadata_keys) > 20:
+                    metadata_keys = metadata_keys[:20] + "..."
+                
+                content_length = vector.content_length
+                if content_length is None:
+                    content_length = "-"
+                lines.append(f"{count:<6} {vector.id:<36} {title:<30} {content_length:<10} {metadata_keys}\n")
             
-            for i, vector in enumerate(vectors, 1):
-                output_lines.append(f"\n📄 文档 #{i}")
-                output_lines.append("-" * 60)
-                output_lines.append(f"ID: {vector['id']}")
-                output_lines.append(f"标题: {vector['title']}")
-                output_lines.append(f"内容长度: {vector.get('content_length', 0)} 字符")
+            else:  # table format - 详细格式
+                lines.append(f"\n📄 文档 #{count}\n")
+                lines.append("-" * 60 + "\n")
+                lines.append(f"ID: {vector.id}\n")
+                lines.append(f"标题: {vector.title}\n")
+                lines.append(f"内容长度: {vector.content_length} 字符\n")
                 
                 # 显示元数据
-                metadata = vector.get('metadata', {})
+                metadata = vector.metadata
                 if metadata:
-                    output_lines.append("元数据:")
+                    lines.append("元数据:\n")
                     for key, value in metadata.items():
                         # 限制值的显示长度
                         if isinstance(value, str) and len(value) > 100:
                             display_value = value[:100] + "..."
                         else:
                             display_value = str(value)
-                        output_lines.append(f"  {key}: {display_value}")
+                        lines.append(f"  {key}: {display_value}\n")
                 else:
-                    output_lines.append("元数据: (无)")
+                    lines.append("元数据: (无)\n")
                 
                 # 显示内容预览
-                content = vector.get('content', '')
+                content = vector.content
                 if content:
                     preview = content[:200] + "..." if len(content) > 200 else content
-                    output_lines.append(f"内容预览: {preview}")
+                    lines.append(f"内容预览: {preview}\n")
                 else:
-                    output_lines.append("内容: (空)")
+                    lines.append("内容: (空)\n")
+    
+        
+        if lines:
+            _write("".join(lines))
+    
+    for collection_index, collection_name in enumerate(collection_names):
+        if output_format == "json":
+            fp.write(b",\n  " if collection_index else b"\n  ")
+            fp.write(_json_dumpb(collection_name) + b": [")
+        elif output_format == "summary":
+            _write(f"\n📚 集合: {collection_name}\n")
+            _write("=" * 100 + "\n")
+        elif output_format == "table":
+            _write(f"\n📚 集合: {collection_name}\n")
+            _write("=" * 120 + "\n")
+        
+        count = 0
+        try:
+            logger.info(f"📊 开始处理集合: {collection_name}")
+            async for results in exporter.iter_collection_batches(
+                collection_name, batch_size, fetch_concurrency,
+                include=FORMAT_INCLUDES[output_format]
+            ):
+                # 格式化与写出放到工作线程，事件循环同时继续接收预取中的批次
+                await asyncio.to_thread(_write_batch, collection_name, results, count)
+                count += len(results['ids'])
             
-            output_lines.append(f"\n小计: {len(vectors)} 个向量")
-            total_vectors += len(vectors)
+            logger.info(f"✅ 集合 {collection_name} 导出完成，共 {count} 个向量")
+            
+        except Exception as e:
+            # 已写出的部分保留，继续处理下一个集合
+            logger.error(f"❌ 处理集合 {collection_name} 失败: {e}")
+        
+        counts[collection_name] = count
         
-        output_lines.append(f"\n🎉 总计: {total_vectors} 个向量")
-        return '\n'.join(output_lines)
+        if output_format == "json":
+            _write("\n  ]" if count else "]")
+        elif output_format in ("summary", "table"):
+            if count:
+                _write(f"\n小计: {count} 个向量\n")
+            else:
+                _write("   (空集合)\n")
+    
+    if csv_fp is not None:
+        # 解除包装，避免关闭包装器时连带关闭底层输出流
+        csv_fp.detach()
+    
+    if output_format == "json":
+        _write("\n}\n" if collection_names else "}\n")
+    elif output_format in ("summary", "table"):
+        _write(f"\n🎉 总计: {sum(counts.values())} 个向量\n")
+    
+    return counts
 
 
 def parse_arguments():
@@ -504,7 +1299,7 @@ def parse_arguments():
   # 详细格式显示完整内容和元数据（一次性导出）
   python export_vectors.py --format table
   
-  # 输出为 JSON 格式（包含所有数据）
+  # 输出为 JSON 格式（ChromaDB 原生批次格式: ids/documents/metadatas 平行数组）
   python export_vectors.py --format json
   
   # 输出为 CSV 格式
@@ -535,7 +1330,7 @@ def parse_arguments():
         "--format",
         choices=["table", "summary", "json", "csv"],
         default="summary",
-        help="输出格式: table(详细), summary(摘要), json(JSON), csv(CSV) (默认: summary)"
+        help="输出格式: table(详细), summary(摘要), json(ChromaDB 原生批次格式), csv(CSV) (默认: summary)"
     )
     
     parser.add_argument(
@@ -546,8 +1341,74 @@ def parse_arguments():
     parser.add_argument(
         "--batch-size",
         type=int,
-        default=1000,
-        help="批处理大小 (默认: 1000)"
+        default=None,
+        help=f"批处理大小 (默认: 按探测到的延迟在 {MIN_AUTO_BATCH_SIZE}-{MAX_AUTO_BATCH_SIZE} 之间自动选择)"
+    )
+    
+    parser.add_argument(
+        "--max-parallel-collections",
+        type=int,
+        default=DEFAULT_MAX_PARALLEL_COLLECTIONS,
+        help=f"定时导出模式下同时导出的最大集合数 (默认: {DEFAULT_MAX_PARALLEL_COLLECTIONS})"
+    )
+    
+    parser.add_argument(
+        "--fetch-concurrency",
+        type=int,
+        default=DEFAULT_FETCH_CONCURRENCY,
+        help=f"单个集合内同时在途的分页请求数 (默认: {DEFAULT_FETCH_CONCURRENCY})"
+    )
+    
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=DEFAULT_HTTP_POOL_SIZE,
+        help=f"ChromaDB HTTP 连接池大小 (默认: {DEFAULT_HTTP_POOL_SIZE})"
+    )
+    
+    parser.add_argument(
+        "--no-precount",
+        action="store_true",
+        help="跳过导出前的 count() 请求，以返回不足一批作为集合结束条件"
+    )
+    
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="定时导出时用于转换与序列化的进程数，0 表示使用线程池 (默认: 0)"
+    )
+    
+    parser.add_argument(
+        "--skip-unchanged",
+        action="store_true",
+        help="定时导出时复用文档数与末尾 ID 均未变化的集合的上次结果（无法发现仅修改内容的更新）"
+    )
+    
+    parser.add_argument(
+        "--no-compress",
+        action="store_true",
+        help="定时导出时不使用 zstd 压缩，直接写出 .json 文件"
+    )
+    
+    parser.add_argument(
+        "--no-content",
+        action="store_true",
+        help="定时导出时不拉取文档内容，只导出标题与元数据（summary 格式始终如此）"
+    )
+    
+    parser.add_argument(
+        "--file-format",
+        choices=["jsonl", "json"],
+        default="jsonl",
+        help="定时导出的文件格式：jsonl 每行一条记录并附带 .meta.json，json 为单个 JSON 对象 (默认: jsonl)"
+    )
+    
+    parser.add_argument(
+        "--keep-last",
+        type=int,
+        default=DEFAULT_KEEP_LAST,
+        help=f"定时导出时保留最近的导出文件数量，0 表示全部保留 (默认: {DEFAULT_KEEP_LAST})"
     )
     
     parser.add_argument(
@@ -601,11 +1462,19 @@ async def main():
         else:
             print(f"模式: 一次性导出")
             print(f"输出格式: {args.format}")
-        print(f"批处理大小: {args.batch_size}")
+        print(f"批处理大小: {args.batch_size or '自动'}")
         print("")
     
     # 创建导出器
-    exporter = VectorExporter(host=args.host, port=args.port)
+    # 进程池在整个进程生命周期内复用，避免每轮导出重复创建
+    executor = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 0 else None
+    exporter = VectorExporter(
+        host=args.host,
+        port=args.port,
+        pool_size=args.pool_size,
+        precount=not args.no_precount,
+        executor=executor
+    )
     
     # 设置信号处理器用于优雅退出
     def signal_handler(signum, frame):
@@ -627,33 +1496,45 @@ async def main():
                 output_dir=args.output_dir,
                 collection_names=args.collections,
                 batch_size=args.batch_size,
-                interval_minutes=args.interval
+                interval_minutes=args.interval,
+                max_parallel_collections=args.max_parallel_collections,
+                fetch_concurrency=args.fetch_concurrency,
+                skip_unchanged=args.skip_unchanged,
+                compress=not args.no_compress,
+                include_content=not args.no_content,
+                keep_last=args.keep_last,
+                file_format=args.file_format
             )
         else:
             # 一次性导出模式
             try:
-                # 导出向量数据
-                results = await exporter.export_all_vectors(
-                    collection_names=args.collections,
-                    batch_size=args.batch_size
-                )
-                
-                # 格式化输出
-                output_text = format_output(results, args.format)
+                # 如果没有指定集合，获取所有集合；指定时去重并剔除不存在的集合
+                collection_names = await exporter.resolve_collection_names(args.collections)
                 
-                # 输出结果
+                # 边导出边写出结果，直接写入二进制缓冲区
                 if args.output:
-                    with open(args.output, 'w', encoding='utf-8') as f:
-                        f.write(output_text)
+                    with open(args.output, 'wb', buffering=OUTPUT_BUFFER_SIZE) as f:
+                        counts = await format_stream(
+                            exporter, collection_names, args.format, f,
+                            batch_size=args.batch_size,
+                            fetch_concurrency=args.fetch_concurrency
+                        )
                     if not args.quiet:
                         print(f"\n✅ 结果已保存到: {args.output}")
                 else:
-                    print(output_text)
+                    # 先刷新文本层，避免与前面 print 的内容交错
+                    sys.stdout.flush()
+                    counts = await format_stream(
+                        exporter, collection_names, args.format, sys.stdout.buffer,
+                        batch_size=args.batch_size,
+                        fetch_concurrency=args.fetch_concurrency
+                    )
+                    sys.stdout.buffer.flush()
                 
                 if not args.quiet:
                     # 统计信息
-                    total_collections = len(results)
-                    total_vectors = sum(len(vectors) for vectors in results.values())
+                    total_collections = len(counts)
+                    total_vectors = sum(counts.values())
                     print(f"\n📊 导出统计:")
                     print(f"   集合数量: {total_collections}")
                     print(f"   向量总数: {total_vectors}")
@@ -678,7 +1559,9 @@ async def main():
         sys.exit(1)
     finally:
         await exporter.close()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(main(), loop_factory=uvloop.new_event_loop if uvloop else None)
@@ -2,6 +2,7 @@
 """
 初始化管理员用户脚本
 """
+import argparse
 import asyncio
 import sys
 import os
@@ -12,39 +13,45 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from repositories.admin_user import AdminUserRepository
 
 
-async def create_default_admin():
-    """创建默认管理员用户"""
+async def create_default_admin(list_users: bool = False):
+    """
+    创建默认管理员用户
+    
+    Args:
+        list_users: 是否在创建后列出所有管理员用户
+    """
     print("🔧 正在创建默认管理员用户...")
 
     admin_user_repository = AdminUserRepository()
     
     try:
-        # 创建默认管理员用户
-        admin_user = await admin_user_repository.create_admin_user(
+        # 创建默认管理员用户（已存在时不做修改）
+        admin_user_id = await admin_user_repository.upsert_admin_user(
             username="admin",
             password="admin123",
             email="admin@mathagent.com",
             is_superuser=True
         )
         
-        if admin_user:
+        if admin_user_id is not None:
             print(f"✅ 默认管理员用户创建成功:")
             print(f"   用户名: admin")
             print(f"   密码: admin123")
             print(f"   邮箱: admin@mathagent.com")
-            print(f"   用户ID: {admin_user.id}")
+            print(f"   用户ID: {admin_user_id}")
         else:
             print("❌ 默认管理员用户创建失败 (可能已存在)")
         
-        # 显示所有用户
-        print("\n📋 当前所有管理员用户:")
-        all_users = await admin_user_repository.get_all_admin_users()
-        for user in all_users:
-            status = "✅ 激活" if user.is_active else "❌ 禁用"
-            super_status = "👑 超级用户" if user.is_superuser else "👤 普通用户"
-            print(f"   ID: {user.id}, 用户名: {user.username}, 邮箱: {user.email}, {status}, {super_status}")
-        
-        print(f"\n📊 总计: {len(all_users)} 个管理员用户")
+        # 按需显示所有用户，生产环境初始化无需额外查询
+        if list_users:
+            print("\n📋 当前所有管理员用户:")
+            all_users = await admin_user_repository.get_all_admin_users()
+            for user in all_users:
+                status = "✅ 激活" if user.is_active else "❌ 禁用"
+                super_status = "👑 超级用户" if user.is_superuser else "👤 普通用户"
+                print(f"   ID: {user.id}, 用户名: {user.username}, 邮箱: {user.email}, {status}, {super_status}")
+            
+            print(f"\n📊 总计: {len(all_users)} 个管理员用户")
         
     except Exception as e:
         print(f"❌ 创建管理员用户时发生错误: {e}")
@@ -55,10 +62,18 @@ async def create_default_admin():
 
 async def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="初始化管理员用户")
+    parser.add_argument(
+        "--list",
+        action="store_true",
+        help="创建后列出所有管理员用户"
+    )
+    args = parser.parse_args()
+    
     print("🚀 Math Agent RAG 服务 - 管理员用户初始化")
     print("=" * 50)
     
-    success = await create_default_admin()
+    success = await create_default_admin(list_users=args.list)
     
     if success:
         print("\n✅ 初始化完成!")
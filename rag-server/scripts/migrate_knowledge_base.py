@@ -9,31 +9,101 @@ import os
 import argparse
 import aiohttp
 import json
-from typing import List, Dict, Any, Optional
+import orjson
+import math
+from collections import deque
+from itertools import islice
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 from urllib.parse import urljoin
 
 # 添加项目根目录到路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# 源服务分页接口允许的最大每页数量
+PAGE_SIZE = 100
+# 同时向源服务发出的分页请求上限
+DEFAULT_FETCH_CONCURRENCY = 8
+# 同时向目标服务提交批次的工作协程数
+DEFAULT_MIGRATE_WORKERS = 4
+# 已获取、等待提交的批次队列上限，限制内存占用
+MIGRATE_QUEUE_SIZE = 4
+# 源服务与目标服务共用的 HTTP 连接池：总连接数、单主机连接数、空闲保活时间（秒）、DNS 缓存时间（秒）
+HTTP_POOL_LIMIT = 64
+HTTP_POOL_LIMIT_PER_HOST = 32
+HTTP_KEEPALIVE_TIMEOUT = 60
+HTTP_DNS_CACHE_TTL = 300
+# 单个请求的总超时时间（秒）
+HTTP_TIMEOUT_SECS = 300
+
+# 流式导出/导入请求不限总时长，只限制两次读取之间的间隔（秒）
+STREAM_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_read=HTTP_TIMEOUT_SECS)
+# 旧版服务没有导出/导入接口时返回的状态码
+BULK_UNSUPPORTED_STATUSES = (404, 405)
+# 流式迁移时每转发多少个知识点输出一次进度
+STREAM_PROGRESS_INTERVAL = 500
+
+# 以原始字节发送 JSON 请求体时使用的请求头
+JSON_HEADERS = {"Content-Type": "application/json"}
+# 发送 NDJSON 请求体时使用的请求头
+NDJSON_HEADERS = {"Content-Type": "application/x-ndjson"}
+# 例题字段及其缺省值
+EXAMPLE_DEFAULTS = (("question", ""), ("solution", ""), ("difficulty", "medium"))
+
+
+def convert_knowledge_point_format(knowledge_point: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    转换知识点格式以适配目标服务的批量添加接口
+    
+    Args:
+        knowledge_point: 源格式的知识点
+        
+    Returns:
+        转换后的知识点格式
+    """
+    get = knowledge_point.get
+    return {
+        "title": get("title", ""),
+        "description": get("description", ""),
+        "category": get("category", "general"),
+        # 只保留例题的已知字段，忽略非字典的异常数据
+        "examples": [
+            {key: example.get(key, default) for key, default in EXAMPLE_DEFAULTS}
+            for example in get("examples", ())
+            if isinstance(example, dict)
+        ],
+        "tags": get("tags", [])
+    }
+
 
 class KnowledgeMigrator:
     """知识库迁移器"""
     
-    def __init__(self, source_url: str, target_url: str):
+    def __init__(self, source_url: str, target_url: str, fetch_concurrency: int = DEFAULT_FETCH_CONCURRENCY):
         """
         初始化迁移器
         
         Args:
             source_url: 源服务的基础URL
             target_url: 目标服务的基础URL
+            fetch_concurrency: 同时向源服务发出的分页请求上限
         """
         self.source_url = source_url.rstrip('/')
         self.target_url = target_url.rstrip('/')
         self.session = None
+        self.fetch_concurrency = max(1, fetch_concurrency)
         
     async def __aenter__(self):
         """异步上下文管理器入口"""
-        self.session = aiohttp.ClientSession()
+        # 源与目标共用一个连接池，分页获取和批量提交都复用保活连接
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=HTTP_POOL_LIMIT,
+                limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=HTTP_DNS_CACHE_TTL
+            ),
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT_SECS)
+        )
         return self
         
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -41,103 +111,177 @@ class KnowledgeMigrator:
         if self.session:
             await self.session.close()
     
-    async def fetch_all_knowledge_points(self) -> List[Dict[str, Any]]:
+    async def _fetch_page(self, page: int, limit: int) -> Dict[str, Any]:
         """
-        从源服务获取所有知识点
+        从源服务获取一页知识点
         
+        Args:
+            page: 页码（从1开始）
+            limit: 每页数量
+            
         Returns:
-            所有知识点的列表
+            源服务返回的分页数据，包含 knowledge_points 与 total
         """
-        all_knowledge_points = []
-        page = 1
-        limit = 100  # 每页获取更多数据以减少请求次数
+        url = urljoin(self.source_url, "/api/knowledge-base/documents")
+        params = {
+            "page": page,
+            "limit": limit
+        }
         
-        print(f"📡 开始从源服务获取知识点数据: {self.source_url}")
+        print(f"   正在获取第 {page} 页数据...")
         
-        while True:
-            try:
-                # 构建请求URL
-                url = urljoin(self.source_url, "/api/knowledge-base/documents")
-                params = {
-                    "page": page,
-                    "limit": limit
-                }
+        try:
+            async with self.session.get(url, params=params) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise Exception(f"获取数据失败 (状态码: {response.status}): {error_text}")
                 
-                print(f"   正在获取第 {page} 页数据...")
+                data = orjson.loads(await response.read())
+        except Exception as e:
+            print(f"❌ 获取第 {page} 页数据时发生错误: {e}")
+            raise
+        
+        # 检查响应格式
+        if "knowledge_points" not in data:
+            raise Exception(f"响应格式错误，缺少 knowledge_points 字段: {data}")
+        
+        return data
+    
+    async def iter_knowledge_point_pages(self) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        按页码顺序逐页产出源服务的知识点
+        
+        先获取第一页得到总数，其余各页在容量为 fetch_concurrency 的预取窗口内并发获取
+        
+        Yields:
+            每页的知识点列表
+        """
+        limit = PAGE_SIZE
+        
+        print(f"📡 开始从源服务获取知识点数据: {self.source_url}")
+        
+        first_page = await self._fetch_page(1, limit)
+        knowledge_points = first_page["knowledge_points"]
+        total = first_page.get("total", 0)
+        fetched = len(knowledge_points)
+        print(f"   ✅ 获取到 {fetched} 个知识点 (总计: {fetched}/{total})")
+        yield knowledge_points
+        
+        # 第一页已不足一页说明已经是最后一页
+        if fetched < limit:
+            return
+        
+        pages = iter(range(2, math.ceil(total / limit) + 1))
+        pending = deque(
+            asyncio.create_task(self._fetch_page(page, limit))
+            for page in islice(pages, self.fetch_concurrency)
+        )
+        try:
+            while pending:
+                data = await pending.popleft()
+                # 取走一页后补发下一页，保持窗口内的请求数
+                next_page = next(pages, None)
+                if next_page is not None:
+                    pending.append(asyncio.create_task(self._fetch_page(next_page, limit)))
                 
-                async with self.session.get(url, params=params) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        raise Exception(f"获取数据失败 (状态码: {response.status}): {error_text}")
-                    
-                    data = await response.json()
-                    
-                    # 检查响应格式
-                    if "knowledge_points" not in data:
-                        raise Exception(f"响应格式错误，缺少 knowledge_points 字段: {data}")
-                    
-                    knowledge_points = data["knowledge_points"]
-                    total = data.get("total", 0)
-                    
-                    if not knowledge_points:
-                        print(f"   第 {page} 页没有更多数据，停止获取")
-                        break
-                    
-                    all_knowledge_points.extend(knowledge_points)
-                    print(f"   ✅ 获取到 {len(knowledge_points)} 个知识点 (总计: {len(all_knowledge_points)}/{total})")
-                    
-                    # 如果当前页的数据量小于limit，说明已经是最后一页
-                    if len(knowledge_points) < limit:
-                        print(f"   已获取完所有数据")
-                        break
-                    
-                    page += 1
-                    
-            except Exception as e:
-                print(f"❌ 获取第 {page} 页数据时发生错误: {e}")
-                raise
+                fetched += len(data["knowledge_points"])
+                print(f"   ✅ 获取到 {len(data['knowledge_points'])} 个知识点 (总计: {fetched}/{total})")
+                yield data["knowledge_points"]
+        finally:
+            # 消费方提前退出或出错时取消尚未完成的预取请求
+            for task in pending:
+                task.cancel()
+    
+    async def fetch_all_knowledge_points(self) -> List[Dict[str, Any]]:
+        """
+        从源服务获取所有知识点
+        
+        优先通过导出接口一次取回，源服务不支持时逐页获取
+        
+        Returns:
+            所有知识点的列表
+        """
+        url = urljoin(self.source_url, "/api/knowledge-base/export")
+        async with self.session.get(url, timeout=STREAM_TIMEOUT) as response:
+            if response.status == 200:
+                all_knowledge_points = [orjson.loads(line) async for line in response.content if line.strip()]
+                print(f"🎉 成功获取 {len(all_knowledge_points)} 个知识点")
+                return all_knowledge_points
+            if response.status not in BULK_UNSUPPORTED_STATUSES:
+                error_text = await response.text()
+                raise Exception(f"导出数据失败 (状态码: {response.status}): {error_text}")
+        
+        print("⚠️  源服务不支持导出接口，改为分页获取")
+        all_knowledge_points = []
+        async for knowledge_points in self.iter_knowledge_point_pages():
+            all_knowledge_points.extend(knowledge_points)
         
         print(f"🎉 成功获取 {len(all_knowledge_points)} 个知识点")
         return all_knowledge_points
     
-    def convert_knowledge_point_format(self, knowledge_point: Dict[str, Any]) -> Dict[str, Any]:
+    async def _migrate_batch(self, batch: List[Dict[str, Any]], batch_num: int) -> Tuple[int, int, List[str]]:
         """
-        转换知识点格式以适配目标服务的批量添加接口
+        向目标服务提交一批知识点
         
         Args:
-            knowledge_point: 源格式的知识点
+            batch: 源格式的知识点列表
+            batch_num: 批次序号，用于输出
             
         Returns:
-            转换后的知识点格式
+            (成功数量, 失败数量, 错误信息列表)
         """
-        # 转换例题格式
-        examples = []
-        for example in knowledge_point.get("examples", []):
-            if isinstance(example, dict):
-                examples.append({
-                    "question": example.get("question", ""),
-                    "solution": example.get("solution", ""),
-                    "difficulty": example.get("difficulty", "medium")
-                })
-        
-        # 构建目标格式
-        converted = {
-            "title": knowledge_point.get("title", ""),
-            "description": knowledge_point.get("description", ""),
-            "category": knowledge_point.get("category", "general"),
-            "examples": examples,
-            "tags": knowledge_point.get("tags", [])
-        }
+        print(f"   正在处理第 {batch_num} 批...")
         
-        return converted
+        try:
+            # 转换格式
+            converted_batch = list(map(convert_knowledge_point_format, batch))
+            
+            # 构建请求数据
+            request_data = {
+                "knowledge_points": converted_batch
+            }
+            
+            # 发送批量添加请求
+            url = urljoin(self.target_url, "/api/knowledge-base/batch-documents")
+            
+            # 用 orjson 一次性编码为字节后发送，不经过 aiohttp 默认的标准库 json
+            async with self.session.post(url, data=orjson.dumps(request_data), headers=JSON_HEADERS) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise Exception(f"批量添加失败 (状态码: {response.status}): {error_text}")
+                
+                result = orjson.loads(await response.read())
+            
+            batch_success = result.get("success_count", 0)
+            batch_failed = result.get("failed_count", 0)
+            batch_errors = result.get("errors", [])
+            
+            print(f"   ✅ 第 {batch_num} 批完成: 成功 {batch_success}, 失败 {batch_failed}")
+            
+            if batch_errors:
+                print(f"      错误信息: {batch_errors[:3]}{'...' if len(batch_errors) > 3 else ''}")
+            
+            return batch_success, batch_failed, batch_errors
+            
+        except Exception as e:
+            print(f"❌ 第 {batch_num} 批处理失败: {e}")
+            return 0, len(batch), [f"第 {batch_num} 批整体失败: {str(e)}"]
     
-    async def batch_migrate_knowledge_points(self, knowledge_points: List[Dict[str, Any]], batch_size: int = 50) -> Dict[str, Any]:
+    async def batch_migrate_knowledge_points(
+        self,
+        knowledge_points: List[Dict[str, Any]],
+        batch_size: int = 50,
+        workers: int = DEFAULT_MIGRATE_WORKERS
+    ) -> Dict[str, Any]:
         """
         批量迁移知识点到目标服务
         
+        各批次并发提交，同时在途的批次数不超过 workers
+        
         Args:
             knowledge_points: 知识点列表
             batch_size: 每批次的大小
+            workers: 同时提交的批次数
             
         Returns:
             迁移结果统计
@@ -149,50 +293,21 @@ class KnowledgeMigrator:
         total_failed = 0
         all_errors = []
         
-        # 分批处理
-        for i in range(0, len(knowledge_points), batch_size):
-            batch = knowledge_points[i:i + batch_size]
-            batch_num = i // batch_size + 1
-            total_batches = (len(knowledge_points) + batch_size - 1) // batch_size
-            
-            print(f"   正在处理第 {batch_num}/{total_batches} 批...")
-            
-            try:
-                # 转换格式
-                converted_batch = [self.convert_knowledge_point_format(kp) for kp in batch]
-                
-                # 构建请求数据
-                request_data = {
-                    "knowledge_points": converted_batch
-                }
-                
-                # 发送批量添加请求
-                url = urljoin(self.target_url, "/api/knowledge-base/batch-documents")
-                
-                async with self.session.post(url, json=request_data) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        raise Exception(f"批量添加失败 (状态码: {response.status}): {error_text}")
-                    
-                    result = await response.json()
-                    
-                    batch_success = result.get("success_count", 0)
-                    batch_failed = result.get("failed_count", 0)
-                    batch_errors = result.get("errors", [])
-                    
-                    total_success += batch_success
-                    total_failed += batch_failed
-                    all_errors.extend(batch_errors)
-                    
-                    print(f"   ✅ 第 {batch_num} 批完成: 成功 {batch_success}, 失败 {batch_failed}")
-                    
-                    if batch_errors:
-                        print(f"      错误信息: {batch_errors[:3]}{'...' if len(batch_errors) > 3 else ''}")
-                
-            except Exception as e:
-                print(f"❌ 第 {batch_num} 批处理失败: {e}")
-                total_failed += len(batch)
-                all_errors.append(f"第 {batch_num} 批整体失败: {str(e)}")
+        semaphore = asyncio.Semaphore(max(1, workers))
+        
+        async def _submit(batch: List[Dict[str, Any]], batch_num: int) -> Tuple[int, int, List[str]]:
+            async with semaphore:
+                return await self._migrate_batch(batch, batch_num)
+        
+        # 分批并发处理，gather 按批次顺序返回结果，错误信息顺序与批次一致
+        results = await asyncio.gather(*(
+            _submit(knowledge_points[i:i + batch_size], i // batch_size + 1)
+            for i in range(0, len(knowledge_points), batch_size)
+        ))
+        for batch_success, batch_failed, batch_errors in results:
+            total_success += batch_success
+            total_failed += batch_failed
+            all_errors.extend(batch_errors)
         
         return {
             "total_success": total_success,
@@ -201,28 +316,164 @@ class KnowledgeMigrator:
             "errors": all_errors
         }
     
-    async def migrate(self, batch_size: int = 50) -> bool:
+    async def pipeline_migrate_knowledge_points(self, batch_size: int = 50, workers: int = DEFAULT_MIGRATE_WORKERS) -> Dict[str, Any]:
+        """
+        边获取边迁移知识点
+        
+        生产者逐页获取源数据并切分为批次放入有界队列，多个工作协程同时取出批次提交到目标服务，
+        获取与提交互相重叠，内存占用只与队列容量相关
+        
+        Args:
+            batch_size: 每批次的大小
+            workers: 同时提交批次的工作协程数
+            
+        Returns:
+            迁移结果统计
+        """
+        print(f"📤 开始向目标服务迁移数据: {self.target_url}")
+        print(f"   每批次 {batch_size} 个，{workers} 个并发提交")
+        
+        workers = max(1, workers)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=MIGRATE_QUEUE_SIZE)
+        result = {
+            "total_success": 0,
+            "total_failed": 0,
+            "total_processed": 0,
+            "errors": []
+        }
+        
+        async def _produce():
+            batch: List[Dict[str, Any]] = []
+            batch_num = 0
+            async for knowledge_points in self.iter_knowledge_point_pages():
+                batch.extend(knowledge_points)
+                while len(batch) >= batch_size:
+                    batch_num += 1
+                    await queue.put((batch_num, batch[:batch_size]))
+                    batch = batch[batch_size:]
+            if batch:
+                await queue.put((batch_num + 1, batch))
+            # 每个工作协程一个结束标记
+            for _ in range(workers):
+                await queue.put(None)
+        
+        async def _consume():
+            while (item := await queue.get()) is not None:
+                batch_num, batch = item
+                batch_success, batch_failed, batch_errors = await self._migrate_batch(batch, batch_num)
+                # 统计只在单个事件循环内更新，两次 await 之间不会被打断，无需加锁
+                result["total_success"] += batch_success
+                result["total_failed"] += batch_failed
+                result["total_processed"] += len(batch)
+                result["errors"].extend(batch_errors)
+        
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(_produce())
+            for _ in range(workers):
+                tg.create_task(_consume())
+        
+        return result
+    
+    async def _supports_bulk_import(self) -> bool:
+        """
+        探测目标服务是否提供导入接口
+        
+        空请求体不会写入任何数据
+        
+        Returns:
+            是否支持
+        """
+        url = urljoin(self.target_url, "/api/knowledge-base/import")
+        async with self.session.post(url, data=b"", headers=NDJSON_HEADERS) as response:
+            if response.status == 200:
+                return True
+            if response.status in BULK_UNSUPPORTED_STATUSES:
+                return False
+            error_text = await response.text()
+            raise Exception(f"探测导入接口失败 (状态码: {response.status}): {error_text}")
+    
+    async def stream_migrate_knowledge_points(self) -> Optional[Dict[str, Any]]:
+        """
+        通过导出/导入接口迁移知识点
+        
+        源服务的 NDJSON 导出流逐行转换格式后直接作为导入请求体发往目标服务，
+        每个方向只有一次请求，没有分页与分批的请求开销
+        
+        Returns:
+            迁移结果统计，源或目标服务不支持时返回 None
+        """
+        if not await self._supports_bulk_import():
+            print("⚠️  目标服务不支持导入接口，改为分批迁移")
+            return None
+        
+        export_url = urljoin(self.source_url, "/api/knowledge-base/export")
+        import_url = urljoin(self.target_url, "/api/knowledge-base/import")
+        
+        async with self.session.get(export_url, timeout=STREAM_TIMEOUT) as export_response:
+            if export_response.status in BULK_UNSUPPORTED_STATUSES:
+                print("⚠️  源服务不支持导出接口，改为分批迁移")
+                return None
+            if export_response.status != 200:
+                error_text = await export_response.text()
+                raise Exception(f"导出数据失败 (状态码: {export_response.status}): {error_text}")
+            
+            print(f"📤 开始流式迁移: {self.source_url} -> {self.target_url}")
+            forwarded = 0
+            
+            async def _body():
+                nonlocal forwarded
+                async for line in export_response.content:
+                    if not line.strip():
+                        continue
+                    forwarded += 1
+                    if forwarded % STREAM_PROGRESS_INTERVAL == 0:
+                        print(f"   已转发 {forwarded} 个知识点...")
+                    yield orjson.dumps(convert_knowledge_point_format(orjson.loads(line))) + b"\n"
+            
+            async with self.session.post(
+                import_url, data=_body(), headers=NDJSON_HEADERS, timeout=STREAM_TIMEOUT
+            ) as import_response:
+                if import_response.status != 200:
+                    error_text = await import_response.text()
+                    raise Exception(f"导入数据失败 (状态码: {import_response.status}): {error_text}")
+                
+                result = orjson.loads(await import_response.read())
+        
+        print(f"   ✅ 流式迁移完成: 转发 {forwarded} 个知识点")
+        return {
+            "total_success": result.get("success_count", 0),
+            "total_failed": result.get("failed_count", 0),
+            "total_processed": result.get("total_count", forwarded),
+            "errors": result.get("errors", [])
+        }
+    
+    async def migrate(self, batch_size: int = 50, workers: int = DEFAULT_MIGRATE_WORKERS, bulk: bool = True) -> bool:
         """
         执行完整的迁移流程
         
         Args:
             batch_size: 批量处理的大小
+            workers: 同时提交批次的工作协程数
+            bulk: 是否优先使用导出/导入接口
             
         Returns:
             是否迁移成功
         """
         try:
-            # 1. 获取源数据
-            knowledge_points = await self.fetch_all_knowledge_points()
+            # 1. 优先流式迁移，任一端不支持时边获取源数据边分批迁移
+            result = await self.stream_migrate_knowledge_points() if bulk else None
+            if result is None:
+                try:
+                    result = await self.pipeline_migrate_knowledge_points(batch_size, workers)
+                except ExceptionGroup as eg:
+                    # 获取或提交阶段失败时其余协程已被取消，只上报首个错误
+                    raise eg.exceptions[0]
             
-            if not knowledge_points:
+            if not result['total_processed']:
                 print("⚠️  源服务中没有找到知识点数据")
                 return True
             
-            # 2. 迁移数据
-            result = await self.batch_migrate_knowledge_points(knowledge_points, batch_size)
-            
-            # 3. 输出结果
+            # 2. 输出结果
             print(f"\n📊 迁移完成统计:")
             print(f"   总处理数量: {result['total_processed']}")
             print(f"   成功数量: {result['total_success']}")
@@ -284,6 +535,26 @@ def parse_arguments():
         help="批量处理的大小 (默认: 50)"
     )
     
+    parser.add_argument(
+        "--fetch-concurrency",
+        type=int,
+        default=DEFAULT_FETCH_CONCURRENCY,
+        help=f"同时向源服务发出的分页请求数 (默认: {DEFAULT_FETCH_CONCURRENCY})"
+    )
+    
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_MIGRATE_WORKERS,
+        help=f"同时向目标服务提交批次的并发数 (默认: {DEFAULT_MIGRATE_WORKERS})"
+    )
+    
+    parser.add_argument(
+        "--no-bulk",
+        action="store_true",
+        help="不使用导出/导入接口，始终分页获取并分批提交"
+    )
+    
     parser.add_argument(
         "--dry-run",
         action="store_true",
@@ -306,7 +577,7 @@ async def main():
     print("")
     
     try:
-        async with KnowledgeMigrator(args.source, args.target) as migrator:
+        async with KnowledgeMigrator(args.source, args.target, args.fetch_concurrency) as migrator:
             if args.dry_run:
                 # 预览模式：只获取数据
                 print("🔍 预览模式：只获取源数据...")
@@ -320,7 +591,7 @@ async def main():
                 success = True
             else:
                 # 正式迁移
-                success = await migrator.migrate(args.batch_size)
+                success = await migrator.migrate(args.batch_size, args.workers, bulk=not args.no_bulk)
         
         if success:
             print("\n🎉 迁移任务执行成功!")
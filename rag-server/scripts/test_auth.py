@@ -22,25 +22,30 @@ async def test_authentication():
     # 测试用户认证
     print("\n1. 测试用户认证...")
     
+    # 三次认证与无效令牌验证互不依赖，同时发起
+    valid_user, wrong_password_user, nonexistent_user, invalid_token_user = await asyncio.gather(
+        auth_service.authenticate_user("admin", "admin123"),
+        auth_service.authenticate_user("admin", "wrongpassword"),
+        auth_service.authenticate_user("nonexistent", "password"),
+        auth_service.verify_token("invalid_token_12345")
+    )
+    
     # 测试正确的用户名和密码
-    user = await auth_service.authenticate_user("admin", "admin123")
-    if user:
-        print(f"✅ 用户认证成功: {user.username}")
+    if valid_user:
+        print(f"✅ 用户认证成功: {valid_user.username}")
     else:
         print("❌ 用户认证失败")
         return False
     
     # 测试错误的密码
-    user = await auth_service.authenticate_user("admin", "wrongpassword")
-    if not user:
+    if not wrong_password_user:
         print("✅ 错误密码认证失败 (正确行为)")
     else:
         print("❌ 错误密码认证成功 (异常行为)")
         return False
     
     # 测试不存在的用户
-    user = await auth_service.authenticate_user("nonexistent", "password")
-    if not user:
+    if not nonexistent_user:
         print("✅ 不存在用户认证失败 (正确行为)")
     else:
         print("❌ 不存在用户认证成功 (异常行为)")
@@ -65,10 +70,8 @@ async def test_authentication():
         print("❌ 令牌验证失败")
         return False
     
-    # 测试无效令牌
-    invalid_token = "invalid_token_12345"
-    verified_user = await auth_service.verify_token(invalid_token)
-    if not verified_user:
+    # 测试无效令牌（已在第1步中与认证测试一同验证）
+    if not invalid_token_user:
         print("✅ 无效令牌验证失败 (正确行为)")
     else:
         print("❌ 无效令牌验证成功 (异常行为)")
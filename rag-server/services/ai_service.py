@@ -1,18 +1,48 @@
 """
 AI service for generating knowledge points using DeepSeek API
 """
+import hashlib
 import json
+import orjson
+import random
 import time
 import uuid
 import re
-from typing import List, Optional, Dict, Any, AsyncGenerator
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any, AsyncGenerator, Tuple, Union
 import aiohttp
 import asyncio
-from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
+from pydantic import BaseModel, Field, TypeAdapter
 from config import settings
 from loguru import logger
 
 
+# Default total timeout for non-streaming API calls (seconds)
+API_TIMEOUT_SECS = 600
+# Total timeout for streaming chat responses (seconds)
+STREAM_TIMEOUT_SECS = 300
+# Connection pool settings shared by all calls to the AI API
+HTTP_POOL_LIMIT = 100
+HTTP_POOL_LIMIT_PER_HOST = 32
+HTTP_KEEPALIVE_TIMEOUT = 75
+HTTP_DNS_CACHE_TTL = 300
+# Default cap on concurrent non-streaming API calls
+DEFAULT_MAX_CONCURRENCY = 16
+# Bump whenever the extraction prompt changes so cached results are not reused
+EXTRACTION_PROMPT_VERSION = "1"
+# Extraction result cache: max entries and time-to-live (seconds)
+EXTRACTION_CACHE_SIZE = 128
+EXTRACTION_CACHE_TTL = 7 * 24 * 3600
+# Responses longer than this (chars) are parsed off the event loop
+PARSE_IN_THREAD_THRESHOLD = 4096
+# Retry policy for extraction API calls: total attempts, backoff base/cap (seconds), retryable statuses
+API_MAX_ATTEMPTS = 4
+API_RETRY_BASE_DELAY_SECS = 0.5
+API_RETRY_MAX_DELAY_SECS = 8
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
 class ExampleData(BaseModel):
     """Example data structure for knowledge points"""
     question: str
@@ -29,10 +59,122 @@ class KnowledgePointData(BaseModel):
     tags: List[str] = []
 
 
+# Validates a whole list of knowledge points (and their examples) in one call
+_KP_LIST_ADAPTER = TypeAdapter(List[KnowledgePointData])
+
+
+class _RetryableStatusError(Exception):
+    """AI API returned a transient HTTP status (429/5xx) worth retrying"""
+    
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Static system prompt for knowledge point extraction, built once at import time.
+# Keep it byte-identical across requests so the provider's prefix cache can hit it.
+_EXTRACTION_SYSTEM_PROMPT = """
+你是一个数学知识专家，需要从给定的文档中智能提取数学知识点的位置信息。
+
+你的任务是分析文档内容，识别知识点，并返回每个知识点在原文中的位置信息，而不是返回具体内容。
+
+【分析要求】
+1. 识别文档中的主要知识点（概念、定义、公式、方法等）
+2. 识别每个知识点相关的例题和练习
+3. 为每个知识点确定合适的分类和标签
+4. 确定每个内容块在原文中的位置范围
+
+【知识点拆分原则】
+- 相关性强的概念应该合并为一个知识点，不要过度拆分
+- 一个完整的数学主题（如"二次函数的性质与应用"）比多个细小的知识点更有价值
+- 优先创建内容丰富、完整的知识点，而不是碎片化的小概念
+- 建议控制知识点总数在3-8个之间，确保每个知识点都有足够的深度和广度
+- 同一类型的多个公式、定理可以整合到一个知识点中
+
+【知识点内容要求】
+- 知识点的描述应该只包含理论性内容（概念、定义、公式、性质、方法等）
+- 不要将例题的具体内容包含在知识点描述中
+- 例题应该单独标识，通过examples字段来组织
+- 描述部分应该是纯理论知识，便于理解和记忆
+
+【输出格式】
+返回JSON格式，包含位置信息：
+{
+  "knowledge_points": [
+    {
+      "title": "知识点标题（简短概括）",
+      "category": "预定义分类：sequence|algebra|geometry|calculus|statistics|linear-algebra|discrete-math|number-theory|general",
+      "description_range": {
+        "start_line": 起始行号（从1开始）,
+        "end_line": 结束行号
+      },
+      "examples": [
+        {
+          "question_range": {
+            "start_line": 问题起始行号,
+            "end_line": 问题结束行号
+          },
+          "solution_range": {
+            "start_line": 解答起始行号,
+            "end_line": 解答结束行号
+          },
+          "difficulty": "easy|medium|hard"
+        }
+      ],
+      "tags": ["标签1", "标签2", "标签3"]
+    }
+  ]
+}
+
+【重要说明】
+1. 行号从1开始计数
+2. description_range应该包含该知识点的所有理论内容
+3. examples中的question_range和solution_range要准确对应原文中的例题
+4. 确保位置范围不重叠，每个范围都是完整的内容块
+5. 优先保持内容的完整性，避免过度拆分
+6. 只返回位置信息，不返回具体文本内容
+7. 重点关注知识点的整体性和完整性，避免创建过多细小的知识点
+
+"""
+
+# Patterns used when repairing LaTeX escapes and reading numbered lines, compiled once
+_JSON_STRING_RE = re.compile(r'"(?:[^"\\]|\\.)*"')
+_OVER_ESCAPED_BACKSLASH_RE = re.compile(r'\\\\\\\\')
+_UNESCAPED_BACKSLASH_RE = re.compile(r'(?<!\\)\\(?=[a-zA-Z()[\]{}])')
+_NUMBERED_LINE_RE = re.compile(r'^\s*(\d+):\s*(.*)')
+# Locating a JSON object in model output: an optional ```json fence, then string literals
+# (skipped whole, so braces inside them are ignored) and the braces themselves
+_JSON_FENCE_RE = re.compile(r'```(?:json)?\s*\{')
+_JSON_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"|[{}]')
+
+# User message templates; only the numbered document (and requirements) are interpolated
+_EXTRACTION_USER_TEMPLATE = """
+文档内容（带行号）：
+{numbered_text}
+
+请直接输出JSON：
+"""
+_EXTRACTION_USER_TEMPLATE_WITH_REQUIREMENTS = """
+文档内容（带行号）：
+{numbered_text}
+
+我的要求：
+{user_requirements}
+
+请直接输出JSON：
+"""
+
+
 class AIService:
     """AI service for knowledge point generation using OpenAI-compatible API"""
 
-    def __init__(self, api_key: str, api_base: str = "https://api.openai.com", model: str = "gpt-3.5-turbo"):
+    def __init__(
+        self,
+        api_key: str,
+        api_base: str = "https://api.openai.com",
+        model: str = "gpt-3.5-turbo",
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+    ):
         self.api_key = api_key
         self.api_base = api_base.rstrip('/')
         self.model = model
@@ -40,6 +182,72 @@ class AIService:
             "Content-Type": "application/json",
             "Authorization": f"Bearer {api_key}"
         }
+        # Shared HTTP session, created lazily inside the running event loop
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Caps in-flight non-streaming API calls to avoid connection thrash and 429s
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        # LRU cache of extraction results: key -> (stored_at, dumped knowledge points)
+        self._extraction_cache: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        # Extractions currently running, keyed like the cache
+        self._inflight_extractions: Dict[str, asyncio.Task] = {}
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Get the shared HTTP session, creating it on first use"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=API_TIMEOUT_SECS),
+                connector=aiohttp.TCPConnector(
+                    limit=HTTP_POOL_LIMIT,
+                    limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+                    keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+                    ttl_dns_cache=HTTP_DNS_CACHE_TTL
+                )
+            )
+        return self._session
+    
+    def _extraction_cache_key(self, text: str, user_requirements: Optional[str]) -> str:
+        """Build the cache key for an extraction request from its content hash"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update((user_requirements or "").encode("utf-8"))
+        return f"{digest.hexdigest()}:{self.model}:{EXTRACTION_PROMPT_VERSION}"
+    
+    def _get_cached_extraction(self, key: str) -> Optional[List[KnowledgePointData]]:
+        """Return a fresh copy of a cached extraction result, or None on miss/expiry"""
+        entry = self._extraction_cache.get(key)
+        if entry is None:
+            return None
+        
+        stored_at, dumped = entry
+        if time.monotonic() - stored_at > EXTRACTION_CACHE_TTL:
+            del self._extraction_cache[key]
+            return None
+        
+        self._extraction_cache.move_to_end(key)
+        # Re-validate from the dumped form so callers never share mutable instances
+        return _KP_LIST_ADAPTER.validate_python(dumped)
+    
+    def _store_extraction(self, key: str, dumped: List[Dict[str, Any]]):
+        """Store a dumped extraction result, evicting the least recently used entries"""
+        self._extraction_cache[key] = (time.monotonic(), dumped)
+        self._extraction_cache.move_to_end(key)
+        while len(self._extraction_cache) > EXTRACTION_CACHE_SIZE:
+            self._extraction_cache.popitem(last=False)
+    
+    @asynccontextmanager
+    async def _acquire_slot(self, request_id: Optional[str] = None):
+        """Wait for a free API call slot and hold it for the duration of the block"""
+        if self._semaphore.locked():
+            logger.debug(f"[{request_id}] Waiting for a free AI API slot")
+        async with self._semaphore:
+            yield
+    
+    async def close(self):
+        """Close the shared HTTP session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
     
     async def generate_response(self, prompt: str, temperature: float = 0.7, max_tokens: int = 2000) -> str:
         """Generate a text response using AI model"""
@@ -68,7 +276,8 @@ class AIService:
             }
             
             # Make API request
-            async with aiohttp.ClientSession() as session:
+            session = await self._get_session()
+            async with self._acquire_slot(request_id):
                 api_start = time.time()
                 async with session.post(url, json=payload, headers=self.headers) as response:
                     api_time = time.time() - api_start
@@ -105,113 +314,109 @@ class AIService:
         # Generate request ID for tracking
         request_id = str(uuid.uuid4())[:8]
         start_time = time.time()
+        # Normalise once so the cache key and the prompt see the same requirements
+        user_requirements = (user_requirements or "").strip() or None
         
         logger.info(f"[{request_id}] Starting knowledge point generation")
         logger.info(f"[{request_id}] Input text length: {len(text)} characters")
         logger.info(f"[{request_id}] User requirements: {user_requirements or 'None'}")
-        logger.info(f"[{request_id}] Document text: {text}")
+        
+        cache_key = self._extraction_cache_key(text, user_requirements)
+        cached = self._get_cached_extraction(cache_key)
+        if cached is not None:
+            logger.info(f"[{request_id}] Extraction cache hit - {len(cached)} knowledge points in {time.time() - start_time:.3f}s")
+            return cached
+        
+        # Identical concurrent requests share one extraction task (single-flight)
+        task = self._inflight_extractions.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(
+                self._extract_knowledge_points(text, user_requirements, request_id, cache_key)
+            )
+            self._inflight_extractions[cache_key] = task
+            task.add_done_callback(lambda _: self._inflight_extractions.pop(cache_key, None))
+        else:
+            logger.info(f"[{request_id}] Joining in-flight extraction for identical input")
         
         try:
-            # Prepare the prompt for knowledge point extraction
-            logger.debug(f"[{request_id}] Creating extraction prompt")
-            prompt_start = time.time()
-            prompt = self._create_extraction_system_prompt()
-            prompt_time = time.time() - prompt_start
-            logger.debug(f"[{request_id}] Prompt created in {prompt_time:.3f}s (length: {len(prompt)} chars)")
-            
-            # Call AI API
-            logger.info(f"[{request_id}] Calling AI API")
-            api_start = time.time()
-            response = await self._call_ai_api(prompt, text, user_requirements, request_id)
-            api_time = time.time() - api_start
-            logger.info(f"[{request_id}] AI API call completed in {api_time:.3f}s")
-            
-            # Parse the response
-            logger.debug(f"[{request_id}] Parsing AI response")
-            parse_start = time.time()
-            knowledge_points = self._parse_ai_response(response, request_id, text)
-            parse_time = time.time() - parse_start
-            logger.debug(f"[{request_id}] Response parsed in {parse_time:.3f}s")
-            
-            total_time = time.time() - start_time
-            logger.info(f"[{request_id}] Knowledge point generation completed successfully")
-            logger.info(f"[{request_id}] Generated {len(knowledge_points)} knowledge points in {total_time:.3f}s")
-            logger.info(f"[{request_id}] Timing breakdown - Prompt: {prompt_time:.3f}s, API: {api_time:.3f}s, Parse: {parse_time:.3f}s")
-            
-            return knowledge_points
-            
+            # Shield the shared task so one cancelled caller does not cancel it for the others
+            dumped = await asyncio.shield(task)
         except Exception as e:
             total_time = time.time() - start_time
             logger.error(f"[{request_id}] Error generating knowledge points after {total_time:.3f}s: {e}")
             logger.error(f"[{request_id}] Exception type: {type(e).__name__}")
             raise
-    
-    def _create_extraction_system_prompt(self) -> str:
-        """Create a structured prompt for knowledge point extraction"""
-        prompt = f"""
-你是一个数学知识专家，需要从给定的文档中智能提取数学知识点的位置信息。
-
-你的任务是分析文档内容，识别知识点，并返回每个知识点在原文中的位置信息，而不是返回具体内容。
-
-【分析要求】
-1. 识别文档中的主要知识点（概念、定义、公式、方法等）
-2. 识别每个知识点相关的例题和练习
-3. 为每个知识点确定合适的分类和标签
-4. 确定每个内容块在原文中的位置范围
-
-【知识点拆分原则】
-- 相关性强的概念应该合并为一个知识点，不要过度拆分
-- 一个完整的数学主题（如"二次函数的性质与应用"）比多个细小的知识点更有价值
-- 优先创建内容丰富、完整的知识点，而不是碎片化的小概念
-- 建议控制知识点总数在3-8个之间，确保每个知识点都有足够的深度和广度
-- 同一类型的多个公式、定理可以整合到一个知识点中
-
-【知识点内容要求】
-- 知识点的描述应该只包含理论性内容（概念、定义、公式、性质、方法等）
-- 不要将例题的具体内容包含在知识点描述中
-- 例题应该单独标识，通过examples字段来组织
-- 描述部分应该是纯理论知识，便于理解和记忆
+        
+        knowledge_points = _KP_LIST_ADAPTER.validate_python(dumped)
+        total_time = time.time() - start_time
+        logger.info(f"[{request_id}] Generated {len(knowledge_points)} knowledge points in {total_time:.3f}s")
+        return knowledge_points
 
-【输出格式】
-返回JSON格式，包含位置信息：
-{{
-  "knowledge_points": [
-    {{
-      "title": "知识点标题（简短概括）",
-      "category": "预定义分类：sequence|algebra|geometry|calculus|statistics|linear-algebra|discrete-math|number-theory|general",
-      "description_range": {{
-        "start_line": 起始行号（从1开始）,
-        "end_line": 结束行号
-      }},
-      "examples": [
-        {{
-          "question_range": {{
-            "start_line": 问题起始行号,
-            "end_line": 问题结束行号
-          }},
-          "solution_range": {{
-            "start_line": 解答起始行号,
-            "end_line": 解答结束行号
-          }},
-          "difficulty": "easy|medium|hard"
-        }}
-      ],
-      "tags": ["标签1", "标签2", "标签3"]
-    }}
-  ]
-}}
+    async def generate_knowledge_points_batch(
+        self,
+        texts: List[str],
+        user_requirements: Optional[str] = None
+    ) -> List[Union[List[KnowledgePointData], BaseException]]:
+        """
+        Generate knowledge points for several documents concurrently.
 
-【重要说明】
-1. 行号从1开始计数
-2. description_range应该包含该知识点的所有理论内容
-3. examples中的question_range和solution_range要准确对应原文中的例题
-4. 确保位置范围不重叠，每个范围都是完整的内容块
-5. 优先保持内容的完整性，避免过度拆分
-6. 只返回位置信息，不返回具体文本内容
-7. 重点关注知识点的整体性和完整性，避免创建过多细小的知识点
+        API calls are capped by the shared concurrency semaphore, so the batch
+        never exceeds max_concurrency in-flight requests. Results are returned in
+        input order; a failed document yields its exception instead of a list.
+        """
+        logger.info(f"Starting batch knowledge point generation for {len(texts)} documents")
+        return await asyncio.gather(
+            *(self.generate_knowledge_points(text, user_requirements) for text in texts),
+            return_exceptions=True
+        )
 
-"""
-        return prompt
+    async def _extract_knowledge_points(
+        self,
+        text: str,
+        user_requirements: Optional[str],
+        request_id: str,
+        cache_key: str
+    ) -> List[Dict[str, Any]]:
+        """Call the AI API, parse the response and cache it; returns the dumped knowledge points"""
+        start_time = time.time()
+        
+        # Prepare the prompt for knowledge point extraction
+        logger.debug(f"[{request_id}] Creating extraction prompt")
+        prompt_start = time.time()
+        prompt = self._create_extraction_system_prompt()
+        prompt_time = time.time() - prompt_start
+        logger.debug(f"[{request_id}] Prompt created in {prompt_time:.3f}s (length: {len(prompt)} chars)")
+        
+        # Call AI API
+        logger.info(f"[{request_id}] Calling AI API")
+        api_start = time.time()
+        response = await self._call_ai_api(prompt, text, user_requirements, request_id)
+        api_time = time.time() - api_start
+        logger.info(f"[{request_id}] AI API call completed in {api_time:.3f}s")
+        
+        # Parse the response
+        logger.debug(f"[{request_id}] Parsing AI response")
+        parse_start = time.time()
+        if len(response) > PARSE_IN_THREAD_THRESHOLD:
+            # Large responses are parsed in a worker thread to keep the event loop responsive
+            knowledge_points = await asyncio.to_thread(self._parse_ai_response, response, request_id, text)
+        else:
+            knowledge_points = self._parse_ai_response(response, request_id, text)
+        parse_time = time.time() - parse_start
+        logger.debug(f"[{request_id}] Response parsed in {parse_time:.3f}s")
+        
+        dumped = _KP_LIST_ADAPTER.dump_python(knowledge_points)
+        self._store_extraction(cache_key, dumped)
+        
+        total_time = time.time() - start_time
+        logger.info(f"[{request_id}] Knowledge point generation completed successfully")
+        logger.info(f"[{request_id}] Timing breakdown - Prompt: {prompt_time:.3f}s, API: {api_time:.3f}s, Parse: {parse_time:.3f}s, Total: {total_time:.3f}s")
+        
+        return dumped
+    
+    def _create_extraction_system_prompt(self) -> str:
+        """Create a structured prompt for knowledge point extraction"""
+        return _EXTRACTION_SYSTEM_PROMPT
     
     def _format_user_requirements(self, user_requirements: Optional[str]) -> str:
         """Format user requirements for inclusion in the prompt"""
@@ -226,8 +431,6 @@ class AIService:
     
     def _fix_latex_escapes(self, json_content: str) -> str:
         """Fix common LaTeX escape sequences that cause JSON parsing errors"""
-        import re
-        
         # 更彻底的方法：直接在字符串值内修复所有单反斜杠
         def fix_string_escapes(match):
             """修复JSON字符串值内的所有转义问题"""
@@ -237,32 +440,40 @@ class AIService:
             
             # 1. 先修复已经被意外双重转义的情况
             # 例如：\\\\frac -> \\frac (避免过度转义)
-            string_content = re.sub(r'\\\\\\\\', r'\\\\', string_content)
+            string_content = _OVER_ESCAPED_BACKSLASH_RE.sub(r'\\\\', string_content)
             
             # 2. 修复所有单反斜杠后跟字母或特殊字符的情况
-            # 这会捕获所有LaTeX命令，包括我们之前遗漏的
-            string_content = re.sub(r'(?<!\\)\\(?=[a-zA-Z()[\]{}])', r'\\\\', string_content)
-            
-            # 3. 修复其他特殊的转义字符
-            replacements = {
-                '\\n': '\\\\n',   # 换行符
-                '\\t': '\\\\t',   # 制表符  
-                '\\r': '\\\\r',   # 回车符
-                '\\"': '\\\\"',   # 双引号
-            }
-            
-            for old, new in replacements.items():
-                # 只替换不是已经正确转义的情况
-                string_content = re.sub(f'(?<!\\\\){re.escape(old)}', new, string_content)
+            # 这会捕获所有LaTeX命令，\n、\t、\r 也在此一并处理
+            string_content = _UNESCAPED_BACKSLASH_RE.sub(r'\\\\', string_content)
             
             # 重新添加引号
             return f'"{string_content}"'
         
         # 只对JSON字符串值（在双引号内的内容）进行修复
         # 这个正则表达式匹配完整的字符串值，包括转义的引号
-        json_content = re.sub(r'"(?:[^"\\]|\\.)*"', fix_string_escapes, json_content)
+        return _JSON_STRING_RE.sub(fix_string_escapes, json_content)
+    
+    def _find_json_object(self, content: str) -> Optional[str]:
+        """Return the first balanced JSON object in model output, preferring a ```json fence"""
+        fence = _JSON_FENCE_RE.search(content)
+        start_idx = fence.end() - 1 if fence else content.find('{')
+        if start_idx == -1:
+            return None
+        
+        # Single pass over braces and string literals; stops at the matching closing brace
+        depth = 0
+        for match in _JSON_TOKEN_RE.finditer(content, start_idx):
+            token = match.group()
+            if token == '{':
+                depth += 1
+            elif token == '}':
+                depth -= 1
+                if depth == 0:
+                    return content[start_idx:match.end()]
         
-        return json_content
+        # Unbalanced (e.g. truncated output): fall back to the last closing brace
+        end_idx = content.rfind('}') + 1
+        return content[start_idx:end_idx] if end_idx > start_idx else None
     
     def _extract_content_by_lines(self, text: str, start_line: int, end_line: int) -> str:
         """Extract content from text by line numbers"""
@@ -290,7 +501,7 @@ class AIService:
 
         for line in lines:
             # 尝试匹配行号格式 "001: 内容" 或 "  1: 内容"
-            match = re.match(r'^\s*(\d+):\s*(.*)', line)
+            match = _NUMBERED_LINE_RE.match(line)
             if match:
                 line_number = int(match.group(1))
                 content = match.group(2)
@@ -306,7 +517,8 @@ class AIService:
 
         # 将原始文本转换为带行号格式，匹配AI处理的格式
         numbered_text = self._add_line_numbers(text)
-        logger.debug(f"Created numbered text with {len(numbered_text.split())} lines")
+        # Lazy so the line count is only computed when debug logging is enabled
+        logger.opt(lazy=True).debug("Created numbered text with {} lines", lambda: numbered_text.count('\n') + 1)
 
         for kp_data in position_data.get("knowledge_points", []):
             # Extract description content using numbered text
@@ -336,24 +548,70 @@ class AIService:
                 )
                 
                 if question and solution:
-                    example = ExampleData(
-                        question=question,
-                        solution=solution,
-                        difficulty=ex_data.get("difficulty", "medium")
-                    )
-                    examples.append(example)
+                    examples.append({
+                        "question": question,
+                        "solution": solution,
+                        "difficulty": ex_data.get("difficulty", "medium")
+                    })
             
-            # Create knowledge point
-            kp = KnowledgePointData(
-                title=kp_data.get("title", "未命名知识点"),
-                description=description,
-                category=kp_data.get("category", "general"),
-                examples=examples,
-                tags=kp_data.get("tags", [])
-            )
-            knowledge_points.append(kp)
+            # Collect the knowledge point; the whole list is validated at once below
+            knowledge_points.append({
+                "title": kp_data.get("title", "未命名知识点"),
+                "description": description,
+                "category": kp_data.get("category", "general"),
+                "examples": examples,
+                "tags": kp_data.get("tags", [])
+            })
         
-        return knowledge_points
+        return _KP_LIST_ADAPTER.validate_python(knowledge_points)
+    
+    async def _stream_completion(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        payload: Dict[str, Any],
+        request_id: str
+    ) -> Tuple[List[str], Optional[Dict[str, Any]]]:
+        """Send one streaming completion request; returns the content parts and usage block"""
+        request_start = time.time()
+        async with session.post(url, headers=self.headers, json=payload) as response:
+            request_time = time.time() - request_start
+            
+            logger.info(f"[{request_id}] HTTP response started in {request_time:.3f}s")
+            logger.debug(f"[{request_id}] Response status code: {response.status}")
+            logger.opt(lazy=True).debug("[{}] Response headers: {}", lambda: request_id, lambda: dict(response.headers))
+            
+            if response.status != 200:
+                error_text = await response.text()
+                logger.error(f"[{request_id}] HTTP error {response.status}: {error_text}")
+                message = f"AI API returned status {response.status}: {error_text[:200]}"
+                if response.status in RETRYABLE_STATUS_CODES:
+                    retry_after = response.headers.get("Retry-After", "")
+                    raise _RetryableStatusError(message, float(retry_after) if retry_after.isdigit() else None)
+                raise Exception(message)
+            
+            content_parts: List[str] = []
+            usage = None
+            
+            # Consume SSE lines as they arrive: "data: {...}" chunks until "data: [DONE]"
+            async for line in response.content:
+                line = line.strip()
+                if not line.startswith(b"data: "):
+                    continue
+                data = line[6:]
+                if data == b"[DONE]":
+                    break
+                
+                chunk = orjson.loads(data)
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+                if chunk.get("choices"):
+                    delta_content = chunk["choices"][0].get("delta", {}).get("content")
+                    if delta_content:
+                        content_parts.append(delta_content)
+        
+        logger.debug(f"[{request_id}] Stream finished in {time.time() - request_start:.3f}s - Chunks: {len(content_parts)}")
+        return content_parts, usage
     
     async def _call_ai_api(self, prompt: str, text: str, user_requirements: Optional[str] = None, request_id: str = None) -> str:
         """Call AI API to generate content"""
@@ -363,20 +621,12 @@ class AIService:
         lines = text.split('\n')
         numbered_text = '\n'.join(f"{i+1:3d}: {line}" for i, line in enumerate(lines))
         
-        user_content = f"""
-文档内容（带行号）：
-{numbered_text}
-
-请直接输出JSON：
-""" if not user_requirements else f"""
-文档内容（带行号）：
-{numbered_text}
-
-我的要求：
-{user_requirements}
-
-请直接输出JSON：
-"""
+        if user_requirements:
+            user_content = _EXTRACTION_USER_TEMPLATE_WITH_REQUIREMENTS.format(
+                numbered_text=numbered_text, user_requirements=user_requirements
+            )
+        else:
+            user_content = _EXTRACTION_USER_TEMPLATE.format(numbered_text=numbered_text)
         
         payload = {
             "model": self.model,
@@ -392,51 +642,62 @@ class AIService:
             ],
             "max_tokens": 32768,
             "temperature": 0.3,
-            "stream": False
+            # JSON mode: the model returns a bare JSON object without surrounding chatter
+            "response_format": {
+                "type": "json_object"
+            },
+            # Stream tokens so each SSE chunk is decoded while the model is still generating
+            "stream": True,
+            "stream_options": {
+                "include_usage": True
+            }
         }
         
         # Log request details (without sensitive content)
         logger.info(f"[{request_id}] AI API request - Model: {payload['model']}, Max tokens: {payload['max_tokens']}, Temperature: {payload['temperature']}")
         logger.debug(f"[{request_id}] Request URL: {url}")
         logger.debug(f"[{request_id}] Prompt length: {len(prompt)} characters")
-        logger.debug(f"[{request_id}] Request payload size: {len(str(payload))} bytes")
+        logger.opt(lazy=True).debug("[{}] Request payload size: {} bytes", lambda: request_id, lambda: len(orjson.dumps(payload)))
         
         try:
-            request_start = time.time()
-            timeout = aiohttp.ClientTimeout(total=600)
+            session = await self._get_session()
             
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(url, headers=self.headers, json=payload) as response:
-                    request_time = time.time() - request_start
-                    
-                    logger.info(f"[{request_id}] HTTP request completed in {request_time:.3f}s")
-                    logger.debug(f"[{request_id}] Response status code: {response.status}")
-                    logger.debug(f"[{request_id}] Response headers: {dict(response.headers)}")
-                    
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"[{request_id}] HTTP error {response.status}: {error_text}")
-                        raise Exception(f"AI API returned status {response.status}: {error_text[:200]}")
-                    
-                    result = await response.json()
-            
-            # Log response details
-            logger.debug(f"[{request_id}] LLM Response: {json.dumps(result, indent=2)}")
+            # Retry transient failures (connection errors, 429/5xx) with jittered exponential backoff;
+            # the API slot is held per attempt only, so backoff sleeps don't block other callers
+            for attempt in range(1, API_MAX_ATTEMPTS + 1):
+                try:
+                    async with self._acquire_slot(request_id):
+                        content_parts, usage = await self._stream_completion(session, url, payload, request_id)
+                    break
+                except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, _RetryableStatusError) as e:
+                    if attempt == API_MAX_ATTEMPTS:
+                        raise
+                    delay = random.uniform(0, min(API_RETRY_MAX_DELAY_SECS, API_RETRY_BASE_DELAY_SECS * 2 ** attempt))
+                    if isinstance(e, _RetryableStatusError) and e.retry_after is not None:
+                        delay = min(API_RETRY_MAX_DELAY_SECS, e.retry_after)
+                    logger.warning(f"[{request_id}] AI API attempt {attempt}/{API_MAX_ATTEMPTS} failed: {e}; retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
             
-            if "choices" not in result or len(result["choices"]) == 0:
-                logger.error(f"[{request_id}] Invalid API response: no choices found")
+            if not content_parts:
+                logger.error(f"[{request_id}] Invalid API response: no content received")
                 raise Exception("No response from AI API")
             
             # Extract usage information if available
-            if "usage" in result:
-                usage = result["usage"]
+            if usage:
                 logger.info(f"[{request_id}] Token usage - Prompt: {usage.get('prompt_tokens', 'N/A')}, "
                            f"Completion: {usage.get('completion_tokens', 'N/A')}, "
                            f"Total: {usage.get('total_tokens', 'N/A')}")
+                # Prompt-cache hits on the stable system prompt prefix (DeepSeek fields, OpenAI fallback)
+                cache_hit_tokens = usage.get("prompt_cache_hit_tokens")
+                if cache_hit_tokens is None:
+                    cache_hit_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+                if cache_hit_tokens is not None:
+                    logger.info(f"[{request_id}] Prompt cache - Hit: {cache_hit_tokens}, "
+                               f"Miss: {usage.get('prompt_cache_miss_tokens', 'N/A')}")
             
-            content = result["choices"][0]["message"]["content"]
+            content = "".join(content_parts)
             logger.info(f"[{request_id}] AI response received - Content length: {len(content)} characters")
-            logger.debug(f"[{request_id}] Response content preview: {content[:200]}...")
+            logger.opt(lazy=True).debug("[{}] Response content preview: {}...", lambda: request_id, lambda: content[:200])
             
             return content.strip()
             
@@ -464,22 +725,23 @@ class AIService:
             response = response.strip()
             logger.debug(f"[{request_id}] Response after stripping: {len(response)} characters")
             
-            # Find JSON content
-            start_idx = response.find('{')
-            end_idx = response.rfind('}') + 1
-            
-            if start_idx == -1 or end_idx == 0:
-                logger.error(f"[{request_id}] No JSON found in response")
-                logger.error(f"[{request_id}] Response preview: {response[:500]}...")
-                raise ValueError("No JSON found in response")
-            
-            json_content = response[start_idx:end_idx]
-            logger.debug(f"[{request_id}] Extracted JSON content length: {len(json_content)} characters")
-            logger.debug(f"[{request_id}] JSON content preview: {json_content}...")
-            
-            # Parse JSON (position data should be simple, no LaTeX escapes needed)
-            logger.debug(f"[{request_id}] Attempting to parse JSON")
-            parsed_data = json.loads(json_content)
+            # JSON mode normally yields a bare object; fall back to scanning for braces otherwise
+            try:
+                parsed_data = orjson.loads(response)
+            except orjson.JSONDecodeError:
+                logger.debug(f"[{request_id}] Response is not bare JSON, extracting JSON content")
+                json_content = self._find_json_object(response)
+                
+                if json_content is None:
+                    logger.error(f"[{request_id}] No JSON found in response")
+                    logger.error(f"[{request_id}] Response preview: {response[:500]}...")
+                    raise ValueError("No JSON found in response")
+                
+                logger.debug(f"[{request_id}] Extracted JSON content length: {len(json_content)} characters")
+                logger.opt(lazy=True).debug("[{}] JSON content preview: {}...", lambda: request_id, lambda: json_content[:500])
+                
+                # Parse JSON (position data should be simple, no LaTeX escapes needed)
+                parsed_data = orjson.loads(json_content)
             logger.info(f"[{request_id}] Successfully parsed JSON response")
             
             # Validate structure
@@ -545,7 +807,11 @@ class AIService:
 
         logger.info(f"[{request_id}] Starting stream chat response")
         logger.info(f"[{request_id}] Messages count: {len(messages)}")
-        logger.debug(f"[{request_id}] Last user message: {messages[-1]['content'][:100] if messages and messages[-1].get('content') else 'None'}...")
+        logger.opt(lazy=True).debug(
+            "[{}] Last user message: {}...",
+            lambda: request_id,
+            lambda: messages[-1]['content'][:100] if messages and messages[-1].get('content') else 'None'
+        )
 
         try:
             # 准备API请求
@@ -565,125 +831,127 @@ class AIService:
             logger.debug(f"[{request_id}] Request payload prepared")
 
             # 进行流式请求
-            timeout = aiohttp.ClientTimeout(total=300)  # 5分钟超时，适合流式响应
-
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                request_start = time.time()
-                async with session.post(url, headers=self.headers, json=payload) as response:
-                    request_time = time.time() - request_start
+            timeout = aiohttp.ClientTimeout(total=STREAM_TIMEOUT_SECS)  # 5分钟超时，适合流式响应
+            session = await self._get_session()
 
-                    logger.info(f"[{request_id}] Stream connection established in {request_time:.3f}s")
-                    logger.debug(f"[{request_id}] Response status: {response.status}")
-
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"[{request_id}] Stream API error {response.status}: {error_text}")
-                        yield {
-                            "type": "error",
-                            "data": {
-                                "error": f"API error {response.status}: {error_text[:200]}"
-                            }
+            request_start = time.time()
+            async with session.post(url, headers=self.headers, json=payload, timeout=timeout) as response:
+                request_time = time.time() - request_start
+
+                logger.info(f"[{request_id}] Stream connection established in {request_time:.3f}s")
+                logger.debug(f"[{request_id}] Response status: {response.status}")
+
+                if response.status != 200:
+                    error_text = await response.text()
+                    logger.error(f"[{request_id}] Stream API error {response.status}: {error_text}")
+                    yield {
+                        "type": "error",
+                        "data": {
+                            "error": f"API error {response.status}: {error_text[:200]}"
                         }
-                        return
-
-                    # 处理流式响应
-                    buffer = ""
-                    chunk_count = 0
-
-                    logger.info(f"[{request_id}] Starting to process stream chunks")
-
-                    async for chunk in response.content.iter_chunked(256):  # 使用更小的块大小
-                        chunk_count += 1
-                        chunk_text = chunk.decode('utf-8', errors='ignore')
-                        logger.debug(f"[{request_id}] Stream chunk: {chunk_text}")
-                        buffer += chunk_text
-
-                        # 按行处理SSE数据
-                        while '\n' in buffer:
-                            line, buffer = buffer.split('\n', 1)
-                            line = line.strip()
-
-                            if not line or not line.startswith('data: '):
-                                continue
-
-                            # 移除'data: '前缀
-                            json_str = line[6:]
-
-                            # 检查是否是结束标记
-                            if json_str == '[DONE]':
-                                logger.info(f"[{request_id}] Stream completed - Total chunks: {chunk_count}")
-                                yield {
-                                    "type": "done",
-                                    "data": {
-                                        "total_time": time.time() - start_time
-                                    }
+                    }
+                    return
+
+                # 处理流式响应
+                buffer = ""
+                chunk_count = 0
+
+                logger.info(f"[{request_id}] Starting to process stream chunks")
+
+                async for chunk in response.content.iter_chunked(256):  # 使用更小的块大小
+                    chunk_count += 1
+                    chunk_text = chunk.decode('utf-8', errors='ignore')
+                    logger.opt(lazy=True).debug("[{}] Stream chunk: {}", lambda: request_id, lambda: chunk_text)
+                    buffer += chunk_text
+
+                    # 按行处理SSE数据
+                    while '\n' in buffer:
+                        line, buffer = buffer.split('\n', 1)
+                        line = line.strip()
+
+                        if not line or not line.startswith('data: '):
+                            continue
+
+                        # 移除'data: '前缀
+                        json_str = line[6:]
+
+                        # 检查是否是结束标记
+                        if json_str == '[DONE]':
+                            logger.info(f"[{request_id}] Stream completed - Total chunks: {chunk_count}")
+                            yield {
+                                "type": "done",
+                                "data": {
+                                    "total_time": time.time() - start_time
                                 }
-                                return
-
-                            try:
-                                # 解析JSON数据
-                                data = json.loads(json_str)
-
-                                # 检查是否包含选择
-                                if 'choices' in data and data['choices']:
-                                    choice = data['choices'][0]
-
-                                    # 处理流式数据中的delta
-                                    if 'delta' in choice:
-                                        delta = choice['delta']
-
-                                        # 处理思考过程 (reasoning_content)
-                                        if 'reasoning_content' in delta and delta['reasoning_content']:
-                                            reasoning_delta = delta['reasoning_content']
-                                            logger.debug(f"[{request_id}] Reasoning chunk: {len(reasoning_delta)} chars")
-                                            yield {
-                                                "type": "reasoning",
-                                                "data": {
-                                                    "reasoning": reasoning_delta
-                                                }
+                            }
+                            return
+
+                        try:
+                            # 解析JSON数据
+                            data = orjson.loads(json_str)
+
+                            # 检查是否包含选择
+                            if 'choices' in data and data['choices']:
+                                choice = data['choices'][0]
+
+                                # 处理流式数据中的delta
+                                if 'delta' in choice:
+                                    delta = choice['delta']
+
+                                    # 处理思考过程 (reasoning_content)
+                                    if 'reasoning_content' in delta and delta['reasoning_content']:
+                                        reasoning_delta = delta['reasoning_content']
+                                        logger.opt(lazy=True).debug("[{}] Reasoning chunk: {} chars", lambda: request_id, lambda: len(reasoning_delta))
+                                        yield {
+                                            "type": "reasoning",
+                                            "data": {
+                                                "reasoning": reasoning_delta
                                             }
-                                            # 强制让出控制权，确保数据立即发送
-                                            await asyncio.sleep(0)
-
-                                        # 处理普通消息内容
-                                        if 'content' in delta and delta['content']:
-                                            content_delta = delta['content']
-                                            logger.debug(f"[{request_id}] Content chunk: {len(content_delta)} chars")
-                                            yield {
-                                                "type": "content",
-                                                "data": {
-                                                    "content": content_delta
-                                                }
+                                        }
+                                        # 强制让出控制权，确保数据立即发送
+                                        await asyncio.sleep(0)
+
+                                    # 处理普通消息内容
+                                    if 'content' in delta and delta['content']:
+                                        content_delta = delta['content']
+                                        logger.opt(lazy=True).debug("[{}] Content chunk: {} chars", lambda: request_id, lambda: len(content_delta))
+                                        yield {
+                                            "type": "content",
+                                            "data": {
+                                                "content": content_delta
                                             }
-                                            # 强制让出控制权，确保数据立即发送
-                                            await asyncio.sleep(0)
-
-                                    # 检查是否有完成的消息
-                                    if 'message' in choice:
-                                        message = choice['message']
-                                        if message.get('content'):
-                                            # 尝试解析知识点JSON，使用传入的extracted_text进行解析
-                                            try:
-                                                knowledge_points = self._extract_knowledge_points_from_content(message['content'], extracted_text)
-                                                if knowledge_points:
-                                                    logger.info(f"[{request_id}] Extracted {len(knowledge_points)} knowledge points")
-                                                    yield {
-                                                        "type": "knowledge_points",
-                                                        "data": {
-                                                            "knowledge_points": knowledge_points,
-                                                            "content": message['content']
-                                                        }
+                                        }
+                                        # 强制让出控制权，确保数据立即发送
+                                        await asyncio.sleep(0)
+
+                                # 检查是否有完成的消息
+                                if 'message' in choice:
+                                    message = choice['message']
+                                    if message.get('content'):
+                                        # 尝试解析知识点JSON，使用传入的extracted_text进行解析
+                                        try:
+                                            knowledge_points = await asyncio.to_thread(
+                                                self._extract_knowledge_points_from_content, message['content'], extracted_text
+                                            )
+                                            if knowledge_points:
+                                                logger.info(f"[{request_id}] Extracted {len(knowledge_points)} knowledge points")
+                                                yield {
+                                                    "type": "knowledge_points",
+                                                    "data": {
+                                                        "knowledge_points": knowledge_points,
+                                                        "content": message['content']
                                                     }
-                                            except Exception as e:
-                                                logger.warning(f"[{request_id}] Failed to parse knowledge points: {e}")
+                                                }
+                                        except Exception as e:
+                                            logger.warning(f"[{request_id}] Failed to parse knowledge points: {e}")
 
-                            except json.JSONDecodeError as e:
-                                logger.warning(f"[{request_id}] Failed to parse JSON chunk: {e}")
-                                logger.debug(f"[{request_id}] Invalid JSON: {json_str[:200]}...")
-                                continue
-                            except Exception as e:
-                                logger.error(f"[{request_id}] Error processing stream chunk: {e}")
-                                continue
+                        except json.JSONDecodeError as e:
+                            logger.warning(f"[{request_id}] Failed to parse JSON chunk: {e}")
+                            logger.debug(f"[{request_id}] Invalid JSON: {json_str[:200]}...")
+                            continue
+                        except Exception as e:
+                            logger.error(f"[{request_id}] Error processing stream chunk: {e}")
+                            continue
 
         except asyncio.TimeoutError:
             total_time = time.time() - start_time
@@ -729,18 +997,20 @@ class AIService:
             json_content = json_content.strip()
 
             # 查找JSON内容
-            start_idx = json_content.find('{')
-            end_idx = json_content.rfind('}') + 1
+            clean_json = self._find_json_object(json_content)
 
-            if start_idx == -1 or end_idx == 0:
+            if clean_json is None:
                 logger.error(f"[{request_id}] No JSON found in content")
                 raise ValueError("No valid JSON found in content")
 
-            clean_json = json_content[start_idx:end_idx]
             logger.debug(f"[{request_id}] Extracted JSON length: {len(clean_json)} characters")
 
-            # 解析JSON
-            parsed_data = json.loads(clean_json)
+            # 解析JSON，未转义的 LaTeX 反斜杠导致失败时修复后重试一次
+            try:
+                parsed_data = orjson.loads(clean_json)
+            except orjson.JSONDecodeError:
+                logger.warning(f"[{request_id}] JSON parsing failed, retrying with LaTeX escapes fixed")
+                parsed_data = orjson.loads(self._fix_latex_escapes(clean_json))
 
             # 处理不同的JSON格式
             raw_data = None
@@ -800,39 +1070,33 @@ class AIService:
         logger.info(f"[{request_id}] Creating knowledge points from direct content format")
 
         for i, kp_data in enumerate(raw_data):
-            logger.debug(f"[{request_id}] Processing direct knowledge point {i + 1}: {kp_data.get('title', 'Unknown')}")
-
             # 处理例题
             examples = []
             for j, ex_data in enumerate(kp_data.get("examples", [])):
-                logger.debug(f"[{request_id}] Processing example {j + 1}")
-
                 question = ex_data.get("question", "").strip()
                 solution = ex_data.get("solution", "").strip()
 
                 if question and solution:
-                    example = ExampleData(
-                        question=question,
-                        solution=solution,
-                        difficulty=ex_data.get("difficulty", "medium")
-                    )
-                    examples.append(example)
-                    logger.debug(f"[{request_id}] Added example {j + 1} - Q: {len(question)} chars, S: {len(solution)} chars")
+                    examples.append({
+                        "question": question,
+                        "solution": solution,
+                        "difficulty": ex_data.get("difficulty", "medium")
+                    })
                 else:
                     logger.warning(f"[{request_id}] Skipped example {j + 1} - missing question or solution")
 
-            # 创建知识点
-            kp = KnowledgePointData(
-                title=kp_data.get("title", "未命名知识点"),
-                description=kp_data.get("description", "").strip(),
-                category=kp_data.get("category", "general"),
-                examples=examples,
-                tags=kp_data.get("tags", [])
-            )
-
-            knowledge_points.append(kp)
-            logger.info(f"[{request_id}] Created knowledge point {i + 1}: '{kp.title}' with {len(examples)} examples")
-
+            # 收集知识点，最后统一校验
+            title = kp_data.get("title", "未命名知识点")
+            knowledge_points.append({
+                "title": title,
+                "description": kp_data.get("description", "").strip(),
+                "category": kp_data.get("category", "general"),
+                "examples": examples,
+                "tags": kp_data.get("tags", [])
+            })
+            logger.info(f"[{request_id}] Created knowledge point {i + 1}: '{title}' with {len(examples)} examples")
+
+        knowledge_points = _KP_LIST_ADAPTER.validate_python(knowledge_points)
         logger.info(f"[{request_id}] Direct content parsing completed - {len(knowledge_points)} knowledge points created")
         return knowledge_points
 
@@ -840,14 +1104,12 @@ class AIService:
         """从内容中提取知识点JSON并解析实际内容"""
         try:
             # 尝试找到JSON内容
-            start_idx = content.find('{')
-            end_idx = content.rfind('}') + 1
+            json_content = self._find_json_object(content)
 
-            if start_idx == -1 or end_idx == 0:
+            if json_content is None:
                 return None
 
-            json_content = content[start_idx:end_idx]
-            parsed_data = json.loads(json_content)
+            parsed_data = orjson.loads(json_content)
 
             if "knowledge_points" in parsed_data:
                 # 如果有原始文本，使用行号解析实际内容
@@ -943,7 +1205,8 @@ def create_ai_service() -> AIService:
     return AIService(
         api_key=api_key,
         api_base=settings.AI_BASE_URL,
-        model=settings.AI_MODEL
+        model=settings.AI_MODEL,
+        max_concurrency=settings.AI_MAX_CONCURRENCY
     )
 
 
@@ -958,4 +1221,10 @@ def get_ai_service() -> AIService:
     if _ai_service_instance is None:
         _ai_service_instance = create_ai_service()
     
-    return _ai_service_instance
\ No newline at end of file
+    return _ai_service_instance
+
+
+async def close_ai_service():
+    """Close the global AI service instance's HTTP session if it was created"""
+    if _ai_service_instance is not None:
+        await _ai_service_instance.close()
\ No newline at end of file
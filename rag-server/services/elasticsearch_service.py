@@ -6,13 +6,13 @@ import asyncio
 import json
 import uuid
 import time
-from typing import List, Dict, Any, Optional, Tuple
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 from elasticsearch import AsyncElasticsearch
 from elasticsearch.exceptions import ConnectionError, NotFoundError
 from loguru import logger
 
 from config import settings
-from schemas.embeddings import DocumentInput
+from schemas.ingestion import DocumentInputStruct
 
 
 class ElasticsearchService:
@@ -132,7 +132,7 @@ class ElasticsearchService:
 
     async def add_documents(
         self,
-        documents: List[DocumentInput],
+        documents: List[DocumentInputStruct],
         request_id: Optional[str] = None
     ) -> bool:
         """
@@ -548,6 +548,83 @@ class ElasticsearchService:
             logger.error(f"[{request_id}] Failed to get knowledge point names: {e}")
             return []
 
+    @staticmethod
+    def _source_to_document(source: Dict[str, Any]) -> Dict[str, Any]:
+        """将索引中的文档 _source 转换为知识点字典"""
+        return {
+            "id": source.get("id"),
+            "title": source.get("title"),
+            "description": source.get("description"),
+            "category": source.get("category"),
+            "examples": source.get("examples", []),
+            "tags": source.get("tags", []),
+            "created_at": source.get("created_at"),
+            "updated_at": source.get("updated_at")
+        }
+
+    async def iter_documents(
+        self,
+        batch_size: int = 100,
+        category: Optional[str] = None,
+        request_id: Optional[str] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        使用 point-in-time + search_after 分批遍历全部文档
+
+        不受 from/size 的 max_result_window 限制；与 get_documents_paginated 不同，
+        查询出错时直接抛出异常，调用方不会把中途失败误当作遍历结束
+
+        Args:
+            batch_size: 每批数量
+            category: 分类筛选（可选）
+            request_id: 请求ID用于追踪
+
+        Yields:
+            每批文档列表，顺序与分页接口一致（按创建时间倒序）
+        """
+        if not request_id:
+            request_id = str(uuid.uuid4())[:8]
+
+        es_client = self._get_es_client()
+        pit = await es_client.open_point_in_time(index=self.index, keep_alive="5m")
+        pit_id = pit["id"]
+        search_after = None
+        fetched = 0
+
+        try:
+            while True:
+                search_body = {
+                    "query": {"term": {"category": category}} if category else {"match_all": {}},
+                    # _shard_doc 作为并列时的决胜字段，保证翻页稳定
+                    "sort": [{"created_at": {"order": "desc"}}, {"_shard_doc": "asc"}],
+                    "pit": {"id": pit_id, "keep_alive": "5m"},
+                    "size": batch_size,
+                    "track_total_hits": True,
+                    "_source": {
+                        "excludes": ["content"]
+                    }
+                }
+                if search_after is not None:
+                    search_body["search_after"] = search_after
+
+                response = await es_client.search(body=search_body)
+
+                # PIT ID 可能在每次响应中更新
+                pit_id = response.get("pit_id", pit_id)
+                hits = response["hits"]["hits"]
+                if not hits:
+                    break
+
+                fetched += len(hits)
+                logger.debug(f"[{request_id}] Iterated {fetched}/{response['hits']['total']['value']} documents")
+                yield [self._source_to_document(hit["_source"]) for hit in hits]
+                search_after = hits[-1]["sort"]
+        finally:
+            try:
+                await es_client.close_point_in_time(id=pit_id)
+            except Exception as e:
+                logger.warning(f"[{request_id}] Failed to close point-in-time: {e}")
+
     async def get_documents_paginated(
         self,
         page: int = 1,
@@ -606,18 +683,7 @@ class ElasticsearchService:
             total_count = response.get("hits", {}).get("total", {}).get("value", 0)
             
             for hit in hits:
-                source = hit["_source"]
-                document = {
-                    "id": source.get("id"),
-                    "title": source.get("title"),
-                    "description": source.get("description"),
-                    "category": source.get("category"),
-                    "examples": source.get("examples", []),
-                    "tags": source.get("tags", []),
-                    "created_at": source.get("created_at"),
-                    "updated_at": source.get("updated_at")
-                }
-                documents.append(document)
+                documents.append(self._source_to_document(hit["_source"]))
             
             logger.info(f"[{request_id}] Found {len(documents)} documents, total: {total_count}")
             return documents, total_count
@@ -5,7 +5,7 @@ RAG 主服务模块
 import math
 import time
 import uuid
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional
 
 from .embedding_service import embedding_service
 from .chroma_service import chroma_service
@@ -13,9 +13,10 @@ from .elasticsearch_service import elasticsearch_service
 from .rerank_service import rerank_service
 from .llm_rerank_service import llm_rerank_service
 from schemas.embeddings import (
-    DocumentInput, DocumentResult, QueryResponse, QueryRequest,
+    DocumentResult, QueryResponse, QueryRequest,
     HybridQueryRequest, HybridQueryResponse, RankedDocumentResult
 )
+from schemas.ingestion import DocumentInputStruct
 from loguru import logger
 import asyncio
 
@@ -122,7 +123,7 @@ class RAGService:
     
     async def add_documents(
         self,
-        documents: List[DocumentInput],
+        documents: List[DocumentInputStruct],
         request_id: Optional[str] = None
     ) -> bool:
         """
@@ -620,7 +621,7 @@ class RAGService:
     
     async def upsert_documents(
         self,
-        documents: List[DocumentInput],
+        documents: List[DocumentInputStruct],
         request_id: Optional[str] = None
     ) -> bool:
         """
@@ -954,6 +955,30 @@ class RAGService:
             logger.error(f"[{request_id}] 分页获取知识点失败: {e}")
             raise
 
+    async def iter_knowledge_points(
+        self,
+        batch_size: int = 100,
+        category: Optional[str] = None,
+        request_id: Optional[str] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        分批遍历全部知识点（使用 Elasticsearch point-in-time）
+
+        Args:
+            batch_size: 每批数量
+            category: 分类筛选（可选）
+            request_id: 请求ID用于追踪
+
+        Yields:
+            每批知识点列表；查询出错时抛出异常
+        """
+        async for documents in self.elasticsearch_service.iter_documents(
+            batch_size=batch_size,
+            category=category,
+            request_id=request_id
+        ):
+            yield documents
+
     async def clear_knowledge_base(self, request_id: Optional[str] = None) -> bool:
         """
         清空知识库（清空 ChromaDB 和 Elasticsearch）